@@ -6,15 +6,21 @@ from io import BytesIO
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
-from services.sales_service import listar_ventas, agregar_venta, actualizar_venta, eliminar_venta, obtener_estado_sheets, limpiar_ventas, cargar_ventas_desde_historial
-from services.expenses_service import enviar_egresos, estado_egresos, listar_egresos
+from services.sales_service import listar_ventas, agregar_venta, actualizar_venta, eliminar_venta, obtener_estado_sheets, limpiar_ventas, tomar_ventas, devolver_ventas, cargar_ventas_desde_historial
+from services.expenses_service import enviar_egresos
 from services.history_service import (
     leer_historial,
     agregar_ventas_a_historial,
     eliminar_historial_por_fecha_idx,
     actualizar_historial_por_fecha_idx,
 )
-from services.catalog_service import obtener_catalogo, obtener_rangos
+from services.catalog_service import obtener_catalogo, obtener_rangos, estado_cache_catalogo, obtener_snapshot, edad_snapshot
+from services.cache import singleflight
+from services.catalog_search import buscar_en_catalogo, LIMITE_POR_DEFECTO
+from services import egresos_read_model, egresos_sync, export_jobs, google_client, http_transport, rate_limiter, sheet_status, sheets_outbox, token_cache
+from services.id_allocator import allocator as id_allocator, PREFIJOS as PREFIJOS_ID
+from services.tipo_service import tipo_index
+from services.row_cursor import row_cursor
 from config import GOOGLE_SHEETS_CONFIG, GOOGLE_APPS_SCRIPT
 try:
     from services.db import init_db
@@ -221,33 +227,118 @@ def api_eliminar_todas_las_ventas():
         return jsonify({"error": str(e)}), 500
 
 # Exportar a Google Sheets
-@app.route("/api/exportar", methods=["POST"])
-def api_exportar():
-    """Exporta TODAS las ventas acumuladas en memoria a Google Sheets"""
-    from services.sales_service import exportar_todas_las_ventas_a_sheets
-    resultado = exportar_todas_las_ventas_a_sheets()
-    # Si la exportación fue exitosa, persistimos SOLO lo realmente exportado (con costo_unitario calculado)
+def _procesar_exportacion(ventas, progreso, job_id):
+    """Ejecuta una exportación encolada (services.export_jobs): Sheets, historial y devolución de lo no exportado."""
+    from services.sales_service import calcular_costos_fifo, exportar_ventas_a_sheets
+    if sheets_outbox.habilitado():
+        # Con base de datos: historial + outbox en una transacción; la hoja se actualiza en segundo plano
+        try:
+            progreso("calculando costos")
+            calcular_costos_fifo(ventas)
+            progreso("guardando ventas")
+            registro = sheets_outbox.registrar_exportacion(ventas, clave_lote=job_id)
+        except Exception:
+            # Nada quedó en el outbox (una sola transacción): las ventas vuelven a memoria
+            devolver_ventas(ventas)
+            raise
+        return {
+            "success": True,
+            "modo": "outbox",
+            "ventas_exportadas": len(ventas),
+            "pendientes_sync": registro["registradas"],
+            "mensaje": f"✅ {len(ventas)} ventas guardadas. Se sincronizan con Google Sheets en segundo plano.",
+        }
+    progreso("escribiendo en Google Sheets")
+    try:
+        resultado = exportar_ventas_a_sheets(ventas)
+    except Exception:
+        devolver_ventas(ventas)
+        raise
+    # Las ventas salieron de memoria al encolar (api_exportar): vuelven las que no llegaron a la hoja
+    exportadas = (resultado or {}).get("indices_exitosos")
+    if exportadas is None:
+        exportadas = range(len(ventas)) if (resultado or {}).get("success") else []
+    exportadas = set(exportadas)
+    # Escritura sin confirmar (EXPORT_UNVERIFIED): no vuelven a memoria, reexportarlas a ciegas
+    # podría duplicar filas. Quedan en el resultado del job para revisarlas contra la hoja.
+    inciertas = set((resultado or {}).get("indices_inciertos") or []) - exportadas
+    if inciertas:
+        resultado["ventas_inciertas"] = [ventas[i] for i in sorted(inciertas) if 0 <= i < len(ventas)]
+    devolver_ventas([v for i, v in enumerate(ventas) if i not in exportadas and i not in inciertas])
+    # Persistimos SOLO lo realmente exportado (con costo_unitario calculado), también
+    # si la exportación fue parcial: esas ventas ya no están en memoria
     try:
-        if resultado and resultado.get("success"):
+        if exportadas:
+            progreso("guardando historial", len(exportadas))
             # Preferir la lista enriquecida que devuelve sales_service (incluye costo_unitario)
             ventas_ok = resultado.get("ventas_exportadas_items") or []
 
             # Fallback de compatibilidad: si por algún motivo no vino la lista enriquecida,
-            # reconstruirla desde las ventas en memoria usando los índices exitosos.
+            # reconstruirla desde las ventas del job usando los índices exitosos.
             if not ventas_ok:
-                ventas_actuales = listar_ventas()
-                indices = resultado.get("indices_exitosos") or list(range(len(ventas_actuales)))
-                ventas_ok = [ventas_actuales[i] for i in indices if 0 <= i < len(ventas_actuales)]
+                ventas_ok = [ventas[i] for i in sorted(exportadas) if 0 <= i < len(ventas)]
 
             if ventas_ok:
                 agregar_ventas_a_historial(ventas_ok)
-
-            # Limpiar ventas en memoria para empezar de nuevo
-            limpiar_ventas()
     except Exception:
-        # No romper la respuesta original del endpoint
+        # No romper el resultado de la exportación
         pass
-    return jsonify(resultado), 200
+    return resultado
+
+
+export_jobs.iniciar_worker(_procesar_exportacion)
+sheets_outbox.iniciar_worker()
+egresos_read_model.iniciar_reconciliador()
+egresos_sync.iniciar_worker()
+
+
+@app.route("/api/exportar", methods=["POST"])
+def api_exportar():
+    """
+    Encola la exportación de TODAS las ventas acumuladas en memoria a Google Sheets.
+    Responde de inmediato con el job_id; el avance se consulta en /api/exportar/<job_id>.
+    Las ventas salen de memoria al encolar: las que se carguen mientras corre el job
+    no se pierden, y las que el job no logre exportar vuelven a memoria.
+    """
+    ventas = tomar_ventas()
+    if not ventas:
+        return jsonify({
+            "success": False,
+            "error": "NO_HAY_VENTAS",
+            "mensaje": "No hay ventas para exportar. Agrega algunas ventas primero."
+        }), 200
+    try:
+        job_id = export_jobs.encolar(ventas)
+    except Exception as e:
+        devolver_ventas(ventas)
+        return jsonify({"success": False, "error": "EXPORT_QUEUE_ERROR", "mensaje": str(e)}), 500
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "estado": export_jobs.PENDIENTE,
+        "total": len(ventas),
+        "status_url": url_for("api_exportar_estado", job_id=job_id),
+    }), 202
+
+
+@app.route("/api/exportar/<job_id>", methods=["GET"])
+def api_exportar_estado(job_id):
+    """Estado de una exportación encolada: etapa, filas escritas, errores y resultado final."""
+    job = export_jobs.obtener(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "JOB_NOT_FOUND"}), 404
+    return jsonify(dict(job, success=job["estado"] != export_jobs.ERROR)), 200
+
+
+@app.route("/api/sheets/sync", methods=["GET", "POST"])
+def api_sheets_sync():
+    """Estado del outbox de Google Sheets (ventas pendientes/enviadas/en error). POST fuerza una sincronización."""
+    if not sheets_outbox.habilitado():
+        return jsonify({"success": False, "error": "OUTBOX_DISABLED", "mensaje": "Requiere DATABASE_URL"}), 200
+    if request.method == "POST":
+        sheets_outbox.iniciar_worker()
+        sheets_outbox.despertar()
+    return jsonify(dict(sheets_outbox.estadisticas(), success=True)), 200
 
 
 def _generate_remito_pdf(venta: dict) -> BytesIO:
@@ -380,6 +471,19 @@ def api_diagnostico():
             "ventas_en_historial": ventas_historial,
             "fechas_en_historial": fechas_historial,
             "tamaño_archivo_kb": round(tamaño_archivo / 1024, 2),
+            "cache_catalogo": estado_cache_catalogo(),
+            "singleflight": singleflight.estadisticas(),
+            "google_client": google_client.estado(),
+            "token_cache": token_cache.estadisticas(),
+            "tipos": tipo_index.estadisticas(),
+            "cursor_filas": row_cursor.estadisticas(),
+            "cuota_sheets": rate_limiter.estadisticas(),
+            "exportaciones": export_jobs.estadisticas(),
+            "outbox_sheets": sheets_outbox.estadisticas(),
+            "estado_sheets": sheet_status.estadisticas(),
+            "http_apps_script": http_transport.estadisticas(),
+            "egresos": egresos_read_model.estadisticas(),
+            "egresos_sync": egresos_sync.estadisticas(),
             "estado": "✅ Sistema funcionando correctamente",
             "recomendacion": "Mantener sistema actual" if ventas_historial < 50000 else "Considerar migración a base de datos"
         })
@@ -785,7 +889,7 @@ def api_egresos_historial_db():
         limit = int(request.args.get('limit', '200'))
         try:
             from services.db import get_session
-            from services.egresos_repository import listar_egresos_db
+            from services.egresos_repository import listar_egresos_db, egreso_a_fila
         except (ImportError, ModuleNotFoundError):
             # Sin SQLAlchemy/DB configurada: devolver vacío para que el front muestre estado vacío
             return jsonify({"success": True, "rows": []}), 200
@@ -796,18 +900,7 @@ def api_egresos_historial_db():
         finally:
             session.close()
         # Responder en formato compatible con el front: rows = [ [fecha, motivo, costo, tipo, pago, observaciones, id], ... ]
-        rows = []
-        for e in egresos:
-            fecha_str = e.fecha.isoformat() if getattr(e, 'fecha', None) else ''
-            rows.append([
-                fecha_str,
-                getattr(e, 'motivo', '') or '',
-                float(getattr(e, 'costo', 0) or 0),
-                getattr(e, 'tipo', '') or '',
-                getattr(e, 'pago', '') or '',
-                getattr(e, 'observaciones', '') or '',
-                int(getattr(e, 'id', 0) or 0),
-            ])
+        rows = [egreso_a_fila(e) for e in egresos]
         return jsonify({"success": True, "rows": rows}), 200
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -818,27 +911,116 @@ def download_sheets():
     # Redirigir a la hoja específica de Google Sheets
     return redirect("https://docs.google.com/spreadsheets/d/1QG8a6yHmad5sFpVcKhC3l0oEAcjJftmHV2KAF56bkkM/edit?gid=561161202#gid=561161202")
 
+def _con_headers_snapshot(resp, snapshot):
+    """Agrega la antigüedad y el origen (sheets/disco) del snapshot del catálogo."""
+    edad = edad_snapshot(snapshot)
+    if edad is not None:
+        resp.headers["X-Catalog-Snapshot-Age"] = str(int(edad))
+    resp.headers["X-Catalog-Snapshot-Source"] = str(snapshot.get("origen") or "sheets")
+    return resp
+
 @app.route("/api/catalogo", methods=["GET"])
 def api_catalogo():
     try:
-        return jsonify(obtener_catalogo())
+        snapshot = obtener_snapshot()
+        return _con_headers_snapshot(jsonify(snapshot.get("catalogo") or {}), snapshot)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/catalogo/search", methods=["GET"])
+def api_catalogo_search():
+    q = request.args.get("q", "")
+    try:
+        limit = int(request.args.get("limit", LIMITE_POR_DEFECTO))
+    except (TypeError, ValueError):
+        limit = LIMITE_POR_DEFECTO
+    try:
+        snapshot = obtener_snapshot()
+        resultados = buscar_en_catalogo(snapshot.get("catalogo") or {}, q, limit)
+        return _con_headers_snapshot(jsonify({"q": q, "resultados": resultados, "total": len(resultados)}), snapshot)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/ids/siguiente", methods=["GET"])
+def api_ids_siguiente():
+    """Próximo ID libre de un prefijo; con ?precio= devuelve el ID del rango de precio del grupo."""
+    prefijo = (request.args.get("prefijo") or request.args.get("grupo") or "").strip().upper()
+    if not prefijo:
+        return jsonify({"success": False, "error": "Falta el parámetro 'prefijo'"}), 400
+    try:
+        snapshot = obtener_snapshot()
+        catalogo = snapshot.get("catalogo") or {}
+        precio = request.args.get("precio")
+        if precio not in (None, ""):
+            id_asignado = id_allocator.id_por_precio(catalogo, snapshot.get("rangos") or {}, prefijo, precio)
+            return jsonify({"success": id_asignado is not None, "id": id_asignado, "prefijo": prefijo})
+        if prefijo not in PREFIJOS_ID and prefijo not in id_allocator.estadisticas(catalogo):
+            return jsonify({"success": False, "error": f"Prefijo desconocido: {prefijo}"}), 400
+        return jsonify({"success": True, "id": id_allocator.siguiente_id(catalogo, prefijo), "prefijo": prefijo})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/api/ids/reservar", methods=["POST"])
+def api_ids_reservar():
+    """Reserva uno o más IDs consecutivos: { "prefijo": "AN", "cantidad": 3 }"""
+    data = request.get_json(silent=True) or {}
+    prefijo = str(data.get("prefijo") or "").strip().upper()
+    if not prefijo:
+        return jsonify({"success": False, "error": "Falta 'prefijo'"}), 400
+    try:
+        cantidad = int(data.get("cantidad") or 1)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "'cantidad' debe ser un entero"}), 400
+    try:
+        catalogo = obtener_snapshot().get("catalogo") or {}
+        if prefijo not in PREFIJOS_ID and prefijo not in id_allocator.estadisticas(catalogo):
+            return jsonify({"success": False, "error": f"Prefijo desconocido: {prefijo}"}), 400
+        reserva = id_allocator.reservar(catalogo, prefijo, cantidad)
+        return jsonify({"success": True, "prefijo": prefijo, **reserva})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route("/api/rangos", methods=["GET"])
 def api_rangos():
     try:
-        return jsonify({"rangos": obtener_rangos()})
+        snapshot = obtener_snapshot()
+        return _con_headers_snapshot(jsonify({"rangos": snapshot.get("rangos") or {}}), snapshot)
     except Exception as e:
         return jsonify({"rangos": {}}), 200
 
 @app.route("/api/sheets/status", methods=["GET"])
 def api_sheets_status():
+    """Estado de la hoja desde metadata cacheada; ?deep=1 escanea la hoja completa."""
     try:
-        return jsonify(obtener_estado_sheets())
+        deep = request.args.get("deep", "").strip().lower() in ("1", "true", "si", "sí")
+        return jsonify(obtener_estado_sheets(deep=deep))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/sheets/limpiar", methods=["POST"])
+def api_sheets_limpiar():
+    """
+    Limpieza de la hoja de ventas en una pasada. Body: {"reglas": [...], "dry_run": true}.
+    Por defecto solo informa (dry_run); con "dry_run": false borra las filas marcadas.
+    """
+    try:
+        from services.sales_service import _get_sheets_writer
+        from services.sheet_cleanup import REGLAS
+        data = request.get_json(force=True, silent=True) or {}
+        reglas = data.get("reglas") or list(REGLAS)
+        if isinstance(reglas, str):
+            reglas = [reglas]
+        invalidas = [r for r in reglas if r not in REGLAS]
+        if invalidas:
+            return jsonify({"success": False, "error": "REGLA_INVALIDA", "reglas_validas": list(REGLAS), "invalidas": invalidas}), 400
+        writer = _get_sheets_writer()
+        if writer is None:
+            return jsonify({"success": False, "error": "NO_WRITER"}), 500
+        resultado = writer.limpiar_hoja(reglas=reglas, dry_run=data.get("dry_run", True) is not False)
+        return jsonify(resultado), (200 if resultado.get("success") else 500)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 # ===== Egresos (Apps Script) =====
 @app.route("/api/egresos", methods=["POST"])
 def api_egresos_post():
@@ -866,9 +1048,21 @@ def api_egresos_post():
         except Exception as _db_err:
             db_error = str(_db_err)
 
-        # Intentar exportar a GAS
+        if db_saved and egresos_sync.encolar():
+            # La hoja se actualiza en segundo plano (services.egresos_sync): la request no espera a GAS
+            return jsonify({
+                "success": True,
+                "gas_saved": False,
+                "gas_estado": egresos_sync.PENDIENTE,
+                "db_saved": True,
+                "db_rows": db_rows,
+            }), 200
+
+        # Sin DB: exportar a GAS en línea
         gas_res = enviar_egresos(egresos)
         gas_ok = bool(gas_res.get("success"))
+        if gas_ok:
+            egresos_read_model.registrar_envio(egresos)
 
         # Consolidar respuesta: éxito si al menos una de las dos operaciones funcionó
         success = gas_ok or db_saved
@@ -890,16 +1084,17 @@ def api_egresos_post():
 @app.route("/api/egresos/status", methods=["GET"])
 def api_egresos_status():
     try:
-        return jsonify(estado_egresos()), 200
+        # Cacheado EGRESOS_STATUS_TTL segundos (services.egresos_read_model)
+        return jsonify(egresos_read_model.estado()), 200
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-# API: Historial de Egresos (lee desde Apps Script)
+# API: Historial de Egresos (base local o caché de Apps Script, ver services.egresos_read_model)
 @app.route("/api/egresos/historial", methods=["GET"])
 def api_egresos_historial():
     try:
         limit = int(request.args.get('limit', '200'))
-        res = listar_egresos(limit=limit)
+        res = egresos_read_model.listar(limit=limit)
         code = 200 if res.get("success") else 400
         return jsonify(res), code
     except Exception as e:
@@ -913,9 +1108,9 @@ def test_sheets():
         writer = _get_sheets_writer()
         if writer is None:
             return jsonify({"status": "error", "error": "No hay cliente de Google Sheets"}), 500
-        # Listar títulos de hojas disponibles
+        # Listar títulos de hojas disponibles (metadata cacheada, ver services.sheet_status)
         if hasattr(writer, 'spreadsheet'):
-            sheets = [ws.title for ws in writer.spreadsheet.worksheets()]
+            sheets = sheet_status.listar_hojas(writer.spreadsheet)
             return jsonify({"status": "ok", "mode": "sheets_api", "sheets": sheets})
         else:
             return jsonify({"status": "ok", "mode": "apps_script"})
@@ -7,6 +7,10 @@
  * Seguridad (opcional): define la propiedad de script 'API_KEY' y envía 'X-API-Key' en el header.
  */
 
+var KEY_PREFIX = 'appendKey:';
+var CURSOR_PREFIX = 'rowCursor:';
+var KEY_TTL_MS = 3 * 24 * 60 * 60 * 1000;
+
 function doPost(e) {
   try {
     var body = e.postData && e.postData.contents ? e.postData.contents : null;
@@ -35,18 +39,7 @@ function doPost(e) {
     if (action === 'appendRows') {
       var rows = data.rows || [];
       if (!rows.length) return _json({ success: false, error: 'NO_ROWS' }, 400);
-
-      var ss = _openSpreadsheet_();
-      var ws = _getWorksheet_(ss);
-
-    // Calcular siguiente fila después de la última con datos (simple y efectivo)
-    var startRow = _getFirstEmptyRow_(ws); // deja fila 1 para headers
-      var numRows = rows.length;
-      var numCols = rows[0].length;
-      var range = ws.getRange(startRow, 1, numRows, numCols);
-      range.setValues(rows);
-
-      return _json({ success: true, appended: numRows, startRow: startRow });
+      return _json(_appendRows_(rows, data.key || '', data.rowKeys || null));
     }
 
     return _json({ success: false, error: 'UNKNOWN_ACTION' }, 400);
@@ -55,6 +48,84 @@ function doPost(e) {
   }
 }
 
+// Escribe 'rows' bajo un lock de script: dos POST simultáneos no calculan la misma fila.
+// 'key' (opcional) es la clave de idempotencia de la parte: si ya se escribió, no se repite.
+// 'rowKeys' (opcional, una por fila) omite las filas ya escritas aunque lleguen en otra parte.
+function _appendRows_(rows, key, rowKeys) {
+  var lock = LockService.getScriptLock();
+  lock.waitLock(30000);
+  try {
+    var props = PropertiesService.getScriptProperties();
+    if (key) {
+      var previa = props.getProperty(KEY_PREFIX + key);
+      if (previa) {
+        var info = JSON.parse(previa);
+        return { success: true, duplicate: true, appended: 0, startRow: info.startRow, key: key };
+      }
+    }
+    var claves = [];
+    if (rowKeys && rowKeys.length === rows.length) {
+      // Una sola lectura de propiedades (no una por fila mientras se tiene el lock)
+      var escritas = props.getProperties();
+      var nuevas = [];
+      for (var i = 0; i < rows.length; i++) {
+        if (escritas[KEY_PREFIX + 'row:' + rowKeys[i]]) continue;
+        nuevas.push(rows[i]);
+        claves.push(rowKeys[i]);
+      }
+      if (!nuevas.length) return { success: true, duplicate: true, appended: 0, skipped: rows.length, key: key || null };
+      rows = nuevas;
+    }
+
+    var ss = _openSpreadsheet_();
+    var ws = _getWorksheet_(ss);
+    // Cursor de fila en propiedades; getLastRow() lo corrige si alguien escribió a mano
+    // y lo descarta si se borraron o limpiaron filas por debajo de él
+    var cursorKey = CURSOR_PREFIX + ss.getId() + ':' + ws.getSheetId();
+    var cursor = parseInt(props.getProperty(cursorKey) || '0', 10);
+    if (ws.getLastRow() < cursor - 1) cursor = 0;
+    var startRow = Math.max(cursor, _getFirstEmptyRow_(ws));
+    var numRows = rows.length;
+    var numCols = rows[0].length;
+
+    var faltan = startRow + numRows - 1 - ws.getMaxRows();
+    if (faltan > 0) ws.insertRowsAfter(ws.getMaxRows(), faltan);
+    ws.getRange(startRow, 1, numRows, numCols).setValues(rows);
+    SpreadsheetApp.flush();
+
+    props.setProperty(cursorKey, String(startRow + numRows));
+    if (claves.length) {
+      var nuevasClaves = {};
+      for (var j = 0; j < claves.length; j++) {
+        nuevasClaves[KEY_PREFIX + 'row:' + claves[j]] = JSON.stringify({ startRow: startRow + j, n: 1, t: Date.now() });
+      }
+      props.setProperties(nuevasClaves);  // una sola escritura; conserva las demás propiedades
+    }
+    if (key) {
+      props.setProperty(KEY_PREFIX + key, JSON.stringify({ startRow: startRow, n: numRows, t: Date.now() }));
+      _podarClaves_(props);
+    }
+    return { success: true, appended: numRows, startRow: startRow, key: key || null,
+             skipped: rowKeys ? rowKeys.length - numRows : 0 };
+  } finally {
+    lock.releaseLock();
+  }
+}
+
+// Las claves de idempotencia se guardan KEY_TTL_MS (las propiedades tienen un límite de tamaño)
+function _podarClaves_(props) {
+  var todas = props.getProperties();
+  var limite = Date.now() - KEY_TTL_MS;
+  for (var nombre in todas) {
+    if (nombre.indexOf(KEY_PREFIX) !== 0) continue;
+    try {
+      if (JSON.parse(todas[nombre]).t < limite) props.deleteProperty(nombre);
+    } catch (err) {
+      props.deleteProperty(nombre);
+    }
+  }
+}
+
 function _openSpreadsheet_() {
   // Configurar por ID o URL en Propiedades del Script: SHEET_ID y SHEET_NAME
   var props = PropertiesService.getScriptProperties();
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: normalización de nombres/precios del catálogo
+
+Compara el loop por fila original (re.sub sin compilar + parse_price_chilean
+redefinida en cada llamada) contra services.catalog_normalizer sobre un
+catálogo sintético de 100k filas.
+
+Uso:
+    python benchmarks/bench_catalog_normalizer.py [filas]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.catalog_normalizer import normalizar_nombre, normalizar_nombres, parsear_precios  # noqa: E402
+
+
+def _generar_catalogo(filas, seed=1618):
+    rnd = random.Random(seed)
+    bases = ["Aro dorado", "Anillo plata", "Collar perlas", "Pulsera tejida", "Cadena fina",
+             "Aritos argolla", "Set de anillos", "Gargantilla", "Tobillera", "Piercing"]
+    sufijos = ["", " - $2.500", " ($11.600)", " precio sugerido: $8.000", " Rango de precios 2",
+               " 3", " $1.250,50", " - 990"]
+    nombres, precios = [], []
+    for _ in range(filas):
+        nombres.append(f"{rnd.choice(bases)} {rnd.choice(['S', 'M', 'L', 'XL'])}{rnd.choice(sufijos)}")
+        precios.append(rnd.choice(["$11.600,00", "8.000", "1,234", "1234,56", "$ 990", "", "7600"]))
+    return nombres, precios
+
+
+def _loop_original(nombres, precios):
+    """Copia del parseo por fila previo a catalog_normalizer."""
+    salida = []
+    for nombre_val, precio_val in zip(nombres, precios):
+        def parse_price_chilean(value_str: str) -> float:
+            try:
+                if value_str is None:
+                    return 0.0
+                v = str(value_str).replace('$', '').replace(' ', '').strip()
+                if ',' in v and '.' in v:
+                    v = v.replace('.', '').replace(',', '.')
+                elif ',' in v:
+                    parts = v.split(',')
+                    if len(parts) == 2 and parts[1].isdigit():
+                        v = parts[0].replace('.', '') + '.' + parts[1]
+                    else:
+                        v = v.replace(',', '')
+                else:
+                    if v.count('.') >= 1 and (len(v.split('.')[-1]) != 3):
+                        pass
+                    else:
+                        v = v.replace('.', '')
+                return float(v) if v else 0.0
+            except Exception:
+                return 0.0
+
+        nombre_clean = str(nombre_val).strip()
+        import re
+        nombre_clean = re.sub(r'\bprecio\s*sugerido\b[:\-]?\s*', '', nombre_clean, flags=re.IGNORECASE)
+        nombre_clean = re.sub(r'\s*[-–]\s*\$?\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?\s*', '', nombre_clean)
+        nombre_clean = re.sub(r'\s*\(\$?\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?\)\s*', '', nombre_clean)
+        nombre_clean = re.sub(r'\s*\$?\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?\s*$', '', nombre_clean)
+        nombre_clean = re.sub(r'\s*\$?\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?\s*', '', nombre_clean)
+        nombre_clean = re.sub(r'\s*Rango\s*de\s*precios\s*\d*\s*', '', nombre_clean, flags=re.IGNORECASE)
+        nombre_clean = re.sub(r'\s*\d+\s*$', '', nombre_clean)
+        nombre_clean = nombre_clean.strip()
+        salida.append((nombre_clean, parse_price_chilean(precio_val)))
+    return salida
+
+
+def _medir(fn, repeticiones=3):
+    mejor = None
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = fn()
+        dur = time.perf_counter() - inicio
+        mejor = dur if mejor is None else min(mejor, dur)
+    return mejor, resultado
+
+
+def main():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    nombres, precios = _generar_catalogo(filas)
+
+    t_original, esperado = _medir(lambda: _loop_original(nombres, precios))
+
+    def _lote_en_frio():
+        normalizar_nombre.cache_clear()
+        return list(zip(normalizar_nombres(nombres), parsear_precios(precios)))
+
+    t_frio, obtenido = _medir(_lote_en_frio)
+    t_caliente, _ = _medir(lambda: list(zip(normalizar_nombres(nombres), parsear_precios(precios))))
+
+    if obtenido != esperado:
+        print("❌ Los resultados difieren del loop original")
+        sys.exit(1)
+
+    print(f"Filas: {filas} ({len(set(nombres))} nombres distintos)")
+    print(f"Loop original por fila:       {t_original * 1000:9.1f} ms")
+    print(f"Normalizador (memo en frío):  {t_frio * 1000:9.1f} ms  x{t_original / t_frio:.1f}")
+    print(f"Normalizador (memo caliente): {t_caliente * 1000:9.1f} ms  x{t_original / t_caliente:.1f}")
+
+
+if __name__ == "__main__":
+    main()
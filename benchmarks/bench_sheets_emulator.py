@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los caminos de Google Sheets contra el emulador local
+
+Usa services.sheets_emulator (GOOGLE_SHEETS_BACKEND=emulador) para medir
+requests y tiempo de: exportación de ventas (modo batch y hoja protegida),
+limpieza de la hoja y carga del catálogo, sin credenciales ni red. Los
+archivos locales (CSV de ventas, snapshot del catálogo) van a un directorio
+temporal: data/ no se toca.
+
+Uso:
+    python benchmarks/bench_sheets_emulator.py [ventas] [latencia_ms]
+"""
+import os
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+VENTAS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+LATENCIA_MS = sys.argv[2] if len(sys.argv) > 2 else "50"
+
+os.environ["GOOGLE_SHEETS_BACKEND"] = "emulador"
+os.environ["GOOGLE_SHEETS_EMULATOR_LATENCY_MS"] = LATENCIA_MS
+# El limitador local no debe frenar el benchmark (la cuota la emula el emulador si se configura)
+os.environ.setdefault("GOOGLE_SHEETS_QUOTA_READS_PER_MIN", "100000")
+os.environ.setdefault("GOOGLE_SHEETS_QUOTA_WRITES_PER_MIN", "100000")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import GOOGLE_SHEETS_CONFIG  # noqa: E402
+from services import catalog_snapshot, google_client, sheets_emulator  # noqa: E402
+from services.google_sheets_writer import GoogleSheetsWriter  # noqa: E402
+
+
+def _ventas(n):
+    return [
+        {"fecha": "2026-10-17", "id": f"A{i % 90 + 1}", "nombre": f"Artículo {i}", "precio": 1000 + i,
+         "unidades": 1 + i % 3, "pago": "Efectivo", "notas": ""}
+        for i in range(n)
+    ]
+
+
+def _medir(nombre, funcion):
+    emulador = sheets_emulator.obtener_emulador()
+    emulador.reiniciar_estadisticas()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    duracion = time.perf_counter() - inicio
+    stats = emulador.estadisticas()
+    print(f"{nombre:<38} {stats['requests']:>5} requests {duracion:>8.2f}s  {stats['por_metodo']}")
+    return resultado
+
+
+def main():
+    with tempfile.TemporaryDirectory(prefix="bench_sheets_") as tmp:
+        catalog_snapshot.SNAPSHOT_PATH = Path(tmp) / "catalog_snapshot.json"
+        _correr(Path(tmp))
+
+
+def _correr(tmp):
+    print(f"Emulador: {VENTAS} ventas, {LATENCIA_MS}ms por request\n")
+    writer = GoogleSheetsWriter()
+    writer.data_dir = tmp
+
+    _medir("exportar (batch)", lambda: writer.agregar_multiples_ventas_a_sheets(_ventas(VENTAS)))
+    _medir("exportar otra vez (cursor de fila)", lambda: writer.agregar_multiples_ventas_a_sheets(_ventas(VENTAS)))
+    _medir("limpieza simulada (todas las reglas)", lambda: writer.limpiar_hoja(dry_run=True))
+
+    # Hoja protegida: la columna D no se puede escribir, se usa el modo por rangos A:C + E:L
+    emulador = sheets_emulator.obtener_emulador()
+    emulador.rangos_protegidos = [(GOOGLE_SHEETS_CONFIG["SHEET_NAME"], "D:D")]
+    _medir("exportar (hoja protegida en D)", lambda: writer.agregar_multiples_ventas_a_sheets(_ventas(VENTAS)))
+    emulador.rangos_protegidos = []
+
+    from services.catalog_service import CatalogService
+    _medir("catálogo (snapshot)", lambda: CatalogService().obtener_catalogo())
+
+    print(f"\ngoogle_client: {google_client.estado()['llamadas_api']} llamadas en total")
+
+
+if __name__ == "__main__":
+    main()
@@ -60,6 +60,25 @@ GOOGLE_SHEETS_CONFIG = {
     "CATALOG_GID": os.getenv("GOOGLE_SHEETS_CATALOG_GID", "1664309383"),  # GID de la hoja "Códigos Stock" (catálogo)
     "TIMEOUT": int(os.getenv("GOOGLE_SHEETS_TIMEOUT", "10")),  # segundos
     "RETRY_ATTEMPTS": int(os.getenv("GOOGLE_SHEETS_RETRY_ATTEMPTS", "3")),
+    "CATALOG_CACHE_TTL": int(os.getenv("GOOGLE_SHEETS_CATALOG_CACHE_TTL", "300")),  # segundos que el catálogo se sirve desde memoria
+    "EXPORT_MODE": os.getenv("GOOGLE_SHEETS_EXPORT_MODE", "batch"),  # "batch" (1 request por exportación) o "clasico"
+    "QUOTA_READS_PER_MIN": int(os.getenv("GOOGLE_SHEETS_QUOTA_READS_PER_MIN", "60")),  # cuota de lecturas por usuario
+    "QUOTA_WRITES_PER_MIN": int(os.getenv("GOOGLE_SHEETS_QUOTA_WRITES_PER_MIN", "60")),  # cuota de escrituras por usuario
+    "RATE_LIMIT_MAX_WAIT": int(os.getenv("GOOGLE_SHEETS_RATE_LIMIT_MAX_WAIT", "120")),  # segundos máx. esperando turno
+    "STATUS_CACHE_TTL": int(os.getenv("GOOGLE_SHEETS_STATUS_CACHE_TTL", "30")),  # segundos que se reutiliza la metadata en /api/sheets/status
+    # "" (una sola hoja SHEET_NAME) o "mensual" (una pestaña por mes, ver services.sheet_partitions)
+    "PARTITION": os.getenv("GOOGLE_SHEETS_PARTITION", ""),
+    "PARTITION_PREFIX": os.getenv("GOOGLE_SHEETS_PARTITION_PREFIX", "Ingreso"),  # pestañas "Ingreso 2026-10"
+    "PARTITION_ROWS": int(os.getenv("GOOGLE_SHEETS_PARTITION_ROWS", "2000")),  # filas con que se crea cada pestaña mensual
+    "PARTITION_INDEX": os.getenv("GOOGLE_SHEETS_PARTITION_INDEX", "Índice Ingresos"),  # pestaña índice mes -> hoja
+    # "google" (API real) o "emulador" (services.sheets_emulator, en memoria, para benchmarks y pruebas locales)
+    "BACKEND": os.getenv("GOOGLE_SHEETS_BACKEND", "google"),
+    "EMULATOR_LATENCY_MS": float(os.getenv("GOOGLE_SHEETS_EMULATOR_LATENCY_MS", "0")),  # latencia por request emulada
+    "EMULATOR_JITTER_MS": float(os.getenv("GOOGLE_SHEETS_EMULATOR_JITTER_MS", "0")),  # latencia extra aleatoria (0..jitter)
+    "EMULATOR_QUOTA_READS_PER_MIN": int(os.getenv("GOOGLE_SHEETS_EMULATOR_QUOTA_READS_PER_MIN", "0")),  # 0 = sin límite
+    "EMULATOR_QUOTA_WRITES_PER_MIN": int(os.getenv("GOOGLE_SHEETS_EMULATOR_QUOTA_WRITES_PER_MIN", "0")),  # 0 = sin límite
+    "EMULATOR_PROTECTED_RANGES": os.getenv("GOOGLE_SHEETS_EMULATOR_PROTECTED_RANGES", ""),  # ej. "'Ingreso Diario'!D:D;A1:L1"
+    "EMULATOR_SEED": os.getenv("GOOGLE_SHEETS_EMULATOR_SEED", ""),  # JSON en línea o ruta a un .json con hojas y valores iniciales
     "CREDENTIALS": get_google_credentials()
 }
 
@@ -67,7 +86,17 @@ GOOGLE_SHEETS_CONFIG = {
 GOOGLE_APPS_SCRIPT = {
     "GAS_URL": os.getenv("GAS_URL", ""),
     "GAS_API_KEY": os.getenv("GAS_API_KEY", ""),
-    "TIMEOUT": int(os.getenv("GAS_TIMEOUT", "15")),
+    "TIMEOUT": int(os.getenv("GAS_TIMEOUT", "15")),  # deadline total por llamada (segundos)
+    # Transporte compartido (services.http_transport): conexiones keep-alive por host
+    "POOL_SIZE": int(os.getenv("GAS_HTTP_POOL_SIZE", "10")),
+    "CONNECT_TIMEOUT": float(os.getenv("GAS_HTTP_CONNECT_TIMEOUT", "5")),  # segundos para abrir la conexión
+    # Cuerpos de al menos N bytes se envían con Content-Encoding: gzip (0 = nunca; el Web App debe descomprimir)
+    "GZIP_MIN_BYTES": int(os.getenv("GAS_HTTP_GZIP_MIN_BYTES", "0")),
+    # appendRows en partes (services.gas_append): filas y bytes máx. por parte, partes simultáneas y reintentos
+    "APPEND_CHUNK_ROWS": int(os.getenv("GAS_APPEND_CHUNK_ROWS", "200")),
+    "APPEND_CHUNK_BYTES": int(os.getenv("GAS_APPEND_CHUNK_BYTES", "400000")),
+    "APPEND_PARALLEL": int(os.getenv("GAS_APPEND_PARALLEL", "3")),  # 1 = conserva el orden de las filas
+    "APPEND_RETRIES": int(os.getenv("GAS_APPEND_RETRIES", "2")),
 }
 
 # Configuración de la aplicación
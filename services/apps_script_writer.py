@@ -3,15 +3,13 @@ Writer basado en Google Apps Script (GAS) para exportar ventas sin usar la API d
 Envía las ventas vía HTTP POST a un Web App publicado en Apps Script.
 """
 import os
-import json
 import logging
 from datetime import datetime
 from pathlib import Path
 import csv
-import urllib.request
-import urllib.error
 
 from config import GOOGLE_APPS_SCRIPT
+from services import gas_append, http_transport
 
 logger = logging.getLogger(__name__)
 
@@ -66,20 +64,14 @@ class AppsScriptWriter:
         return self.normalizar_fila_datos(fila)
 
     def _post_gas(self, payload: dict, timeout: int = None):
-        body = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(self.gas_url, data=body, method="POST")
-        req.add_header("Content-Type", "application/json")
-        if self.api_key:
-            req.add_header("X-API-Key", self.api_key)
-        try:
-            with urllib.request.urlopen(req, timeout=timeout or GOOGLE_APPS_SCRIPT.get("TIMEOUT", 15)) as resp:
-                data = resp.read().decode("utf-8")
-                return json.loads(data) if data else {"success": True}
-        except urllib.error.HTTPError as e:
-            err_text = e.read().decode("utf-8", errors="ignore")
-            raise RuntimeError(f"HTTP {e.code}: {err_text}")
-        except urllib.error.URLError as e:
-            raise RuntimeError(f"Conexión fallida: {e}")
+        headers = {"X-API-Key": self.api_key} if self.api_key else None
+        resp = http_transport.post_json(
+            self.gas_url, payload, headers=headers,
+            timeout=timeout or GOOGLE_APPS_SCRIPT.get("TIMEOUT", 15),
+        )
+        if not resp.ok:
+            raise RuntimeError(f"HTTP {resp.status}: {resp.texto()}")
+        return resp.json() if resp.body else {"success": True}
 
     def obtener_estado_gas(self):
         try:
@@ -109,7 +101,12 @@ class AppsScriptWriter:
         except Exception as e:
             return {"success": False, "mode": "apps_script", "error": str(e)}
 
-    def agregar_multiples_ventas_a_sheets(self, ventas: list):
+    def agregar_multiples_ventas_a_sheets(self, ventas: list, clave_lote: str = None):
+        """
+        Exporta las ventas con appendRows en partes paralelas e idempotentes
+        (services.gas_append). clave_lote: repetir la exportación con la misma
+        clave no duplica filas.
+        """
         if not ventas:
             return {"success": False, "error": "NO_HAY_VENTAS", "mensaje": "No hay ventas para exportar"}
 
@@ -126,27 +123,14 @@ class AppsScriptWriter:
         except Exception as e:
             logger.warning(f"No se pudo escribir CSV local: {e}")
 
-        # Enviar en uno o varios lotes si necesario
-        max_batch = 300  # prudente; Apps Script puede procesar cientos por llamada
-        total = 0
-        errores = []
-        for i in range(0, len(filas), max_batch):
-            lote = filas[i:i+max_batch]
-            payload = {
-                "action": "appendRows",
-                "rows": lote
-            }
-            try:
-                res = self._post_gas(payload)
-                if not res or not res.get("success", False):
-                    errores.append(res)
-                else:
-                    total += len(lote)
-            except Exception as e:
-                errores.append(str(e))
+        # Partes acotadas, enviadas en paralelo; Code.gs descarta las claves ya escritas
+        res = gas_append.append_rows(self._post_gas, filas, clave_lote=clave_lote)
+        total = res["filas_enviadas"]
+        errores = res["errores"]
 
         if total == len(filas):
-            return {"success": True, "ventas_exportadas": total, "mensaje": f"✅ {total} ventas exportadas vía Apps Script"}
+            return {"success": True, "ventas_exportadas": total, "partes": res["partes"],
+                    "mensaje": f"✅ {total} ventas exportadas vía Apps Script"}
         else:
             return {
                 "success": False,
@@ -0,0 +1,209 @@
+"""
+Caché en memoria compartida por proceso para lecturas costosas (Google Sheets)
+
+- TTL configurable: mientras el valor está fresco se responde desde memoria
+- Stale-while-revalidate: si el valor venció se devuelve igual y se refresca
+  en un hilo de fondo, sin bloquear la request
+- Contadores de hits/misses/refrescos y latencia del último refresco
+- Single-flight: llamadas concurrentes por el mismo recurso esperan una sola descarga
+"""
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Llamada:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce llamadas concurrentes por la misma clave: el primer hilo ejecuta
+    la función y los demás esperan y reciben el mismo resultado (o la misma excepción).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+        self._stats = {"ejecuciones": 0, "coalescidas": 0}
+
+    def do(self, clave, fn):
+        with self._lock:
+            llamada = self._en_vuelo.get(clave)
+            if llamada is not None:
+                self._stats["coalescidas"] += 1
+                lider = False
+            else:
+                llamada = _Llamada()
+                self._en_vuelo[clave] = llamada
+                self._stats["ejecuciones"] += 1
+                lider = True
+
+        if not lider:
+            llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        try:
+            llamada.resultado = fn()
+        except Exception as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+            llamada.evento.set()
+        return llamada.resultado
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["en_vuelo"] = sorted(str(k) for k in self._en_vuelo)
+        return stats
+
+
+# Grupo compartido por todos los loaders respaldados por Google Sheets
+singleflight = SingleFlight()
+
+
+class RefreshingCache:
+    def __init__(self, nombre, loader, ttl_segundos=300):
+        """
+        nombre: identificador para logs/diagnóstico (ej. "catalogo")
+        loader: función sin argumentos que devuelve el valor fresco
+        ttl_segundos: tiempo durante el cual el valor se considera fresco
+        """
+        self.nombre = nombre
+        self.loader = loader
+        self.ttl = float(ttl_segundos)
+        self._lock = threading.Lock()
+        self._valor = None
+        self._cargado_en = None  # time.monotonic() del último refresco exitoso
+        self._refrescando = False
+        self._no_reintentar_hasta = 0.0  # pausa tras un refresco fallido (Sheets caído / sin cuota)
+        self._stats = {
+            "hits": 0,
+            "hits_stale": 0,
+            "misses": 0,
+            "refrescos_ok": 0,
+            "refrescos_error": 0,
+            "ultimo_refresco_ms": None,
+            "ultimo_error": None,
+        }
+
+    def _es_fresco(self):
+        return self._cargado_en is not None and (time.monotonic() - self._cargado_en) < self.ttl
+
+    def edad_segundos(self):
+        """Segundos desde el último refresco exitoso (None si nunca se cargó)."""
+        if self._cargado_en is None:
+            return None
+        return time.monotonic() - self._cargado_en
+
+    def get(self):
+        """
+        Devuelve el valor cacheado.
+        - Fresco: lo devuelve directo (hit)
+        - Vencido: lo devuelve y dispara un refresco en segundo plano (hit_stale)
+        - Sin valor: carga de forma síncrona (miss); los errores se propagan
+        """
+        with self._lock:
+            if self._cargado_en is not None:
+                if self._es_fresco():
+                    self._stats["hits"] += 1
+                    return self._valor
+                self._stats["hits_stale"] += 1
+                valor = self._valor
+                lanzar = not self._refrescando and time.monotonic() >= self._no_reintentar_hasta
+                if lanzar:
+                    self._refrescando = True
+            else:
+                self._stats["misses"] += 1
+                valor = None
+                lanzar = None
+
+        if lanzar is None:
+            return self.refrescar()
+        if lanzar:
+            hilo = threading.Thread(
+                target=self._refrescar_en_fondo,
+                name=f"cache-refresh-{self.nombre}",
+                daemon=True,
+            )
+            hilo.start()
+        return valor
+
+    def refrescar(self):
+        """Carga el valor de forma síncrona y lo guarda en caché."""
+        inicio = time.perf_counter()
+        try:
+            valor = singleflight.do(f"cache:{self.nombre}", self.loader)
+        except Exception as e:
+            with self._lock:
+                self._stats["refrescos_error"] += 1
+                self._stats["ultimo_error"] = str(e)
+            raise
+        duracion_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        with self._lock:
+            self._valor = valor
+            self._cargado_en = time.monotonic()
+            self._stats["refrescos_ok"] += 1
+            self._stats["ultimo_refresco_ms"] = duracion_ms
+            self._stats["ultimo_error"] = None
+        logger.info(f"Caché '{self.nombre}' refrescada en {duracion_ms} ms")
+        return valor
+
+    def _refrescar_en_fondo(self):
+        try:
+            self.refrescar()
+        except Exception as e:
+            logger.warning(f"Refresco en segundo plano de '{self.nombre}' falló, se mantiene el valor anterior: {e}")
+            with self._lock:
+                self._no_reintentar_hasta = time.monotonic() + min(self.ttl, 30.0)
+        finally:
+            with self._lock:
+                self._refrescando = False
+
+    def sembrar(self, valor, edad_segundos=None):
+        """
+        Carga un valor inicial sin llamar al loader (ej. copia en disco al arrancar).
+        Si edad_segundos >= ttl (o None) queda vencido: se sirve de inmediato y la
+        primera lectura dispara el refresco en segundo plano.
+        """
+        edad = self.ttl if edad_segundos is None else max(0.0, float(edad_segundos))
+        with self._lock:
+            if self._cargado_en is not None:
+                return False
+            self._valor = valor
+            self._cargado_en = time.monotonic() - edad
+        return True
+
+    def modificar(self, fn):
+        """Reemplaza el valor cacheado por fn(valor) (write-through); no hace nada si nunca se cargó."""
+        with self._lock:
+            if self._cargado_en is None:
+                return False
+            self._valor = fn(self._valor)
+        return True
+
+    def invalidar(self):
+        """Marca el valor como vencido; la próxima lectura lo refresca en segundo plano."""
+        with self._lock:
+            if self._cargado_en is not None:
+                self._cargado_en = time.monotonic() - self.ttl
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            edad = self.edad_segundos()
+        stats["nombre"] = self.nombre
+        stats["ttl_segundos"] = self.ttl
+        stats["edad_segundos"] = round(edad, 2) if edad is not None else None
+        stats["refrescando"] = self._refrescando
+        return stats
@@ -0,0 +1,96 @@
+"""
+Normalización de nombres y precios del catálogo
+
+Reglas precompiladas (una sola vez por proceso) para quitar precios y textos de
+"Rango de precios" de los nombres, con memo por texto crudo de la celda: los
+catálogos repiten muchos nombres, así que cada texto distinto se procesa una vez.
+"""
+import re
+from functools import lru_cache
+
+# Orden importante: se aplican en secuencia igual que el parseo original por fila
+_REGLAS_NOMBRE = [
+    # Quitar "precio sugerido" y patrones de moneda/números
+    (re.compile(r'\bprecio\s*sugerido\b[:\-]?\s*', re.IGNORECASE), ''),
+    # Quitar "- $250" o con miles
+    (re.compile(r'\s*[-–]\s*\$?\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?\s*'), ''),
+    # Quitar "($250)"
+    (re.compile(r'\s*\(\$?\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?\)\s*'), ''),
+    # Quitar precio al final
+    (re.compile(r'\s*\$?\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?\s*$'), ''),
+    # Quitar precio en cualquier parte
+    (re.compile(r'\s*\$?\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?\s*'), ''),
+    # Quitar "Rango de precios 1"
+    (re.compile(r'\s*Rango\s*de\s*precios\s*\d*\s*', re.IGNORECASE), ''),
+    # Quitar números al final
+    (re.compile(r'\s*\d+\s*$'), ''),
+]
+
+_MEMO_MAX = 65536
+
+
+@lru_cache(maxsize=_MEMO_MAX)
+def normalizar_nombre(raw: str) -> str:
+    """Limpia un nombre de producto (memoizado por el texto crudo de la celda)."""
+    nombre = str(raw).strip()
+    for patron, reemplazo in _REGLAS_NOMBRE:
+        nombre = patron.sub(reemplazo, nombre)
+    return nombre.strip()
+
+
+@lru_cache(maxsize=_MEMO_MAX)
+def _parse_price_chilean(v: str) -> float:
+    try:
+        v = v.replace('$', '').replace(' ', '').strip()
+        # Formato chileno: miles con punto, decimales con coma
+        if ',' in v and '.' in v:
+            # 11.600,00 -> 11600.00
+            v = v.replace('.', '').replace(',', '.')
+        elif ',' in v:
+            # 1,234 -> 1234  o  1234,56 -> 1234.56
+            # Si hay una sola coma, asumir decimales
+            parts = v.split(',')
+            if len(parts) == 2 and parts[1].isdigit():
+                v = parts[0].replace('.', '') + '.' + parts[1]
+            else:
+                v = v.replace(',', '')
+        else:
+            # Solo puntos: 11.600 -> 11600
+            # Si parece miles, quitar puntos
+            if v.count('.') >= 1 and (len(v.split('.')[-1]) != 3):
+                # Caso raro: dejar como está
+                pass
+            else:
+                v = v.replace('.', '')
+        return float(v) if v else 0.0
+    except Exception:
+        return 0.0
+
+
+def parse_price_chilean(value_str) -> float:
+    """Convierte precios en formato chileno ($11.600,00) a float."""
+    if value_str is None:
+        return 0.0
+    return _parse_price_chilean(str(value_str))
+
+
+def normalizar_nombres(columna):
+    """Normaliza una columna completa de nombres; cada valor distinto se procesa una sola vez."""
+    distintos = {raw: normalizar_nombre(raw) for raw in set(columna)}
+    return [distintos[raw] for raw in columna]
+
+
+def parsear_precios(columna):
+    """Convierte una columna completa de precios en formato chileno a floats."""
+    distintos = {raw: parse_price_chilean(raw) for raw in set(columna)}
+    return [distintos[raw] for raw in columna]
+
+
+def estadisticas_memo():
+    """Aciertos/fallos del memo (para diagnóstico)."""
+    info_nombres = normalizar_nombre.cache_info()
+    info_precios = _parse_price_chilean.cache_info()
+    return {
+        "nombres": {"hits": info_nombres.hits, "misses": info_nombres.misses, "tamano": info_nombres.currsize},
+        "precios": {"hits": info_precios.hits, "misses": info_precios.misses, "tamano": info_precios.currsize},
+    }
@@ -0,0 +1,157 @@
+"""
+Índice de búsqueda del catálogo (autocompletado en el servidor)
+
+Se construye una vez por snapshot del catálogo:
+  - IDs ordenados para búsqueda por prefijo con bisect
+  - Índice de tokens (ordenados, también por prefijo) sobre nombres normalizados
+  - Índice de trigramas para tolerar errores de tipeo
+Lo expone GET /api/catalogo/search para clientes que solo necesitan
+autocompletar. El front actual (static/app.js) sigue cargando /api/catalogo
+completo: arma los tipos, los rangos de ID y las vistas de stock con él.
+"""
+import re
+import heapq
+import logging
+import threading
+from bisect import bisect_left
+
+from services.catalog_snapshot import normalizar_titulo
+
+logger = logging.getLogger(__name__)
+
+LIMITE_POR_DEFECTO = 20
+LIMITE_MAXIMO = 100
+# Similitud mínima de trigramas (coeficiente de Dice) para contar como coincidencia
+SIMILITUD_MINIMA = 0.35
+
+_RE_NO_ALFANUM = re.compile(r'[^0-9a-z]+')
+
+# Pesos del ranking
+_PUNTAJE_ID_EXACTO = 1000.0
+_PUNTAJE_ID_PREFIJO = 500.0
+_PUNTAJE_TOKEN_EXACTO = 20.0
+_PUNTAJE_TOKEN_PREFIJO = 10.0
+_PUNTAJE_TRIGRAMA = 10.0
+
+
+def normalizar_texto(texto) -> str:
+    """Minúsculas, sin acentos y con cualquier separador colapsado a un espacio."""
+    return _RE_NO_ALFANUM.sub(' ', normalizar_titulo(str(texto or ''))).strip()
+
+
+def trigramas(texto: str):
+    """Trigramas de cada palabra, con bordes marcados ('  ab', 'abc', 'bc ')."""
+    resultado = set()
+    for palabra in texto.split():
+        p = f"  {palabra} "
+        for i in range(len(p) - 2):
+            resultado.add(p[i:i + 3])
+    return resultado
+
+
+def _rango_prefijo(ordenados, prefijo):
+    """Posiciones [inicio, fin) de la lista ordenada cuyos elementos empiezan con 'prefijo'."""
+    inicio = bisect_left(ordenados, prefijo)
+    fin = bisect_left(ordenados, prefijo + '\uffff')
+    return inicio, fin
+
+
+class IndiceCatalogo:
+    def __init__(self, catalogo):
+        catalogo = catalogo or {}
+        # Productos en el orden de los IDs normalizados (posición = id interno)
+        pares = sorted(((str(k).strip().upper(), k) for k in catalogo), key=lambda t: t[0])
+        self.ids = [id_norm for id_norm, _ in pares]
+        self.productos = []
+        self._trigramas_por_producto = []
+        postings_tokens = {}
+        self._trigramas = {}
+
+        for pos, (_, id_original) in enumerate(pares):
+            info = catalogo.get(id_original) or {}
+            nombre = str(info.get("nombre", ""))
+            self.productos.append({
+                "id": id_original,
+                "nombre": nombre,
+                "precio": info.get("precio", 0.0),
+            })
+            nombre_norm = normalizar_texto(nombre)
+            for token in set(nombre_norm.split()):
+                postings_tokens.setdefault(token, []).append(pos)
+            tris = trigramas(nombre_norm)
+            self._trigramas_por_producto.append(len(tris))
+            for tri in tris:
+                self._trigramas.setdefault(tri, []).append(pos)
+
+        self.tokens = sorted(postings_tokens)
+        self._postings_tokens = [postings_tokens[t] for t in self.tokens]
+
+    def __len__(self):
+        return len(self.productos)
+
+    def buscar(self, q, limit=LIMITE_POR_DEFECTO):
+        """
+        Devuelve hasta 'limit' productos ordenados por relevancia:
+        ID exacto > prefijo de ID > tokens del nombre (exacto/prefijo) > similitud por trigramas.
+        """
+        limit = max(1, min(int(limit or LIMITE_POR_DEFECTO), LIMITE_MAXIMO))
+        q_norm = normalizar_texto(q)
+        if not q_norm:
+            return []
+
+        puntajes = {}
+
+        # 1) Prefijo de ID (sobre el texto crudo: los IDs pueden tener guiones)
+        q_id = str(q).strip().upper()
+        if q_id:
+            inicio, fin = _rango_prefijo(self.ids, q_id)
+            for pos in range(inicio, fin):
+                puntajes[pos] = _PUNTAJE_ID_EXACTO if self.ids[pos] == q_id else _PUNTAJE_ID_PREFIJO
+
+        # 2) Tokens del nombre: exacto o prefijo (la última palabra suele estar a medio escribir)
+        q_tokens = q_norm.split()
+        for token in q_tokens:
+            inicio, fin = _rango_prefijo(self.tokens, token)
+            for i in range(inicio, fin):
+                puntaje = _PUNTAJE_TOKEN_EXACTO if self.tokens[i] == token else _PUNTAJE_TOKEN_PREFIJO
+                for pos in self._postings_tokens[i]:
+                    puntajes[pos] = puntajes.get(pos, 0.0) + puntaje
+
+        # 3) Trigramas: tolera errores de tipeo ("colar" -> "collar"). Solo como
+        #    respaldo cuando ID/tokens no alcanzan para llenar el límite.
+        q_tris = trigramas(q_norm) if len(puntajes) < limit else ()
+        if q_tris:
+            compartidos = {}
+            for tri in q_tris:
+                for pos in self._trigramas.get(tri, ()):
+                    compartidos[pos] = compartidos.get(pos, 0) + 1
+            total_q = len(q_tris)
+            for pos, n in compartidos.items():
+                similitud = 2.0 * n / (total_q + self._trigramas_por_producto[pos])
+                if similitud >= SIMILITUD_MINIMA:
+                    puntajes[pos] = puntajes.get(pos, 0.0) + _PUNTAJE_TRIGRAMA * similitud
+
+        if not puntajes:
+            return []
+        mejores = heapq.nsmallest(limit, puntajes.items(), key=lambda t: (-t[1], t[0]))
+        return [dict(self.productos[pos], score=round(puntaje, 3)) for pos, puntaje in mejores]
+
+
+_lock = threading.Lock()
+_indice = None
+_catalogo_indexado = None
+
+
+def obtener_indice(catalogo):
+    """Índice del catálogo dado; se reconstruye solo cuando cambia el snapshot."""
+    global _indice, _catalogo_indexado
+    with _lock:
+        if _indice is None or _catalogo_indexado is not catalogo:
+            _indice = IndiceCatalogo(catalogo)
+            _catalogo_indexado = catalogo
+            logger.info(f"Índice de búsqueda del catálogo construido ({len(_indice)} productos, {len(_indice.tokens)} tokens)")
+        return _indice
+
+
+def buscar_en_catalogo(catalogo, q, limit=LIMITE_POR_DEFECTO):
+    return obtener_indice(catalogo).buscar(q, limit)
@@ -0,0 +1,450 @@
+"""
+Snapshot unificado de "Códigos Stock"
+
+Descarga en UN solo values_batch_get todas las hojas que necesitan el catálogo,
+los rangos de precios por grupo y el mapa ID -> Tipo, y construye las tres
+estructuras en una pasada. Los consumidores (CatalogService, obtener_rangos,
+TipoService) leen del snapshot en lugar de descargar cada uno su hoja.
+"""
+import os
+import re
+import json
+import time
+import logging
+import tempfile
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+
+from gspread.utils import absolute_range_name, fill_gaps
+
+from services.catalog_normalizer import normalizar_nombres, parsear_precios
+from services.sheet_ranges import columna, leer_rangos, rango_a1
+
+logger = logging.getLogger(__name__)
+
+# Hoja de tipos: ID en columna I, Tipo en columna E (desde fila 4)
+TIPO_GID = 1664309383
+
+COPIA_CODIGOS_TITULO = "Copia de Códigos Stock"
+
+# Copia local del último snapshot para arranque en caliente / fallback sin Sheets.
+# Subir SNAPSHOT_VERSION si cambia la estructura del snapshot: los archivos viejos se ignoran.
+SNAPSHOT_VERSION = 1
+SNAPSHOT_PATH = Path(__file__).resolve().parent.parent / 'data' / 'catalog_snapshot.json'
+
+_RE_RANGO = re.compile(r"rango\s*de\s*precio\s*(\d+)", re.IGNORECASE)
+_RE_CODIGO = re.compile(r"^([A-Za-z]+)(\d+)$")
+
+
+def normalizar_titulo(s: str) -> str:
+    """Título en minúsculas y sin acentos, para comparar nombres de hojas."""
+    try:
+        s_norm = unicodedata.normalize('NFKD', s)
+        s_ascii = ''.join(ch for ch in s_norm if not unicodedata.combining(ch))
+        return s_ascii.strip().lower()
+    except Exception:
+        return s.strip().lower()
+
+
+def buscar_columna_flexible(headers, patrones_busqueda):
+    """
+    Busca una columna de forma flexible usando múltiples patrones
+    """
+    headers_lower = [h.lower().strip() if h else "" for h in headers]
+
+    for patron in patrones_busqueda:
+        patron_lower = patron.lower()
+
+        # Búsqueda exacta
+        for i, header in enumerate(headers_lower):
+            if header == patron_lower:
+                logger.info(f"Columna '{patron}' encontrada en posición {i}")
+                return i
+
+        # Búsqueda parcial
+        for i, header in enumerate(headers_lower):
+            if patron_lower in header or header in patron_lower:
+                logger.info(f"Columna '{patron}' encontrada parcialmente en posición {i} (header: '{headers[i]}')")
+                return i
+
+    return None
+
+
+def _parse_valor_rango(valor_raw) -> float:
+    """Normaliza el valor de un rango de precio (formato chileno, puntos = miles)."""
+    try:
+        v = str(valor_raw).replace('$', '').replace(' ', '').strip()
+        if ',' in v and '.' in v:
+            v = v.replace('.', '').replace(',', '.')
+        elif ',' in v:
+            parts = v.split(',')
+            if len(parts) == 2 and parts[1].isdigit():
+                v = parts[0].replace('.', '') + '.' + parts[1]
+            else:
+                v = v.replace(',', '')
+        else:
+            v = v.replace('.', '')
+        return float(v) if v else 0.0
+    except Exception:
+        return 0.0
+
+
+def parsear_catalogo_copia(values, fila_inicial=4):
+    """
+    Catálogo desde "Copia de Códigos Stock": values son las columnas I (ID) y J (Nombre)
+    empezando en fila_inicial.
+    """
+    catalogo = {}
+    for row in (fill_gaps(values, cols=2) if values else []):
+        codigo_i = (row[0] or "").strip().upper()
+        nombre_j = (row[1] or "").strip()
+        if not codigo_i:
+            continue
+        # Normalizar espacios en el nombre (columna J). Si falta, usar el código como nombre.
+        nombre_clean = " ".join(nombre_j.split()) if nombre_j else codigo_i
+        catalogo[codigo_i] = {"nombre": nombre_clean, "precio": 0.0}
+    return catalogo
+
+
+def parsear_catalogo_estandar(all_values):
+    """
+    Modo estándar: detecta columnas ID/Nombre/Precio por headers flexibles
+    en la primera fila de la hoja del catálogo.
+    """
+    if not all_values:
+        logger.warning("La hoja del catálogo está vacía")
+        return {}
+
+    # La primera fila son los headers
+    headers = all_values[0]
+    logger.info(f"Headers encontrados: {headers}")
+
+    # Buscar columnas de forma flexible
+    patrones_id = ["id", "código", "sku", "codigo", "producto_id"]
+    patrones_nombre = ["nombre", "descripción", "descripcion", "producto", "item", "elemento"]
+    patrones_precio = ["precio", "valor", "costo", "precio_venta", "venta"]
+
+    idx_id = buscar_columna_flexible(headers, patrones_id)
+    idx_nombre = buscar_columna_flexible(headers, patrones_nombre)
+    idx_precio = buscar_columna_flexible(headers, patrones_precio)
+
+    if idx_id is None:
+        raise RuntimeError(
+            f"No se encontró columna de ID. Headers disponibles: {headers}. "
+            f"Patrones buscados: {patrones_id}"
+        )
+
+    if idx_nombre is None:
+        logger.warning(
+            f"No se encontró columna de Nombre. Usando 'Producto Desconocido'. "
+            f"Headers disponibles: {headers}. Patrones buscados: {patrones_nombre}"
+        )
+
+    if idx_precio is None:
+        logger.warning(
+            f"No se encontró columna de Precio. Usando 0 como valor por defecto. "
+            f"Headers disponibles: {headers}. Patrones buscados: {patrones_precio}"
+        )
+
+    # Procesar filas de datos (excluyendo headers): primero recortar las columnas,
+    # después normalizar nombres y precios por lote (ver services.catalog_normalizer)
+    max_col = max(
+        idx_id if idx_id is not None else 0,
+        idx_nombre if idx_nombre is not None else 0,
+        idx_precio if idx_precio is not None else 0
+    )
+    ids, nombres, precios = [], [], []
+    rows_skipped = 0
+    for row_idx, row in enumerate(all_values[1:], start=2):
+        # Verificar que la fila tenga suficientes columnas
+        if len(row) <= max_col:
+            logger.debug(f"Fila {row_idx} ignorada: insuficientes columnas")
+            rows_skipped += 1
+            continue
+        id_clean = str(row[idx_id] or "").strip()
+        # Solo agregar si el ID es válido
+        if not id_clean or id_clean.lower() in ['n/a', 'null', 'none']:
+            rows_skipped += 1
+            continue
+        ids.append(id_clean.upper())
+        nombres.append(str(row[idx_nombre]) if idx_nombre is not None else "Producto Desconocido")
+        precios.append(row[idx_precio] if idx_precio is not None else "0")
+
+    catalogo = {}
+    for id_clean, nombre_clean, precio_float in zip(ids, normalizar_nombres(nombres), parsear_precios(precios)):
+        catalogo[id_clean] = {
+            'nombre': nombre_clean,
+            'precio': precio_float
+        }
+    rows_processed = len(ids)
+
+    logger.info(f"Catálogo procesado: {len(catalogo)} productos de {rows_processed} filas válidas")
+    if rows_skipped > 0:
+        logger.info(f"Filas ignoradas: {rows_skipped}")
+
+    return catalogo
+
+
+def parsear_rangos_por_grupo(values):
+    """
+    Umbrales por grupo/prefijo de código (A, AN, C, ...). En cada fila se busca
+    "Rango de precio N", un código tipo A1/AN2 y el valor a la derecha del texto de rango.
+    Retorna: { "A": [0, 8000, 11600], "AN": [0, 7600, 8000], ... }
+    """
+    grupos_tmp = {}
+
+    for row in values or []:
+        num_cols = len(row)
+        # Detectar rango en la fila
+        rango_num = None
+        rango_col_idx = None
+        for col_idx in range(num_cols):
+            texto = (row[col_idx] or "").strip()
+            m = _RE_RANGO.search(texto)
+            if m:
+                rango_num = int(m.group(1))
+                rango_col_idx = col_idx
+                break
+        if rango_num is None:
+            continue
+
+        # Buscar código tipo A1 / AN2 en la misma fila
+        grupo_letras = None
+        for col_idx in range(num_cols):
+            celda = (row[col_idx] or "").strip()
+            mcode = _RE_CODIGO.match(celda)
+            if mcode:
+                grupo_letras = mcode.group(1).upper()
+                break
+        if not grupo_letras:
+            continue
+
+        # Valor a la derecha del texto de rango
+        valor_raw = ""
+        if rango_col_idx + 1 < num_cols:
+            valor_raw = (row[rango_col_idx + 1] or "").strip()
+        if not valor_raw:
+            for k in range(rango_col_idx + 2, num_cols):
+                if row[k] and str(row[k]).strip():
+                    valor_raw = str(row[k]).strip()
+                    break
+
+        grupos_tmp.setdefault(grupo_letras, []).append((rango_num, _parse_valor_rango(valor_raw)))
+
+    # Ordenar cada grupo por N y devolver solo valores
+    resultado = {}
+    for grupo, pares in grupos_tmp.items():
+        pares.sort(key=lambda t: t[0])
+        resultado[grupo] = [val for (_, val) in pares]
+    return resultado
+
+
+def _find_col(headers, candidates):
+    lower = [(h or '').strip().lower() for h in headers]
+    for cand in candidates:
+        c = cand.strip().lower()
+        # exacto
+        for i, h in enumerate(lower):
+            if h == c:
+                return i
+        # parcial
+        for i, h in enumerate(lower):
+            if c in h or h in c:
+                return i
+    return None
+
+
+def parsear_tipos_columnas(ids, tipos_col):
+    """Mapa ID -> Tipo a partir de las columnas I (ID) y E (Tipo) ya recortadas desde fila 4."""
+    tipos = {}
+    for id_raw, tipo_val in zip(ids, tipos_col):
+        id_raw = (id_raw or '').strip()
+        tipo_val = (tipo_val or '').strip()
+        if id_raw and tipo_val:
+            tipos[id_raw.upper()] = tipo_val
+    return tipos
+
+
+def parsear_tipos(values):
+    """Mapa ID -> Tipo desde la hoja de tipos (I/E desde fila 4, o headers flexibles)."""
+    tipos = {}
+    if not values:
+        return tipos
+
+    # 1) Modo estricto según estructura pedida: ID en columna I (idx 8), Tipo en columna E (idx 4), desde fila 4
+    col_id = 8  # I
+    col_tipo = 4  # E
+    for idx, row in enumerate(values, start=1):
+        if idx < 4:
+            continue
+        if len(row) <= max(col_id, col_tipo):
+            continue
+        id_raw = (row[col_id] or '').strip()
+        tipo_val = (row[col_tipo] or '').strip()
+        if not id_raw or not tipo_val:
+            continue
+        tipos[id_raw.upper()] = tipo_val
+    if tipos:
+        return tipos
+
+    # 2) Fallback: detección por headers flexibles
+    headers = values[0]
+    idx_id = _find_col(headers, ["id", "codigo", "código", "sku", "producto_id"])  # ID columna
+    idx_tipo = _find_col(headers, ["tipo", "category", "categoria", "categoría"])   # Tipo columna
+    if idx_tipo is None:
+        logger.warning("No se encontró columna 'Tipo' en la hoja de tipos (fallback)")
+        return tipos
+    idx_concepto = _find_col(headers, ["concepto"]) if idx_id is None else None
+
+    for row in values[1:]:
+        if len(row) <= idx_tipo:
+            continue
+        tipo_val = (row[idx_tipo] or '').strip()
+        if not tipo_val:
+            continue
+        key = None
+        if idx_id is not None and len(row) > idx_id:
+            key = (row[idx_id] or '').strip().upper()
+        elif idx_concepto is not None and len(row) > idx_concepto:
+            key = (row[idx_concepto] or '').strip().upper()
+        if key:
+            tipos[key] = tipo_val
+    return tipos
+
+
+def _resolver_hojas(spreadsheet, catalog_gid):
+    """Resuelve títulos de las hojas necesarias con una sola lectura de metadata."""
+    hojas = spreadsheet.worksheets()
+    por_id = {ws.id: ws for ws in hojas}
+
+    hoja_catalogo = None
+    if catalog_gid and str(catalog_gid).isdigit() and int(catalog_gid) > 0:
+        hoja_catalogo = por_id.get(int(catalog_gid))
+        if hoja_catalogo is None:
+            logger.warning(f"No se encontró hoja con GID {catalog_gid}, usando la primera hoja")
+    if hoja_catalogo is None:
+        buscados = {normalizar_titulo("Códigos Stock")}
+        hoja_catalogo = next((ws for ws in hojas if normalizar_titulo(ws.title) in buscados), None)
+    if hoja_catalogo is None and hojas:
+        hoja_catalogo = hojas[0]
+
+    wanted_copia = normalizar_titulo(COPIA_CODIGOS_TITULO)
+    hoja_copia = next((ws for ws in hojas if normalizar_titulo(ws.title) == wanted_copia), None)
+    hoja_tipos = por_id.get(TIPO_GID)
+    return hoja_catalogo, hoja_copia, hoja_tipos
+
+
+def cargar_snapshot(spreadsheet, catalog_gid):
+    """
+    Descarga "Códigos Stock", "Copia de Códigos Stock" (I4:J) y las columnas E/I
+    de la hoja de tipos en un único values_batch_get y devuelve:
+    {
+        "generado_en": "2026-10-17T12:00:00",
+        "generado_ts": 1792238400.0,
+        "catalogo": {"ID1": {"nombre": ..., "precio": ...}, ...},
+        "rangos": {"A": [0, 8000, 11600], ...},
+        "tipos": {"ID1": "Aritos", ...},
+        "hojas": {"catalogo": ..., "copia": ..., "tipos": ...}
+    }
+    """
+    hoja_catalogo, hoja_copia, hoja_tipos = _resolver_hojas(spreadsheet, catalog_gid)
+    if hoja_catalogo is None:
+        raise RuntimeError("No se encontró la hoja 'Codigos Stock'")
+
+    # Rangos a pedir (sin repetir hojas compartidas). La hoja del catálogo se lee
+    # completa porque los "Rango de precio N" pueden estar en cualquier columna;
+    # el resto se acota a las columnas que realmente se usan.
+    rangos = {"catalogo": absolute_range_name(hoja_catalogo.title)}
+    anchos = {"catalogo": None}
+    if hoja_copia is not None:
+        rangos["copia"] = rango_a1(9, 10, fila_inicio=4, hoja=hoja_copia.title)      # I4:J
+        anchos["copia"] = 2
+    tipos_separada = hoja_tipos is not None and hoja_tipos.id != hoja_catalogo.id
+    if tipos_separada:
+        rangos["tipos_e"] = rango_a1(5, 5, fila_inicio=4, hoja=hoja_tipos.title)     # E4:E
+        rangos["tipos_i"] = rango_a1(9, 9, fila_inicio=4, hoja=hoja_tipos.title)     # I4:I
+        anchos["tipos_e"] = anchos["tipos_i"] = 1
+
+    claves = list(rangos.keys())
+    matrices = leer_rangos(spreadsheet, [rangos[k] for k in claves], anchos=[anchos[k] for k in claves])
+    valores = dict(zip(claves, matrices))
+    logger.info(f"Snapshot de catálogo: {len(claves)} rangos en 1 llamada ({', '.join(rangos.values())})")
+
+    valores_catalogo = valores["catalogo"]
+
+    # Catálogo: preferir "Copia de Códigos Stock" (I/J), si no, modo estándar por headers
+    catalogo = {}
+    if "copia" in valores:
+        catalogo = parsear_catalogo_copia(valores["copia"])
+        if catalogo:
+            logger.info(f"Catálogo (Copia de Códigos Stock): {len(catalogo)} códigos desde I (ID) y J (Nombre)")
+        else:
+            logger.warning("Hoja 'Copia de Códigos Stock' no produjo filas válidas (I+J)")
+    if not catalogo:
+        catalogo = parsear_catalogo_estandar(valores_catalogo)
+
+    if hoja_tipos is None:
+        logger.warning(f"No se encontró la hoja de tipos con GID {TIPO_GID}")
+        tipos = {}
+    elif tipos_separada:
+        tipos = parsear_tipos_columnas(columna(valores["tipos_i"]), columna(valores["tipos_e"]))
+        if not tipos:
+            # Estructura distinta a I/E: leer la hoja completa para detectar headers
+            logger.info("Hoja de tipos sin datos en I/E, usando detección por headers")
+            tipos = parsear_tipos(leer_rangos(spreadsheet, [absolute_range_name(hoja_tipos.title)])[0])
+    else:
+        tipos = parsear_tipos(valores_catalogo)
+
+    return {
+        "generado_en": datetime.now().isoformat(timespec="seconds"),
+        "generado_ts": time.time(),
+        "origen": "sheets",
+        "catalogo": catalogo,
+        "rangos": parsear_rangos_por_grupo(valores_catalogo),
+        "tipos": tipos,
+        "hojas": {
+            "catalogo": hoja_catalogo.title,
+            "copia": hoja_copia.title if hoja_copia is not None else None,
+            "tipos": hoja_tipos.title if hoja_tipos is not None else None,
+        },
+    }
+
+
+def guardar_snapshot_en_disco(snapshot, path=None):
+    """Escribe el snapshot de forma atómica (archivo temporal + os.replace)."""
+    path = Path(path or SNAPSHOT_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    contenido = json.dumps({"version": SNAPSHOT_VERSION, "snapshot": snapshot}, ensure_ascii=False)
+    fd, tmp_path = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def leer_snapshot_de_disco(path=None):
+    """Devuelve el snapshot guardado, o None si no existe / es de otra versión / está corrupto."""
+    path = Path(path or SNAPSHOT_PATH)
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception as e:
+        logger.warning(f"Snapshot local ilegible ({path.name}), se ignora: {e}")
+        return None
+    if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+        logger.info(f"Snapshot local con versión {data.get('version') if isinstance(data, dict) else '?'} != {SNAPSHOT_VERSION}, se ignora")
+        return None
+    snapshot = data.get("snapshot")
+    if not isinstance(snapshot, dict) or not isinstance(snapshot.get("catalogo"), dict):
+        return None
+    return snapshot
@@ -33,7 +33,7 @@ def init_db():
         return False
     engine = get_engine()
     # Importar modelos aquí para registrar metadata
-    from .models import Venta, Egreso, StockIngreso  # noqa: F401
+    from .models import Venta, Egreso, StockIngreso, SheetsOutbox  # noqa: F401
     Base.metadata.create_all(bind=engine)
     # Pequeña migración segura: agregar columna costo_unitario si no existe
     try:
@@ -47,4 +47,18 @@ def init_db():
     except Exception:
         # No romper si la migración falla; el resto de la app puede seguir usando JSON
         pass
+    # Columnas del envío diferido de egresos a la hoja (services.egresos_sync)
+    try:
+        with engine.begin() as conn:
+            for columna in (
+                "responsable varchar(100)",
+                "estado_sheet varchar(20)",
+                "intentos_sheet integer NOT NULL DEFAULT 0",
+                "error_sheet text",
+                "sheet_no_antes_de timestamp",
+                "enviado_sheet_at timestamp",
+            ):
+                conn.execute(text(f"ALTER TABLE egresos ADD COLUMN IF NOT EXISTS {columna}"))
+    except Exception:
+        pass
     return True
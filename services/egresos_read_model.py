@@ -0,0 +1,226 @@
+"""
+Modelo de lectura de egresos: /api/egresos/historial y /api/egresos/status sin
+ir a Apps Script en cada vista
+
+- Con DATABASE_URL el historial sale de la tabla 'egresos' (consulta local).
+- Sin base, la respuesta de 'listEgresos' queda en una caché con TTL
+  (EGRESOS_CACHE_TTL) y stale-while-revalidate (services.cache.RefreshingCache).
+- Cuando enviar_egresos tiene éxito, registrar_envio agrega las filas nuevas
+  a la caché (write-through) y la marca vencida para que se reconcilie con la hoja.
+- EGRESOS_RECONCILE_INTERVAL > 0 arranca un hilo que compara cada tanto las
+  últimas filas de la hoja con los egresos que la base da por enviados (por
+  fecha, motivo y costo) y deja las diferencias en estadisticas().
+"""
+import os
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List
+
+from services.cache import RefreshingCache
+from services import expenses_service
+
+logger = logging.getLogger(__name__)
+
+EGRESOS_CACHE_TTL = int(os.getenv("EGRESOS_CACHE_TTL", "300"))
+EGRESOS_STATUS_TTL = int(os.getenv("EGRESOS_STATUS_TTL", "60"))
+EGRESOS_RECONCILE_INTERVAL = int(os.getenv("EGRESOS_RECONCILE_INTERVAL", "0"))  # segundos, 0 = desactivado
+# La caché guarda siempre este máximo y cada vista toma su 'limit'
+LIMITE_CACHE = 500
+
+_lock = threading.Lock()
+_reconciliador = None
+_stats = {"lecturas_db": 0, "lecturas_cache": 0, "escrituras": 0, "reconciliaciones": 0,
+          "faltan_en_hoja": None, "solo_en_hoja": None, "ultima_reconciliacion": None, "ultimo_error": None}
+
+
+def _db_habilitada():
+    from services.db import DATABASE_URL
+    return bool(DATABASE_URL)
+
+
+def _cargar_desde_gas():
+    res = expenses_service.listar_egresos(limit=LIMITE_CACHE)
+    if not res.get("success"):
+        raise RuntimeError(res.get("error") or "listEgresos falló")
+    return list(res.get("rows") or [])
+
+
+def _cargar_estado():
+    res = expenses_service.estado_egresos()
+    if not res.get("success"):
+        raise RuntimeError(res.get("error") or "status falló")
+    return res
+
+
+_historial = RefreshingCache("egresos", _cargar_desde_gas, ttl_segundos=EGRESOS_CACHE_TTL)
+_estado = RefreshingCache("egresos_status", _cargar_estado, ttl_segundos=EGRESOS_STATUS_TTL)
+
+
+def _filas_db(limit):
+    from services.db import get_session
+    from services.egresos_repository import listar_egresos_db, egreso_a_fila
+
+    session = get_session()
+    try:
+        return [egreso_a_fila(e) for e in listar_egresos_db(session, limit=limit)]
+    finally:
+        session.close()
+
+
+def listar(limit: int = 200) -> Dict[str, Any]:
+    """Historial de egresos desde la base (o la caché de Apps Script sin base)."""
+    limit = max(1, int(limit))
+    try:
+        if _db_habilitada():
+            rows = _filas_db(limit)
+            with _lock:
+                _stats["lecturas_db"] += 1
+            return {"success": True, "rows": rows, "fuente": "db"}
+        rows = _historial.get()
+        with _lock:
+            _stats["lecturas_cache"] += 1
+        edad = _historial.edad_segundos()
+        return {
+            "success": True,
+            "rows": rows[:limit],
+            "fuente": "cache",
+            "cache_edad_s": round(edad, 1) if edad is not None else None,
+        }
+    except Exception as e:
+        logger.error(f"Error listando egresos: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def estado() -> Dict[str, Any]:
+    """Estado del Web App de egresos, cacheado EGRESOS_STATUS_TTL segundos."""
+    try:
+        res = dict(_estado.get())
+        edad = _estado.edad_segundos()
+        res["cache_edad_s"] = round(edad, 1) if edad is not None else None
+        return res
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def registrar_envio(egresos: List[Dict[str, Any]]) -> None:
+    """
+    Llamar cuando enviar_egresos tuvo éxito: las filas nuevas quedan visibles
+    en la caché de inmediato y la próxima lectura la reconcilia con la hoja.
+    """
+    filas = [
+        [expenses_service._norm_fecha(e.get("fecha", "")), str(e.get("motivo", "")), float(e.get("costo", 0) or 0),
+         str(e.get("tipo", "")), str(e.get("pago", "")), str(e.get("observaciones", ""))]
+        for e in egresos or []
+    ]
+    with _lock:
+        _stats["escrituras"] += 1
+    if filas:
+        _historial.modificar(lambda rows: (filas + list(rows or []))[:LIMITE_CACHE])
+    _historial.invalidar()
+    # lastRow cambió: el próximo status se pide de nuevo
+    _estado.invalidar()
+
+
+def _clave(fecha, motivo, costo):
+    """Identidad de una fila en la hoja: (DD/MM, motivo, costo); la hoja no guarda el id."""
+    try:
+        costo = round(float(costo), 2)
+    except (TypeError, ValueError):
+        costo = str(costo).strip()
+    return expenses_service._norm_fecha(fecha), str(motivo or "").strip(), costo
+
+
+def _enviados_db(limit):
+    """Claves de los últimos egresos que la base da por escritos en la hoja, del más nuevo al más viejo."""
+    from sqlalchemy import func, or_
+    from services.db import get_session
+    from services.models import Egreso
+
+    session = get_session()
+    try:
+        filas = (
+            session.query(Egreso)
+            # NULL: enviado en línea antes del envío diferido; pendiente/enviando/error no cuentan
+            .filter(or_(Egreso.estado_sheet.is_(None), Egreso.estado_sheet == "enviado"))
+            .order_by(func.coalesce(Egreso.enviado_sheet_at, Egreso.created_at).desc(), Egreso.id.desc())
+            .limit(int(limit))
+            .all()
+        )
+        return [(e.id, _clave(e.fecha.isoformat() if e.fecha else "", e.motivo, e.costo)) for e in filas]
+    finally:
+        session.close()
+
+
+def _comparar(hoja, enviados):
+    """
+    Empareja las filas de la hoja con los enviados (ambos en orden de envío). Los
+    enviados más viejos que el último emparejado quedan fuera de la ventana de
+    la hoja y no cuentan como faltantes.
+    """
+    en_hoja = Counter(_clave(*(list(fila) + ["", "", ""])[:3]) for fila in hoja)
+    faltan, ultimo_emparejado = [], -1
+    for pos, (egreso_id, clave) in enumerate(enviados):
+        if en_hoja[clave] > 0:
+            en_hoja[clave] -= 1
+            ultimo_emparejado = pos
+        else:
+            faltan.append((pos, egreso_id))
+    faltan = [egreso_id for pos, egreso_id in faltan if pos < ultimo_emparejado]
+    return faltan, sum(en_hoja.values())
+
+
+def reconciliar() -> Dict[str, Any]:
+    """
+    Compara las últimas filas de la hoja con los egresos enviados según la base:
+    faltan_en_hoja (ids enviados que no aparecen) y solo_en_hoja (filas manuales o
+    duplicadas por un reenvío). Sin base no hay con qué comparar.
+    """
+    try:
+        if not _db_habilitada():
+            return {"success": True, "fuente": "cache", "mensaje": "Sin DATABASE_URL no hay modelo local que comparar"}
+        hoja = _historial.refrescar()
+        faltan, solo_en_hoja = _comparar(hoja, _enviados_db(len(hoja)))
+        with _lock:
+            _stats["reconciliaciones"] += 1
+            _stats["faltan_en_hoja"] = len(faltan)
+            _stats["solo_en_hoja"] = solo_en_hoja
+            _stats["ultima_reconciliacion"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            _stats["ultimo_error"] = None
+        if faltan or solo_en_hoja:
+            logger.warning(f"Egresos: {len(faltan)} enviados no aparecen en la hoja (ids {faltan[:20]}), "
+                           f"{solo_en_hoja} filas de la hoja sin egreso enviado (últimas {len(hoja)})")
+        return {"success": True, "filas_hoja": len(hoja), "faltan_en_hoja": faltan, "solo_en_hoja": solo_en_hoja}
+    except Exception as e:
+        with _lock:
+            _stats["ultimo_error"] = str(e)
+        logger.warning(f"Egresos: reconciliación con la hoja falló: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def _loop():
+    while True:
+        time.sleep(EGRESOS_RECONCILE_INTERVAL)
+        reconciliar()
+
+
+def iniciar_reconciliador():
+    """Arranca la reconciliación periódica si EGRESOS_RECONCILE_INTERVAL > 0."""
+    global _reconciliador
+    if EGRESOS_RECONCILE_INTERVAL <= 0:
+        return False
+    with _lock:
+        if _reconciliador is None or not _reconciliador.is_alive():
+            _reconciliador = threading.Thread(target=_loop, name="egresos-reconcile", daemon=True)
+            _reconciliador.start()
+    return True
+
+
+def estadisticas():
+    with _lock:
+        resultado = dict(_stats)
+    resultado["fuente"] = "db" if _db_habilitada() else "cache"
+    resultado["cache_historial"] = _historial.estadisticas()
+    resultado["cache_status"] = _estado.estadisticas()
+    return resultado
@@ -32,6 +32,10 @@ def guardar_egresos(session, egresos: List[Dict[str, Any]]) -> int:
             tipo=str(e.get("tipo", ""))[:50],
             pago=str(e.get("pago", ""))[:50],
             observaciones=(str(e.get("observaciones", "")) or None),
+            responsable=(str(e.get("responsable", ""))[:100] or None),
+            # Lo envía a la hoja services.egresos_sync, fuera de la request
+            estado_sheet="pendiente",
+            intentos_sheet=0,
         )
         objetos.append(obj)
     if objetos:
@@ -44,6 +48,33 @@ def listar_egresos_db(session, limit: int = 200) -> List[Egreso]:
     return list(q)
 
 
+def egreso_a_fila(e: Egreso) -> List[Any]:
+    """Fila para el front: [fecha ISO, motivo, costo, tipo, pago, observaciones, id, estado_sheet]."""
+    return [
+        e.fecha.isoformat() if getattr(e, 'fecha', None) else '',
+        getattr(e, 'motivo', '') or '',
+        float(getattr(e, 'costo', 0) or 0),
+        getattr(e, 'tipo', '') or '',
+        getattr(e, 'pago', '') or '',
+        getattr(e, 'observaciones', '') or '',
+        int(getattr(e, 'id', 0) or 0),
+        getattr(e, 'estado_sheet', None) or 'enviado',  # NULL: anterior al envío diferido
+    ]
+
+
+def egreso_a_dict(e: Egreso) -> Dict[str, Any]:
+    """Egreso de la base en el formato que recibe expenses_service.enviar_egresos."""
+    return {
+        "fecha": e.fecha.isoformat() if e.fecha else "",
+        "motivo": e.motivo or "",
+        "costo": float(e.costo or 0),
+        "responsable": e.responsable or "",
+        "tipo": e.tipo or "",
+        "pago": e.pago or "",
+        "observaciones": e.observaciones or "",
+    }
+
+
 def eliminar_egreso_db(session, egreso_id: int) -> bool:
     obj = session.query(Egreso).filter(Egreso.id == int(egreso_id)).first()
     if not obj:
@@ -0,0 +1,269 @@
+"""
+Envío diferido de egresos a la hoja "Egresos diarios" (Apps Script)
+
+POST /api/egresos solo hace el commit en la tabla 'egresos' (estado_sheet =
+'pendiente') y despierta a este módulo; la request no espera a Apps Script.
+Un hilo despachador reclama lotes de pendientes (SELECT ... FOR UPDATE SKIP
+LOCKED + lease) y los envía en un ThreadPoolExecutor acotado a
+EGRESOS_SYNC_WORKERS envíos simultáneos. Si el envío falla el egreso vuelve a
+'pendiente' con backoff exponencial (sheet_no_antes_de); tras MAX_INTENTOS
+queda en 'error'. La tabla misma es la cola de reintentos: sobrevive a
+reinicios y la comparten todos los workers.
+
+Si el proceso muere con un envío en curso (o la respuesta se pierde), al
+vencer el lease el egreso se reenvía. Cada fila viaja con la clave
+"egreso:<id>" ("rowKeys", ver services.gas_append): la entrega es exactamente
+una vez solo si el Web App de EGRESOS_GAS_URL deduplica por esas claves como
+apps_script/Code.gs (_appendRows_); si no, es al menos una vez y un reenvío
+tras un timeout puede duplicar la fila.
+
+Requiere DATABASE_URL; sin base POST /api/egresos envía en línea como antes.
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+PENDIENTE = "pendiente"
+ENVIANDO = "enviando"
+ENVIADO = "enviado"
+ERROR = "error"
+
+WORKERS = max(1, int(os.getenv("EGRESOS_SYNC_WORKERS", "2")))
+LOTE_MAXIMO = 50
+LEASE_SEGUNDOS = 120
+MAX_INTENTOS = 8
+INTERVALO_SEGUNDOS = 30
+BACKOFF_BASE_SEGUNDOS = 5.0
+BACKOFF_MAX_SEGUNDOS = 600.0
+
+_lock = threading.Lock()
+_evento = threading.Event()
+_despachador = None
+_executor = None
+# Acota los envíos en vuelo: el despachador no reclama otro lote sin un hueco libre
+_cupos = threading.BoundedSemaphore(WORKERS)
+_stats = {"lotes": 0, "enviados": 0, "fallidos": 0, "en_vuelo": 0, "ultimo_error": None, "ultimo_envio": None}
+
+
+def habilitado():
+    from services.db import DATABASE_URL
+    return bool(DATABASE_URL)
+
+
+def _reclamar_lote():
+    """Pendientes listos para (re)intentar y envíos con lease vencido; les pone un lease."""
+    from sqlalchemy import and_, or_
+    from services.db import get_session
+    from services.models import Egreso
+    from services.egresos_repository import egreso_a_dict
+
+    session = get_session()
+    try:
+        ahora = datetime.now()
+        filas = (
+            session.query(Egreso)
+            .filter(or_(
+                and_(Egreso.estado_sheet == PENDIENTE,
+                     or_(Egreso.sheet_no_antes_de.is_(None), Egreso.sheet_no_antes_de <= ahora)),
+                and_(Egreso.estado_sheet == ENVIANDO, Egreso.sheet_no_antes_de < ahora),
+            ))
+            .order_by(Egreso.id)
+            .limit(LOTE_MAXIMO)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        lote = []
+        for fila in filas:
+            lote.append({"id": fila.id, "egreso": egreso_a_dict(fila), "intentos": fila.intentos_sheet or 0})
+            fila.estado_sheet = ENVIANDO
+            fila.sheet_no_antes_de = ahora + timedelta(seconds=LEASE_SEGUNDOS)
+        session.commit()
+        return lote
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _actualizar(cambios):
+    """cambios: {egreso_id: {columna: valor}} en una transacción."""
+    if not cambios:
+        return
+    from services.db import get_session
+    from services.models import Egreso
+
+    session = get_session()
+    try:
+        for fila in session.query(Egreso).filter(Egreso.id.in_(list(cambios))):
+            for columna, valor in cambios[fila.id].items():
+                setattr(fila, columna, valor)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _fallo(item, mensaje):
+    intentos = item["intentos"] + 1
+    espera = min(BACKOFF_MAX_SEGUNDOS, BACKOFF_BASE_SEGUNDOS * (2 ** (intentos - 1)))
+    return {
+        "estado_sheet": ERROR if intentos >= MAX_INTENTOS else PENDIENTE,
+        "intentos_sheet": intentos,
+        "error_sheet": str(mensaje)[:2000],
+        "sheet_no_antes_de": datetime.now() + timedelta(seconds=espera),
+    }
+
+
+def _claves_filas(lote):
+    # Por egreso: no cambia si el reintento se reclama junto con otras filas
+    return [f"egreso:{item['id']}" for item in lote]
+
+
+def _enviar(lote):
+    """Envía un lote reclamado a Apps Script y registra el resultado por egreso."""
+    from services.expenses_service import enviar_egresos
+    from services import egresos_read_model
+
+    try:
+        try:
+            res = enviar_egresos([item["egreso"] for item in lote], claves_filas=_claves_filas(lote))
+        except Exception as e:
+            res = {"success": False, "error": str(e)}
+        ahora = datetime.now()
+        if res.get("success"):
+            cambios = {
+                item["id"]: {"estado_sheet": ENVIADO, "enviado_sheet_at": ahora,
+                             "sheet_no_antes_de": None, "error_sheet": None}
+                for item in lote
+            }
+            egresos_read_model.registrar_envio([item["egreso"] for item in lote])
+        else:
+            mensaje = res.get("error") or res.get("detalle") or "GAS export failed"
+            cambios = {item["id"]: _fallo(item, mensaje) for item in lote}
+        _actualizar(cambios)
+        with _lock:
+            _stats["lotes"] += 1
+            if res.get("success"):
+                _stats["enviados"] += len(lote)
+                _stats["ultimo_envio"] = ahora.isoformat(timespec="seconds")
+            else:
+                _stats["fallidos"] += len(lote)
+                _stats["ultimo_error"] = str(mensaje)
+        logger.info(f"Egresos: lote de {len(lote)} {'enviado a la hoja' if res.get('success') else 'falló, se reintenta'}")
+    except Exception as e:
+        # El lease vence y el lote se vuelve a reclamar
+        logger.error(f"Egresos: error registrando el envío a la hoja: {e}", exc_info=True)
+        with _lock:
+            _stats["ultimo_error"] = str(e)
+    finally:
+        with _lock:
+            _stats["en_vuelo"] -= 1
+        _cupos.release()
+        despertar()
+
+
+def _despachar():
+    """Reclama lotes mientras haya pendientes y cupo en el executor. Devuelve cuántos lanzó."""
+    lanzados = 0
+    while _cupos.acquire(blocking=False):
+        try:
+            lote = _reclamar_lote()
+        except Exception:
+            _cupos.release()
+            raise
+        if not lote:
+            _cupos.release()
+            break
+        with _lock:
+            _stats["en_vuelo"] += 1
+        _executor.submit(_enviar, lote)
+        lanzados += 1
+    return lanzados
+
+
+def _loop():
+    while True:
+        try:
+            _despachar()
+        except Exception as e:
+            logger.error(f"Egresos: error reclamando pendientes: {e}", exc_info=True)
+            with _lock:
+                _stats["ultimo_error"] = str(e)
+        # Reintentos con backoff vencido o lotes nuevos: se revisa cada INTERVALO o al despertar
+        _evento.wait(timeout=INTERVALO_SEGUNDOS)
+        _evento.clear()
+
+
+def iniciar_worker():
+    """Arranca el despachador y el executor (no hace nada sin DATABASE_URL)."""
+    global _despachador, _executor
+    if not habilitado():
+        return False
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="egresos-sync")
+        if _despachador is None or not _despachador.is_alive():
+            _despachador = threading.Thread(target=_loop, name="egresos-sync-dispatch", daemon=True)
+            _despachador.start()
+    return True
+
+
+def encolar():
+    """Llamar tras el commit de nuevos egresos: el envío ocurre en segundo plano."""
+    if iniciar_worker():
+        despertar()
+        return True
+    return False
+
+
+def despertar():
+    _evento.set()
+
+
+def esperar_vacio(timeout=30.0):
+    """Espera a que no queden pendientes listos ni envíos en vuelo (pruebas y apagado)."""
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        with _lock:
+            en_vuelo = _stats["en_vuelo"]
+        if not en_vuelo and not estadisticas().get("egresos", {}).get(PENDIENTE):
+            return True
+        despertar()
+        time.sleep(0.05)
+    return False
+
+
+def estadisticas():
+    with _lock:
+        resultado = dict(_stats)
+    resultado.update(habilitado=habilitado(), workers=WORKERS,
+                     activo=bool(_despachador and _despachador.is_alive()))
+    if not resultado["habilitado"]:
+        return resultado
+    try:
+        from sqlalchemy import func
+        from services.db import get_session
+        from services.models import Egreso
+
+        session = get_session()
+        try:
+            filas = (
+                session.query(Egreso.estado_sheet, func.count(Egreso.id))
+                .filter(Egreso.estado_sheet.isnot(None))
+                .group_by(Egreso.estado_sheet)
+                .all()
+            )
+        finally:
+            session.close()
+        resultado["egresos"] = {estado: n for estado, n in filas}
+    except Exception as e:
+        resultado["egresos"] = {"error": str(e)}
+    return resultado
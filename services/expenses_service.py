@@ -1,10 +1,9 @@
 import os
-import json
-import urllib.request
-import urllib.error
 from datetime import datetime
 from typing import List, Dict, Any
 
+from services import gas_append, http_transport
+
 # GAS Web App URL para EGRESOS
 # Se puede configurar por env EGRESOS_GAS_URL
 EGRESOS_GAS_URL = os.getenv(
@@ -19,20 +18,12 @@ EGRESOS_API_KEY = os.getenv("EGRESOS_API_KEY", "").strip()
 def _post_gas(payload: Dict[str, Any], timeout: int | None = 20) -> Dict[str, Any]:
     if not EGRESOS_GAS_URL:
         raise RuntimeError("EGRESOS_GAS_URL no configurado")
-    body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(EGRESOS_GAS_URL, data=body, method="POST")
-    req.add_header("Content-Type", "application/json")
-    if EGRESOS_API_KEY:
-        req.add_header("X-API-Key", EGRESOS_API_KEY)
-    try:
-        with urllib.request.urlopen(req, timeout=timeout or 20) as resp:
-            data = resp.read().decode("utf-8")
-            return json.loads(data) if data else {"success": True}
-    except urllib.error.HTTPError as e:
-        err_text = e.read().decode("utf-8", errors="ignore")
-        raise RuntimeError(f"HTTP {e.code}: {err_text}")
-    except urllib.error.URLError as e:
-        raise RuntimeError(f"Conexión fallida: {e}")
+    headers = {"X-API-Key": EGRESOS_API_KEY} if EGRESOS_API_KEY else None
+    # Conexión keep-alive compartida (services.http_transport)
+    resp = http_transport.post_json(EGRESOS_GAS_URL, payload, headers=headers, timeout=timeout or 20)
+    if not resp.ok:
+        raise RuntimeError(f"HTTP {resp.status}: {resp.texto()}")
+    return resp.json() if resp.body else {"success": True}
 
 
 def _norm_fecha(fecha_str: str) -> str:
@@ -59,18 +50,25 @@ def _map_egreso_to_row(egreso: Dict[str, Any]) -> List[Any]:
     ]
 
 
-def enviar_egresos(egresos: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Envía uno o varios egresos al Apps Script (appendRows)."""
+def enviar_egresos(egresos: List[Dict[str, Any]], clave_lote: str | None = None,
+                   claves_filas: List[str] | None = None) -> Dict[str, Any]:
+    """
+    Envía uno o varios egresos al Apps Script (appendRows en partes, ver
+    services.gas_append). Reenviar con la misma clave_lote, o las mismas
+    claves_filas (una por egreso), no duplica filas si el Web App de egresos
+    deduplica por "key"/"rowKeys" como apps_script/Code.gs.
+    """
     if not egresos:
         return {"success": False, "error": "NO_HAY_EGRESOS", "mensaje": "No hay egresos para enviar"}
 
     rows = [_map_egreso_to_row(e) for e in egresos]
-    payload = {"action": "appendRows", "sheetName": EGRESOS_SHEET_NAME, "rows": rows}
+    payload_base = {"sheetName": EGRESOS_SHEET_NAME}
     if EGRESOS_SHEET_ID:
-        payload["sheetId"] = EGRESOS_SHEET_ID
-    res = _post_gas(payload)
-    if not res or not res.get("success", False):
-        return {"success": False, "error": res.get("error") if isinstance(res, dict) else "API_ERROR", "detalle": res}
+        payload_base["sheetId"] = EGRESOS_SHEET_ID
+    res = gas_append.append_rows(_post_gas, rows, payload_base=payload_base, clave_lote=clave_lote,
+                                 claves_filas=claves_filas)
+    if not res["success"]:
+        return {"success": False, "error": "; ".join(res["errores"]) or "API_ERROR", "detalle": res}
     return {"success": True, "egresos_enviados": len(rows), "detalle": res}
 
 
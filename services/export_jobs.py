@@ -0,0 +1,292 @@
+"""
+Cola durable de exportaciones a Google Sheets (SQLite en data/export_jobs.db)
+
+POST /api/exportar encola un job con la copia de las ventas y responde de
+inmediato con su ID; un hilo worker por proceso lo ejecuta (FIFO de costos,
+escritura en Sheets, historial) y va registrando progreso, filas escritas y
+errores, que se consultan en /api/exportar/<job_id>.
+
+Cada job lo ejecuta el proceso que lo encoló (las ventas pendientes viven en su
+memoria). Mientras corre, un latido renueva actualizado_ts cada LATIDO_SEGUNDOS.
+Si el proceso dueño muere (pid inexistente y sin latido), otro worker retoma los
+jobs que no llegaron a empezar; los que quedaron a medio escribir se marcan como
+interrumpidos para no duplicar filas en la hoja.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = Path(__file__).resolve().parent.parent / "data" / "export_jobs.db"
+# Sin latido durante este tiempo, el proceso dueño del job se considera caído
+JOB_HUERFANO_SEGUNDOS = 600
+# Cada cuánto renueva actualizado_ts un job en curso (esperas del rate limiter, Retry-After...)
+LATIDO_SEGUNDOS = 60
+# Jobs terminados que se conservan para consulta
+RETENCION_SEGUNDOS = 7 * 24 * 3600
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+ERROR = "error"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    pid INTEGER,
+    creado_ts REAL NOT NULL,
+    actualizado_ts REAL NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    etapa TEXT,
+    filas_escritas INTEGER NOT NULL DEFAULT 0,
+    errores TEXT,
+    resultado TEXT,
+    payload TEXT NOT NULL
+)
+"""
+
+_lock = threading.Lock()
+_evento = threading.Event()
+_worker = None
+_procesar = None
+# Jobs que está ejecutando este proceso (un pid reutilizado tras un reinicio no los tiene)
+_jobs_locales = set()
+
+
+def _conectar():
+    JOBS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(JOBS_DB_PATH), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def _fila_a_dict(row):
+    if row is None:
+        return None
+    return {
+        "job_id": row["id"],
+        "estado": row["estado"],
+        "etapa": row["etapa"],
+        "total": row["total"],
+        "filas_escritas": row["filas_escritas"],
+        "errores": json.loads(row["errores"]) if row["errores"] else [],
+        "resultado": json.loads(row["resultado"]) if row["resultado"] else None,
+        "creado_ts": row["creado_ts"],
+        "actualizado_ts": row["actualizado_ts"],
+    }
+
+
+def encolar(ventas):
+    """Guarda el job (con la copia de las ventas) y despierta al worker. Devuelve el job_id."""
+    job_id = uuid.uuid4().hex
+    ahora = time.time()
+    conn = _conectar()
+    try:
+        conn.execute(
+            "INSERT INTO export_jobs (id, estado, pid, creado_ts, actualizado_ts, total, etapa, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, PENDIENTE, os.getpid(), ahora, ahora, len(ventas), "en cola",
+             json.dumps(ventas, ensure_ascii=False, default=str)),
+        )
+    finally:
+        conn.close()
+    _asegurar_worker()
+    _evento.set()
+    logger.info(f"Exportación encolada: job {job_id} ({len(ventas)} ventas)")
+    return job_id
+
+
+def obtener(job_id):
+    conn = _conectar()
+    try:
+        row = conn.execute("SELECT * FROM export_jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return _fila_a_dict(row)
+
+
+def _actualizar(job_id, **campos):
+    campos["actualizado_ts"] = time.time()
+    for clave in ("errores", "resultado"):
+        if clave in campos and not isinstance(campos[clave], str):
+            campos[clave] = json.dumps(campos[clave], ensure_ascii=False, default=str)
+    columnas = ", ".join(f"{c} = ?" for c in campos)
+    conn = _conectar()
+    try:
+        conn.execute(f"UPDATE export_jobs SET {columnas} WHERE id = ?", (*campos.values(), job_id))
+    finally:
+        conn.close()
+
+
+def _proceso_vivo(pid):
+    """True si el pid existe en esta máquina (la base SQLite es local, los workers también)."""
+    if not pid:
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True  # existe pero es de otro usuario, o no se puede saber
+    return True
+
+
+def _recuperar_huerfanos(conn):
+    """
+    Reasigna jobs sin empezar de procesos caídos; marca como interrumpidos los que
+    estaban en curso. Solo jobs sin latido reciente cuyo proceso dueño ya no existe
+    (o, con el mismo pid que este proceso, que este proceso no está ejecutando).
+    """
+    limite = time.time() - JOB_HUERFANO_SEGUNDOS
+    candidatos = conn.execute(
+        "SELECT id, estado, pid FROM export_jobs WHERE estado IN (?, ?) AND pid IS NOT NULL AND actualizado_ts < ?",
+        (PENDIENTE, EN_CURSO, limite),
+    ).fetchall()
+    for row in candidatos:
+        if row["pid"] == os.getpid():
+            # Pendientes propios los toma este mismo worker
+            if row["estado"] == PENDIENTE or row["id"] in _jobs_locales:
+                continue
+        elif _proceso_vivo(row["pid"]):
+            continue
+        if row["estado"] == PENDIENTE:
+            conn.execute("UPDATE export_jobs SET pid = NULL WHERE id = ?", (row["id"],))
+        else:
+            conn.execute(
+                "UPDATE export_jobs SET estado = ?, etapa = ?, actualizado_ts = ? WHERE id = ?",
+                (ERROR, "interrumpido: verificar la hoja antes de reintentar", time.time(), row["id"]),
+            )
+            logger.warning(f"Job {row['id']}: ningún proceso lo está ejecutando (pid {row['pid']}), se marca como interrumpido")
+    conn.execute(
+        "DELETE FROM export_jobs WHERE estado IN (?, ?) AND actualizado_ts < ?",
+        (COMPLETADO, ERROR, time.time() - RETENCION_SEGUNDOS),
+    )
+
+
+def _tomar_siguiente():
+    """Reclama atómicamente el job pendiente más antiguo de este proceso (o sin dueño)."""
+    conn = _conectar()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _recuperar_huerfanos(conn)
+            row = conn.execute(
+                "SELECT * FROM export_jobs WHERE estado = ? AND (pid = ? OR pid IS NULL) "
+                "ORDER BY creado_ts LIMIT 1",
+                (PENDIENTE, os.getpid()),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE export_jobs SET estado = ?, pid = ?, etapa = ?, actualizado_ts = ? WHERE id = ?",
+                    (EN_CURSO, os.getpid(), "iniciando", time.time(), row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return row
+
+
+def _ejecutar(row):
+    job_id = row["id"]
+    ventas = json.loads(row["payload"])
+
+    def progreso(etapa, filas_escritas=None):
+        campos = {"etapa": etapa}
+        if filas_escritas is not None:
+            campos["filas_escritas"] = int(filas_escritas)
+        _actualizar(job_id, **campos)
+
+    # Latido: un job lento pero vivo no parece huérfano a los otros workers
+    fin_latido = threading.Event()
+
+    def latir():
+        while not fin_latido.wait(LATIDO_SEGUNDOS):
+            try:
+                _actualizar(job_id)
+            except Exception as e:
+                logger.warning(f"Job {job_id}: no se pudo registrar el latido: {e}")
+
+    threading.Thread(target=latir, name=f"export-job-latido-{job_id[:8]}", daemon=True).start()
+    _jobs_locales.add(job_id)
+    try:
+        resultado = _procesar(ventas, progreso, job_id) or {}
+        estado = COMPLETADO if resultado.get("success") else ERROR
+        errores = resultado.get("errores") or ([resultado["mensaje"]] if estado == ERROR and resultado.get("mensaje") else [])
+        # La lista enriquecida es interna: no se guarda completa en el resultado
+        resultado = {k: v for k, v in resultado.items() if k != "ventas_exportadas_items"}
+        _actualizar(
+            job_id,
+            estado=estado,
+            etapa="terminado",
+            filas_escritas=int(resultado.get("ventas_exportadas") or 0),
+            errores=errores,
+            resultado=resultado,
+        )
+        logger.info(f"Job {job_id}: {estado} ({resultado.get('ventas_exportadas', 0)}/{len(ventas)} filas)")
+    except Exception as e:
+        logger.error(f"Job {job_id} falló: {e}", exc_info=True)
+        _actualizar(job_id, estado=ERROR, etapa="error", errores=[str(e)])
+    finally:
+        fin_latido.set()
+        _jobs_locales.discard(job_id)
+
+
+def _loop():
+    while True:
+        try:
+            row = _tomar_siguiente()
+        except Exception as e:
+            logger.error(f"Cola de exportación no disponible: {e}")
+            row = None
+        if row is None:
+            _evento.wait(timeout=30)
+            _evento.clear()
+            continue
+        _ejecutar(row)
+
+
+def _asegurar_worker():
+    global _worker
+    with _lock:
+        if _procesar is None:
+            raise RuntimeError("export_jobs: falta configurar la función de exportación (iniciar_worker)")
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_loop, name="export-jobs", daemon=True)
+            _worker.start()
+
+
+def iniciar_worker(procesar):
+    """
+    Registra la función que ejecuta un job y arranca el hilo worker del proceso.
+    procesar(ventas, progreso, job_id) -> dict de resultado (mismo formato que la exportación directa);
+    progreso(etapa, filas_escritas=None) registra el avance.
+    """
+    global _procesar
+    _procesar = procesar
+    _asegurar_worker()
+    _evento.set()  # retomar jobs pendientes que hayan quedado de una ejecución anterior
+
+
+def estadisticas():
+    try:
+        conn = _conectar()
+        try:
+            filas = conn.execute("SELECT estado, COUNT(*) AS n FROM export_jobs GROUP BY estado").fetchall()
+        finally:
+            conn.close()
+        por_estado = {row["estado"]: row["n"] for row in filas}
+    except Exception as e:
+        por_estado = {"error": str(e)}
+    return {"worker_activo": bool(_worker and _worker.is_alive()), "jobs": por_estado}
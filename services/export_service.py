@@ -1,18 +1,34 @@
+"""
+Exportación de ventas a Excel y a una hoja fija de Google Sheets ('Export Ventas')
+"""
 import os
-import time
-import random
 from pathlib import Path
 import pandas as pd
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-{{ ... }}
-            "url": f"https://docs.google.com/spreadsheets/d/{GOOGLE_SHEETS_CONFIG['SHEET_ID']}/edit#gid={worksheet.id}"
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "message": f"Error al exportar a Google Sheets: {str(e)}"
-        }
+from config import FILE_CONFIG, GOOGLE_SHEETS_CONFIG
+from . import google_client, rate_limiter
+
+# Columnas A..I de la hoja de exportación (mismo orden que la hoja de ventas)
+COLUMNS = [
+    "Fecha", "Notas", "ID", "Nombre del Elemento", "Precio",
+    "Unidades", "Precio Unitario", "Costo U", "Tipo",
+]
+
+
+def exportar_excel(ventas: list[dict] = None, archivo: str | Path | None = None) -> Path:
+    """Escribe las ventas (por defecto las de memoria) en un .xlsx y devuelve su ruta."""
+    if ventas is None:
+        from .sales_service import listar_ventas
+        ventas = listar_ventas()
+    destino = Path(archivo or Path(FILE_CONFIG["DATA_DIR"]) / "ventas_export.xlsx")
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    filas = [
+        [v.get("fecha", ""), v.get("notas", ""), v.get("id", ""), v.get("nombre", ""), v.get("precio", ""),
+         v.get("unidades", ""), v.get("precio", ""), "", ""]
+        for v in ventas or []
+    ]
+    pd.DataFrame(filas, columns=COLUMNS).to_excel(destino, index=False)
+    return destino
 
 def exportar_ventas_seguro_google_sheets(
     ventas: list[dict] = None,
@@ -23,7 +39,7 @@ def exportar_ventas_seguro_google_sheets(
     """
     Exporta TODAS las Ventas en UNA sola actualización por rango.
     - Minimiza cuota (una llamada grande)
-    - Re intentos con backoff ante 409/429
+    - Re intentos con backoff ante 409/429 (limitador central)
     - Usa hoja fija (por defecto 'Export Ventas' o env GOOGLE_SHEETS_EXPORT_SHEET_NAME)
     """
     try:
@@ -34,7 +50,7 @@ def exportar_ventas_seguro_google_sheets(
             except Exception:
                 pass
 
-        if not Ventas:
+        if not ventas:
             return {"success": True, "message": "No hay datos para exportar"}
 
         target_sheet_name = (
@@ -43,24 +59,17 @@ def exportar_ventas_seguro_google_sheets(
             or "Export Ventas"
         )
 
-        # Autenticación con normalización de private_key
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        creds_dict = dict(GOOGLE_SHEETS_CONFIG.get("CREDENTIALS") or {})
-        if isinstance(creds_dict.get("private_key"), str):
-            creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-
-        # Abrir spreadsheet/hoja
-        sheet = client.open_by_key(GOOGLE_SHEETS_CONFIG["SHEET_ID"])
+        # Cliente y hoja compartidos por el proceso (sin re-autorizar por exportación)
+        sheet = google_client.get_spreadsheet(GOOGLE_SHEETS_CONFIG["SHEET_ID"])
         try:
-            worksheet = sheet.worksheet(target_sheet_name)
+            worksheet = google_client.get_worksheet(GOOGLE_SHEETS_CONFIG["SHEET_ID"], titulo=target_sheet_name)
         except gspread.WorksheetNotFound:
             worksheet = sheet.add_worksheet(
                 title=target_sheet_name,
-                rows=max(1000, len(Ventas) + 10),
+                rows=max(1000, len(ventas) + 10),
                 cols=len(COLUMNS),
             )
+            google_client.registrar_worksheet(worksheet, GOOGLE_SHEETS_CONFIG["SHEET_ID"])
 
         # Encabezados A1:I1
         try:
@@ -72,7 +81,7 @@ def exportar_ventas_seguro_google_sheets(
 
         # Preparar filas A..I
         batch_data = []
-        for v in Ventas:
+        for v in ventas:
             batch_data.append([
                 v.get("fecha", ""),
                 v.get("notas", ""),
@@ -98,35 +107,21 @@ def exportar_ventas_seguro_google_sheets(
             except Exception:
                 pass
 
-        # ÚNICA llamada (o mínima) con backoff anti-409/429
+        # ÚNICA llamada (o mínima); los reintentos ante 409/429 los hace services.rate_limiter
         start_row = 2
         written = 0
-        while written < len(batch_data):
-            chunk = batch_data[written: written + chunk_size]
-            end_row = start_row + len(chunk) - 1
-            rng_left = f"A{start_row}:C{end_row}"
-            rng_right = f"E{start_row}:I{end_row}"
-            max_attempts = 5
-            base_sleep = 0.5
-            for attempt in range(max_attempts):
-                try:
-                    left = [row[0:3] for row in chunk]
-                    right = [row[4:9] for row in chunk]
-                    worksheet.update(rng_left, left, value_input_option='USER_ENTERED')
-                    worksheet.update(rng_right, right, value_input_option='USER_ENTERED')
-                    break
-                except gspread.exceptions.APIError as e:
-                    msg = str(e).lower()
-                    transient = (
-                        '409' in msg or 'quota' in msg or 'rate' in msg or 'exceeded' in msg or 'backend' in msg or 'internal error' in msg
-                    )
-                    if transient and attempt < max_attempts - 1:
-                        delay = base_sleep * (2 ** attempt) + random.uniform(0, 0.25)
-                        time.sleep(delay)
-                        continue
-                    raise
-            written += len(chunk)
-            start_row = end_row + 1
+        with rate_limiter.con_prioridad(rate_limiter.PRIORIDAD_MASIVA):
+            while written < len(batch_data):
+                chunk = batch_data[written: written + chunk_size]
+                end_row = start_row + len(chunk) - 1
+                rng_left = f"A{start_row}:C{end_row}"
+                rng_right = f"E{start_row}:I{end_row}"
+                left = [row[0:3] for row in chunk]
+                right = [row[4:9] for row in chunk]
+                worksheet.update(rng_left, left, value_input_option='USER_ENTERED')
+                worksheet.update(rng_right, right, value_input_option='USER_ENTERED')
+                written += len(chunk)
+                start_row = end_row + 1
 
         return {
             "success": True,
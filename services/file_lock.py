@@ -0,0 +1,60 @@
+"""
+Lock de archivo entre procesos (workers de gunicorn) y entre hilos del proceso,
+y escritura atómica para los archivos de estado compartido en data/
+"""
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo lock dentro del proceso
+    fcntl = None
+
+_locks_locales = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_local(path):
+    with _locks_guard:
+        return _locks_locales.setdefault(str(path), threading.Lock())
+
+
+@contextmanager
+def lock_archivo(path):
+    """Lock exclusivo asociado a 'path' (se usa el archivo hermano '<path>.lock')."""
+    path = Path(path)
+    with _lock_local(path):
+        if fcntl is None:
+            yield
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(path) + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def escribir_atomico(path, contenido: str, modo=None):
+    """Escribe 'contenido' vía archivo temporal + fsync + os.replace (opcionalmente con chmod)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=str(path.parent))
+    try:
+        if modo is not None:
+            os.chmod(tmp_path, modo)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,120 @@
+"""
+appendRows a Apps Script en partes, en paralelo e idempotente
+
+Las filas se dividen en partes acotadas por cantidad (APPEND_CHUNK_ROWS) y por
+tamaño del JSON (APPEND_CHUNK_BYTES) para no chocar con los límites de payload
+y tiempo de ejecución de Apps Script. Se envían hasta APPEND_PARALLEL partes a
+la vez; cada una lleva una clave de idempotencia ("key") derivada de la clave
+del lote, su índice y su contenido. apps_script/Code.gs escribe bajo
+LockService y responde duplicate=true si la clave ya se escribió, así que
+reintentar una parte (APPEND_RETRIES veces, o en un reenvío posterior con la
+misma clave de lote) nunca duplica filas.
+
+Si las filas tienen identidad propia (ej. egresos de la base) se pasan
+claves_filas: cada fila viaja con su clave en "rowKeys" y el script omite las
+ya escritas, aunque la fila se reenvíe dentro de otra parte u otro lote.
+
+Con APPEND_PARALLEL > 1 las partes pueden quedar en la hoja en otro orden;
+APPEND_PARALLEL=1 conserva el orden.
+"""
+import json
+import time
+import uuid
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import GOOGLE_APPS_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+
+def dividir(rows, max_filas=None, max_bytes=None):
+    """Índices [(desde, hasta)] de partes con a lo sumo max_filas filas y ~max_bytes de JSON."""
+    max_filas = max(1, int(max_filas or GOOGLE_APPS_SCRIPT.get("APPEND_CHUNK_ROWS", 200)))
+    max_bytes = max(1, int(max_bytes or GOOGLE_APPS_SCRIPT.get("APPEND_CHUNK_BYTES", 400000)))
+    partes = []
+    desde, tamaño = 0, 0
+    for i, row in enumerate(rows):
+        bytes_fila = len(json.dumps(row, ensure_ascii=False, default=str).encode("utf-8")) + 1
+        if i > desde and (i - desde >= max_filas or tamaño + bytes_fila > max_bytes):
+            partes.append((desde, i))
+            desde, tamaño = i, 0
+        tamaño += bytes_fila
+    if desde < len(rows):
+        partes.append((desde, len(rows)))
+    return partes
+
+
+def clave_parte(clave_lote, indice, rows):
+    contenido = json.dumps(rows, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(f"{clave_lote}:{indice}:{contenido}".encode("utf-8")).hexdigest()[:40]
+
+
+def _enviar_parte(post, payload, reintentos):
+    ultimo = None
+    for intento in range(reintentos + 1):
+        try:
+            res = post(payload)
+            if res and res.get("success"):
+                return res
+            ultimo = res
+        except Exception as e:
+            ultimo = str(e)
+        if intento < reintentos:
+            # La clave hace seguro el reintento aunque la parte haya llegado a escribirse
+            time.sleep(min(8.0, 0.5 * (2 ** intento)))
+    raise RuntimeError(ultimo if isinstance(ultimo, str) else json.dumps(ultimo, default=str))
+
+
+def append_rows(post, rows, payload_base=None, clave_lote=None, claves_filas=None):
+    """
+    Envía 'rows' con action=appendRows vía post(payload) -> dict.
+    payload_base: campos extra de cada payload (ej. sheetName/sheetId).
+    clave_lote: identifica la escritura; repetirla con la misma clave no duplica
+    filas (por defecto una nueva por llamada, idempotente solo entre reintentos).
+    claves_filas: clave por fila (misma longitud que rows), para deduplicar fila a fila.
+    Devuelve {"success", "filas_enviadas", "partes", "duplicadas", "errores", "inicio_por_parte"}.
+    """
+    if not rows:
+        return {"success": False, "error": "NO_ROWS", "filas_enviadas": 0, "partes": 0, "errores": []}
+    clave_lote = clave_lote or uuid.uuid4().hex
+    paralelo = max(1, int(GOOGLE_APPS_SCRIPT.get("APPEND_PARALLEL", 3)))
+    reintentos = max(0, int(GOOGLE_APPS_SCRIPT.get("APPEND_RETRIES", 2)))
+
+    partes = dividir(rows)
+    payloads = []
+    for indice, (desde, hasta) in enumerate(partes):
+        lote = rows[desde:hasta]
+        payload = dict(payload_base or {})
+        if claves_filas:
+            # La clave de la parte sale de sus filas: no depende de con qué otras se agrupe
+            claves = [str(c) for c in claves_filas[desde:hasta]]
+            payload.update({"action": "appendRows", "rows": lote, "rowKeys": claves,
+                            "key": clave_parte("filas", 0, claves)})
+        else:
+            payload.update({"action": "appendRows", "rows": lote, "key": clave_parte(clave_lote, indice, lote)})
+        payloads.append(payload)
+
+    resultados = [None] * len(payloads)
+    errores = []
+    with ThreadPoolExecutor(max_workers=min(paralelo, len(payloads))) as executor:
+        futuros = [executor.submit(_enviar_parte, post, p, reintentos) for p in payloads]
+        for i, futuro in enumerate(futuros):
+            try:
+                resultados[i] = futuro.result()
+            except Exception as e:
+                errores.append(f"parte {i + 1}/{len(payloads)}: {e}")
+
+    enviadas = sum(hasta - desde for (desde, hasta), res in zip(partes, resultados) if res)
+    duplicadas = sum(1 for res in resultados if res and res.get("duplicate"))
+    if duplicadas:
+        logger.info(f"appendRows: {duplicadas} partes ya estaban escritas (clave repetida)")
+    return {
+        "success": not errores,
+        "filas_enviadas": enviadas,
+        "partes": len(payloads),
+        "duplicadas": duplicadas,
+        "errores": errores,
+        "inicio_por_parte": [res.get("startRow") if res else None for res in resultados],
+    }
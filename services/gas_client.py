@@ -1,9 +1,8 @@
 import os
-import json
 from typing import List, Dict, Optional
-import requests
 
 from config import GOOGLE_APPS_SCRIPT
+from services import http_transport
 
 DEFAULT_TIMEOUT = 15
 
@@ -17,7 +16,7 @@ class GASClient:
         return bool(self.base_url)
 
     def _headers(self) -> Dict[str, str]:
-        headers = {"Content-Type": "application/json"}
+        headers = {}
         if self.api_key:
             headers["Authorization"] = f"Bearer {self.api_key}"
         return headers
@@ -32,17 +31,12 @@ class GASClient:
 
         payload = {"articulos": articulos}
         try:
-            resp = requests.post(self.base_url, headers=self._headers(), data=json.dumps(payload), timeout=self.timeout)
-            resp.raise_for_status()
+            resp = http_transport.post_json(self.base_url, payload, headers=self._headers(), timeout=self.timeout)
+            if not resp.ok:
+                # capturar cuerpo para debug
+                return {"success": False, "error": f"HTTP {resp.status}", "details": resp.texto()}
             data = resp.json()
             return {"success": data.get("status") == "success", "data": data}
-        except requests.HTTPError as e:
-            # capturar cuerpo para debug
-            try:
-                details = resp.text
-            except Exception:
-                details = str(e)
-            return {"success": False, "error": f"HTTP {resp.status_code}", "details": details}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
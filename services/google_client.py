@@ -0,0 +1,209 @@
+"""
+Proveedor compartido de credenciales y cliente gspread
+
+Parsea las credenciales y autoriza el cliente UNA vez por proceso, y cachea los
+handles de Spreadsheet/Worksheet por sheet_id y GID/título. Los servicios que
+usan Google Sheets piden el cliente aquí en lugar de autorizar cada uno el suyo.
+El token de acceso lo renueva google-auth automáticamente al vencer.
+"""
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+import gspread
+from gspread.auth import DEFAULT_SCOPES
+from gspread.http_client import HTTPClient
+
+from config import GOOGLE_SHEETS_CONFIG
+from services import rate_limiter, sheets_emulator
+from services.token_cache import CredencialesConCache
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ["type", "project_id", "private_key_id", "private_key",
+                   "client_email", "client_id", "token_uri"]
+
+_lock = threading.RLock()
+_contadores = threading.local()
+_total_llamadas = 0
+_client = None
+_spreadsheets = {}  # sheet_id -> Spreadsheet
+_worksheets = {}    # (sheet_id, "gid"|"titulo", valor) -> Worksheet
+
+
+class _ContadorLlamadas:
+    def __init__(self):
+        self.total = 0
+
+
+class HTTPClientContado(HTTPClient):
+    """
+    HTTPClient de gspread que pasa cada request por el limitador de cuota
+    (services.rate_limiter) y cuenta cada intento (ver contar_llamadas).
+    """
+
+    def request(self, method, endpoint, *args, **kwargs):
+        return ejecutar_request(
+            method, lambda: super(HTTPClientContado, self).request(method, endpoint, *args, **kwargs)
+        )
+
+
+def ejecutar_request(method, enviar):
+    """Pasa una request a Sheets por el limitador de cuota y la cuenta en cada intento."""
+    def contada():
+        global _total_llamadas
+        _total_llamadas += 1
+        for contador in getattr(_contadores, "activos", ()):
+            contador.total += 1
+        return enviar()
+
+    return rate_limiter.ejecutar(method, contada)
+
+
+@contextmanager
+def contar_llamadas():
+    """
+    Cuenta las llamadas a la API de Sheets hechas por este hilo dentro del bloque:
+
+        with contar_llamadas() as contador:
+            ...
+        contador.total
+    """
+    contador = _ContadorLlamadas()
+    activos = getattr(_contadores, "activos", None)
+    if activos is None:
+        activos = _contadores.activos = []
+    activos.append(contador)
+    try:
+        yield contador
+    finally:
+        activos.remove(contador)
+
+
+def cargar_credenciales():
+    """
+    Devuelve el dict de la cuenta de servicio. Fuentes soportadas (en orden):
+      - GOOGLE_CREDENTIALS (Railway UI habitual para Node)
+      - GOOGLE_CREDENTIALS_JSON
+      - GOOGLE_SHEETS_CREDENTIALS
+      - GOOGLE_SHEETS_CONFIG["CREDENTIALS"] (config.py)
+      - Archivo local google_credentials.json
+    """
+    raw_env = (
+        os.getenv("GOOGLE_CREDENTIALS")
+        or os.getenv("GOOGLE_CREDENTIALS_JSON")
+        or os.getenv("GOOGLE_SHEETS_CREDENTIALS")
+    )
+
+    credentials = None
+    if raw_env:
+        try:
+            credentials = json.loads(raw_env)
+            logger.info("Credenciales cargadas desde variable de entorno")
+        except Exception as e:
+            raise ValueError(f"GOOGLE_*_CREDENTIALS no es JSON válido: {e}")
+    else:
+        credentials = dict(GOOGLE_SHEETS_CONFIG.get("CREDENTIALS") or {})
+        if not credentials and os.path.exists("google_credentials.json"):
+            try:
+                with open("google_credentials.json", "r", encoding="utf-8") as f:
+                    credentials = json.load(f)
+                logger.info("Credenciales cargadas desde archivo local")
+            except Exception as e:
+                raise ValueError(f"No se pudo leer google_credentials.json: {e}")
+
+    if not isinstance(credentials, dict) or not credentials:
+        raise ValueError("No se encontraron credenciales válidas en la configuración")
+
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in credentials]
+    if missing_fields:
+        raise ValueError(f"Credenciales incompletas. Faltan campos: {', '.join(missing_fields)}")
+
+    # Normalizar salto de línea de la clave privada si vino con "\\n"
+    if isinstance(credentials.get("private_key"), str):
+        credentials["private_key"] = credentials["private_key"].replace("\\n", "\n")
+    return credentials
+
+
+def get_client():
+    """Cliente gspread autorizado, compartido por todo el proceso."""
+    global _client
+    with _lock:
+        if _client is None and sheets_emulator.habilitado():
+            # Backend local en memoria (GOOGLE_SHEETS_BACKEND=emulador): sin credenciales
+            _client = sheets_emulator.cliente()
+        if _client is None:
+            credentials = cargar_credenciales()
+            # El access token se comparte entre workers vía data/google_token.json
+            creds = CredencialesConCache.from_service_account_info(credentials, scopes=DEFAULT_SCOPES)
+            _client = gspread.authorize(creds, http_client=HTTPClientContado)
+            logger.info(f"Cliente de Google Sheets autorizado ({credentials.get('client_email')})")
+        return _client
+
+
+def get_spreadsheet(sheet_id=None):
+    """Spreadsheet abierto (open_by_key) y cacheado por sheet_id."""
+    sheet_id = sheet_id or GOOGLE_SHEETS_CONFIG["SHEET_ID"]
+    with _lock:
+        spreadsheet = _spreadsheets.get(sheet_id)
+        if spreadsheet is None:
+            spreadsheet = get_client().open_by_key(sheet_id)
+            _spreadsheets[sheet_id] = spreadsheet
+        return spreadsheet
+
+
+def get_worksheet(sheet_id=None, gid=None, titulo=None):
+    """
+    Worksheet cacheada por GID o por título. Lanza gspread.WorksheetNotFound
+    si no existe (los handles inexistentes no se cachean).
+    """
+    sheet_id = sheet_id or GOOGLE_SHEETS_CONFIG["SHEET_ID"]
+    if gid is not None:
+        clave = (sheet_id, "gid", int(gid))
+    elif titulo is not None:
+        clave = (sheet_id, "titulo", titulo)
+    else:
+        raise ValueError("Se requiere gid o titulo")
+
+    with _lock:
+        worksheet = _worksheets.get(clave)
+        if worksheet is not None:
+            return worksheet
+        spreadsheet = get_spreadsheet(sheet_id)
+        if gid is not None:
+            worksheet = spreadsheet.get_worksheet_by_id(int(gid))
+        else:
+            worksheet = spreadsheet.worksheet(titulo)
+        _worksheets[clave] = worksheet
+        return worksheet
+
+
+def registrar_worksheet(worksheet, sheet_id=None):
+    """Agrega al caché una hoja recién creada (add_worksheet) para no volver a buscarla."""
+    sheet_id = sheet_id or GOOGLE_SHEETS_CONFIG["SHEET_ID"]
+    with _lock:
+        _worksheets[(sheet_id, "gid", int(worksheet.id))] = worksheet
+        _worksheets[(sheet_id, "titulo", worksheet.title)] = worksheet
+
+
+def invalidar():
+    """Descarta cliente y handles (ej. tras un error de autenticación o cambio de credenciales)."""
+    global _client
+    with _lock:
+        _client = None
+        _spreadsheets.clear()
+        _worksheets.clear()
+
+
+def estado():
+    with _lock:
+        return {
+            "cliente_autorizado": _client is not None,
+            "spreadsheets_cacheados": len(_spreadsheets),
+            "worksheets_cacheadas": len(_worksheets),
+            "llamadas_api": _total_llamadas,
+            "backend": "emulador" if sheets_emulator.habilitado() else "google",
+            "emulador": sheets_emulator.estadisticas(),
+        }
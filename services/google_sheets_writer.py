@@ -2,18 +2,32 @@
 Servicio robusto para escribir ventas en Google Sheets existente
 Maneja automáticamente límites de grilla, expansión de hojas y errores del API
 """
-import os
-import json
 import gspread
+from gspread.utils import absolute_range_name
 import logging
 from datetime import datetime
 from pathlib import Path
 import csv
+import copy
 from config import GOOGLE_SHEETS_CONFIG
+from functools import wraps
+from services import google_client, rate_limiter, sheet_cleanup, sheet_partitions, sheet_status
 from services.tipo_service import TipoService
+from services.row_cursor import row_cursor
+from services.sheet_ranges import leer_rango, rango_a1
 
 logger = logging.getLogger(__name__)
 
+
+def _operacion_masiva(fn):
+    """Las llamadas a la API de fn ceden el turno a las lecturas interactivas (ver rate_limiter)."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with rate_limiter.con_prioridad(rate_limiter.PRIORIDAD_MASIVA):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
 class GoogleSheetsWriter:
     def __init__(self):
         """Inicializa el cliente de Google Sheets con manejo robusto de credenciales."""
@@ -28,6 +42,8 @@ class GoogleSheetsWriter:
         self.client = None
         self.spreadsheet = None
         self.worksheet = None
+        # Pestañas por mes (services.sheet_partitions); None = hoja única
+        self.particiones = None
         
         # Configuración del directorio de datos
         self.data_dir = Path("data")
@@ -52,54 +68,17 @@ class GoogleSheetsWriter:
             self.sheet_id = GOOGLE_SHEETS_CONFIG["SHEET_ID"]
             self.sheet_name = GOOGLE_SHEETS_CONFIG.get("SHEET_NAME", "Hoja 1")
             
-            # 2. Obtener/validar credenciales
+            # 2-4. Credenciales y cliente: los provee google_client una vez por proceso
             print("\n🔍 Validando credenciales...")
-            # Fuentes soportadas (en orden):
-            #  - GOOGLE_CREDENTIALS (Railway UI habitual para Node)
-            #  - GOOGLE_CREDENTIALS_JSON
-            #  - GOOGLE_SHEETS_CREDENTIALS (usada por config.py)
-            #  - Archivo local google_credentials.json
-            raw_env = (
-                os.getenv("GOOGLE_CREDENTIALS")
-                or os.getenv("GOOGLE_CREDENTIALS_JSON")
-                or os.getenv("GOOGLE_SHEETS_CREDENTIALS")
-            )
-
-            credentials = None
-            if raw_env:
-                try:
-                    credentials = json.loads(raw_env)
-                except Exception as e:
-                    raise ValueError(f"GOOGLE_*_CREDENTIALS no es JSON válido: {e}")
-            elif os.path.exists("google_credentials.json"):
-                try:
-                    with open("google_credentials.json", "r", encoding="utf-8") as f:
-                        credentials = json.load(f)
-                except Exception as e:
-                    raise ValueError(f"No se pudo leer google_credentials.json: {e}")
-            else:
-                credentials = GOOGLE_SHEETS_CONFIG.get("CREDENTIALS", {})
-            
-            if not isinstance(credentials, dict) or not credentials:
-                raise ValueError("No se encontraron credenciales válidas en la configuración")
-                
-            # 3. Normalizar private_key y verificar campos obligatorios
-            required_fields = ["type", "project_id", "private_key_id", "private_key", 
-                             "client_email", "client_id", "token_uri"]
-            missing_fields = [field for field in required_fields if field not in credentials]
-            
-            if missing_fields:
-                raise ValueError(f"Credenciales incompletas. Faltan campos: {', '.join(missing_fields)}")
-
-            # Normalizar salto de línea de la clave privada si vino con "\\n"
-            if isinstance(credentials.get("private_key"), str):
-                credentials["private_key"] = credentials["private_key"].replace("\\n", "\n")
-                
-            # 4. Crear credenciales / cliente
-            self._initialize_credentials(credentials)
+            self._initialize_credentials()
             
             # 5. Inicializar cliente y conectar con Google Sheets
             self._initialize_client()
+            if sheet_partitions.habilitado():
+                self.particiones = sheet_partitions.ParticionesMensuales(
+                    self.spreadsheet, self.sheet_id, self.expected_headers
+                )
+                self._rollover()
             try:
                 self.tipo_service = TipoService()
             except Exception as e:
@@ -111,14 +90,11 @@ class GoogleSheetsWriter:
             print(error_msg)
             raise
             
-    def _initialize_credentials(self, credentials):
-        """Inicializa el cliente de Google Sheets usando google-auth vía gspread."""
+    def _initialize_credentials(self):
+        """Obtiene el cliente de Google Sheets compartido (google-auth vía gspread)."""
         try:
-            print("🔑 Creando cliente de servicio con gspread.service_account_from_dict...")
-            # gspread gestiona internamente google-auth con este helper
-            self.client = gspread.service_account_from_dict(credentials)
-            print("✅ Cliente de Google Sheets creado correctamente")
-            print(f"   Cuenta de servicio: {credentials.get('client_email')}")
+            self.client = google_client.get_client()
+            print("✅ Cliente de Google Sheets listo")
         except Exception as e:
             error_msg = f"❌ Error al crear cliente de Google Sheets: {str(e)}"
             raise ValueError(error_msg) from e
@@ -134,7 +110,7 @@ class GoogleSheetsWriter:
             
             # Abrir la hoja de cálculo
             print(f"\n📂 Abriendo hoja de cálculo con ID: {self.sheet_id}")
-            self.spreadsheet = self.client.open_by_key(self.sheet_id)
+            self.spreadsheet = google_client.get_spreadsheet(self.sheet_id)
             print(f"✅ Hoja de cálculo abierta: '{self.spreadsheet.title}'")
             
             # Obtener o crear la hoja específica
@@ -160,13 +136,15 @@ class GoogleSheetsWriter:
             print(error_msg)
             if "invalid_grant" in str(e):
                 print("🔑 Error de autenticación. Verifica que las credenciales sean válidas y no hayan expirado")
+                # Descartar el cliente compartido para que el próximo intento re-autorice
+                google_client.invalidar()
             raise
     
     def _setup_worksheet(self):
         """Configura la hoja de trabajo, creándola si no existe."""
         print(f"\n📝 Buscando hoja: '{self.sheet_name}'")
         try:
-            self.worksheet = self.spreadsheet.worksheet(self.sheet_name)
+            self.worksheet = google_client.get_worksheet(self.sheet_id, titulo=self.sheet_name)
             print(f"✅ Hoja '{self.sheet_name}' encontrada y lista para usar")
         except gspread.WorksheetNotFound:
             print(f"⚠️ La hoja '{self.sheet_name}' no fue encontrada. Intentando crear...")
@@ -175,6 +153,7 @@ class GoogleSheetsWriter:
                 rows=100, 
                 cols=20
             )
+            google_client.registrar_worksheet(self.worksheet, self.sheet_id)
             print(f"✅ Hoja '{self.sheet_name}' creada exitosamente")
     
     def _verify_write_permissions(self):
@@ -185,14 +164,21 @@ class GoogleSheetsWriter:
         except Exception as e:
             print(f"⚠️ Advertencia: No se pudo escribir en la hoja. Verifica los permisos de escritura: {e}")
     
-    def obtener_ultima_fila_confiable(self):
+    def _leer_columnas_ventas(self):
+        """Valores de A:L (las 12 columnas de una venta), rellenados a ancho fijo."""
+        ancho = len(self.expected_headers)
+        return leer_rango(self.worksheet, rango_a1(1, ancho), ancho=ancho)
+
+    def obtener_ultima_fila_confiable(self, all_values=None):
         """
-        Obtiene la próxima fila libre de forma confiable usando get_all_values()
+        Obtiene la próxima fila libre de forma confiable leyendo solo las columnas de ventas (A:L)
         Evita falsos vacíos causados por formato o fórmulas
+        all_values: valores A:L ya leídos por el llamador (evita una segunda descarga)
         """
         try:
-            # Obtener todos los valores de la hoja
-            all_values = self.worksheet.get_all_values()
+            # Leer solo A:L (columnas de la venta) en lugar de toda la hoja
+            if all_values is None:
+                all_values = self._leer_columnas_ventas()
             
             # Buscar la primera fila completamente vacía
             for i, row in enumerate(all_values):
@@ -230,9 +216,13 @@ class GoogleSheetsWriter:
     def obtener_primer_fila_vacia_util(self):
         """Encuentra la primera fila vacía 'útil' desde arriba.
         Considera ocupada si CUALQUIER celda entre A y L tiene contenido.
-        Devuelve número de fila (1-based). Si no hay huecos, retorna la siguiente al final confiable."""
+        Devuelve número de fila (1-based). Si no hay huecos, retorna la siguiente al final confiable.
+        Si hay un cursor de la exportación anterior y sigue siendo válido, se usa sin leer la hoja completa."""
+        fila_cursor = row_cursor.obtener(self.worksheet)
+        if fila_cursor:
+            return fila_cursor
         try:
-            all_values = self.worksheet.get_all_values()
+            all_values = self._leer_columnas_ventas()
             if not all_values:
                 return 2  # dejar fila 1 para headers
             # Recorrer desde fila 2 (índice 1 en lista)
@@ -254,13 +244,13 @@ class GoogleSheetsWriter:
                     return i
             # Si no hay huecos internos, usar SIEMPRE la siguiente a la última fila con datos de get_all_values
             # Esto evita reutilizar la última fila por efectos de formato/fórmulas
-            return max(len(all_values) + 1, self.obtener_ultima_fila_confiable())
+            return max(len(all_values) + 1, self.obtener_ultima_fila_confiable(all_values))
         except Exception as e:
             logger.warning(f"Fallo en obtener_primer_fila_vacia_util: {e}")
             # Fallback conservador: usar la siguiente a la última fila visible
             try:
-                all_values = self.worksheet.get_all_values()
-                return max(len(all_values) + 1, self.obtener_ultima_fila_confiable())
+                all_values = self._leer_columnas_ventas()
+                return max(len(all_values) + 1, self.obtener_ultima_fila_confiable(all_values))
             except Exception:
                 return self.obtener_ultima_fila_confiable()
     
@@ -329,7 +319,7 @@ class GoogleSheetsWriter:
             logger.error(f"Error normalizando fila de datos: {e}")
             return fila_datos
     
-    def preparar_fila_venta(self, venta):
+    def preparar_fila_venta(self, venta, tipos=None):
         """Prepara los datos de la venta en el formato del Google Sheet"""
         try:
             # El precio que ingresa el usuario es el precio unitario
@@ -352,16 +342,16 @@ class GoogleSheetsWriter:
             fecha_formateada = fecha_obj.strftime("%d/%m")
             
             # Resolver 'Tipo' desde hoja externa según ID
+            # (tipos: mapa ya resuelto en lote por el llamador, ver resolve_many)
             tipo_val = ""
             try:
-                if self.tipo_service:
+                if tipos is not None:
+                    tipo_val = tipos.get(venta["id"], "") or ""
+                elif self.tipo_service:
                     tipo_val = self.tipo_service.obtener_tipo_por_id(venta["id"]) or ""
             except Exception as e:
                 logger.warning(f"No se pudo obtener 'Tipo' para ID {venta.get('id')}: {e}")
-            try:
-                logger.info(f"Tipo resuelto para ID {venta.get('id')}: '{tipo_val}'")
-            except Exception:
-                pass
+            logger.debug(f"Tipo resuelto para ID {venta.get('id')}: '{tipo_val}'")
 
             # Preparar fila según el formato esperado
             fila = [
@@ -386,20 +376,69 @@ class GoogleSheetsWriter:
             logger.error(f"Error preparando fila de venta: {e}")
             raise
     
+    def _rangos_venta(self, filas_datos, fila_inicio):
+        """Rangos A:C y E:L (se evita D) para filas consecutivas desde fila_inicio."""
+        fila_fin = fila_inicio + len(filas_datos) - 1
+        titulo = self.worksheet.title
+        return [
+            {"range": absolute_range_name(titulo, f"A{fila_inicio}:C{fila_fin}"), "values": [row[0:3] for row in filas_datos]},
+            {"range": absolute_range_name(titulo, f"E{fila_inicio}:L{fila_fin}"), "values": [row[4:12] for row in filas_datos]},
+        ]
+
+    def _escribir_rangos(self, data):
+        """Una sola request values_batch_update (USER_ENTERED) con varios rangos."""
+        return self.spreadsheet.values_batch_update({"valueInputOption": "USER_ENTERED", "data": data})
+
+    def escribir_filas_protegidas(self, filas_datos, fila_inicio):
+        """
+        Escribe filas en una hoja protegida con rangos múltiples (A:C y E:L) en una
+        sola request. Si falla, parte el bloque en mitades y reintenta cada una; solo
+        una fila individual que sigue fallando cae a la escritura columna por columna.
+        Devuelve (índices escritos, errores).
+        """
+        escritos, errores = [], []
+
+        def escribir(desde, hasta):
+            try:
+                self._escribir_rangos(self._rangos_venta(filas_datos[desde:hasta], fila_inicio + desde))
+                escritos.extend(range(desde, hasta))
+                return
+            except gspread.exceptions.APIError as e:
+                error_msg = str(e).lower()
+                if "permission" in error_msg and "protected" not in error_msg:
+                    # Sin acceso de edición: partir el bloque no ayudaría
+                    errores.extend(f"Fila {fila_inicio + i}: {e}" for i in range(desde, hasta))
+                    return
+                logger.warning(f"Bloque filas {fila_inicio + desde}-{fila_inicio + hasta - 1} falló: {e}")
+            if hasta - desde > 1:
+                medio = (desde + hasta) // 2
+                escribir(desde, medio)
+                escribir(medio, hasta)
+                return
+            fila = fila_inicio + desde
+            try:
+                if self.escribir_fila_sin_expandir(filas_datos[desde], fila, intentar_rango=False):
+                    escritos.append(desde)
+                else:
+                    errores.append(f"Fila {fila}: no se pudo escribir")
+            except Exception as e2:
+                errores.append(f"Fila {fila}: {str(e2)}")
+
+        if filas_datos:
+            escribir(0, len(filas_datos))
+        escritos.sort()
+        return escritos, errores
+
     def escribir_fila_con_reintentos(self, fila_datos, fila_destino, max_reintentos=3):
         """
         Escribe una fila con reintentos automáticos si hay errores de límites de grilla
         """
         for intento in range(max_reintentos):
             try:
-                # Escribir cada columna individualmente usando update_cell
-                for i, valor in enumerate(fila_datos):
-                    columna = i + 1  # gspread usa números: 1=A, 2=B, 3=C, etc.
-                    if columna == 4:
-                        continue
-                    self.worksheet.update_cell(fila_destino, columna, valor)
+                # A:C y E:L (se evita D) en una sola request
+                self._escribir_rangos(self._rangos_venta([fila_datos], fila_destino))
                 
-                logger.info(f"✅ Fila {fila_destino} escrita exitosamente columna por columna")
+                logger.info(f"✅ Fila {fila_destino} escrita exitosamente")
                 return True
                 
             except gspread.exceptions.APIError as e:
@@ -435,11 +474,19 @@ class GoogleSheetsWriter:
         
         return False
     
-    def escribir_fila_sin_expandir(self, fila_datos, fila_destino, max_reintentos=3):
+    def escribir_fila_sin_expandir(self, fila_datos, fila_destino, max_reintentos=3, intentar_rango=True):
         """
         Escribe una fila de datos SIN expandir la hoja (para hojas protegidas)
-        Intenta escribir en TODAS las columnas ya que la protección parece ser parcial
+        Intenta escribir en TODAS las columnas ya que la protección parece ser parcial.
+        Primero prueba A:C y E:L en una sola request; celda por celda solo si eso falla.
         """
+        if intentar_rango:
+            try:
+                self._escribir_rangos(self._rangos_venta([fila_datos], fila_destino))
+                logger.info(f"✅ Fila {fila_destino} escrita exitosamente")
+                return True
+            except Exception as e:
+                logger.warning(f"Escritura por rangos de la fila {fila_destino} falló, se prueba celda por celda: {e}")
         for intento in range(max_reintentos):
             try:
                 # Intentar escribir en TODAS las columnas permitidas (A:C y E:L), evitando D
@@ -533,6 +580,9 @@ class GoogleSheetsWriter:
     
     def agregar_venta_a_sheets(self, venta):
         """Agrega una venta al Google Sheet existente con manejo robusto de errores"""
+        if self.particiones is not None:
+            # Con pestañas por mes la venta va a la de su fecha
+            return self.para_ventas([venta]).agregar_venta_a_sheets(venta)
         try:
             # Preparar los datos de la venta
             fila_datos = self.preparar_fila_venta(venta)
@@ -554,13 +604,14 @@ class GoogleSheetsWriter:
             logger.info(f"✅ Venta preparada para fila {proxima_fila}: {fila_datos}")
             
             # Verificar si la hoja está protegida
-            hoja_protegida = self._verificar_si_hoja_protegida()
+            hoja_protegida = self._verificar_escritura_protegida()
             logger.info(f"Hoja protegida: {hoja_protegida}")
             
             # Elegir función de escritura según si la hoja está protegida
             if hoja_protegida:
                 # Hoja protegida: escribir solo en columnas libres
                 if self.escribir_fila_sin_expandir(fila_datos, proxima_fila):
+                    row_cursor.avanzar(self.worksheet, proxima_fila + 1)
                     logger.info(f"✅ Venta agregada a Google Sheets en fila {proxima_fila} (columnas libres)")
                     return {
                         "success": True,
@@ -573,6 +624,7 @@ class GoogleSheetsWriter:
             else:
                 # Hoja NO protegida: escribir en TODAS las columnas
                 if self.escribir_fila_con_reintentos(fila_datos, proxima_fila):
+                    row_cursor.avanzar(self.worksheet, proxima_fila + 1)
                     logger.info(f"✅ Venta agregada a Google Sheets en fila {proxima_fila} (todas las columnas)")
                     return {
                         "success": True,
@@ -628,294 +680,75 @@ class GoogleSheetsWriter:
             }
 
     
-    def limpiar_filas_vacias(self):
+    def _limpiar(self, reglas, descripcion, preservar_columna_d=True, dry_run=False):
+        """Limpieza en una pasada (ver services.sheet_cleanup): 1 lectura y 1 batch_clear."""
+        try:
+            logger.info(f"Iniciando {descripcion}{' (simulada)' if dry_run else ''}...")
+            # Con pestañas por mes se limpia solo la del mes en curso
+            hoja = self.para_ventas([]).worksheet
+            if not dry_run:
+                # Las filas cambian: el cursor de próxima fila deja de ser confiable
+                row_cursor.invalidar(hoja)
+            return sheet_cleanup.limpiar(
+                hoja, reglas, preservar_columna_d=preservar_columna_d, dry_run=dry_run
+            )
+        except Exception as e:
+            logger.error(f"Error en {descripcion}: {e}")
+            return {"success": False, "error": str(e)}
+
+    @_operacion_masiva
+    def limpiar_hoja(self, reglas=sheet_cleanup.REGLAS, dry_run=False):
+        """
+        Aplica varias reglas de limpieza en la misma pasada (una fila se limpia si
+        cumple cualquiera). El reporte incluye cuántas filas marcó cada regla.
+        """
+        return self._limpiar(reglas, "limpieza combinada", dry_run=dry_run)
+
+    @_operacion_masiva
+    def limpiar_filas_vacias(self, dry_run=False):
         """
         Limpia filas vacías del final de la hoja para liberar espacio
         Usa detección más inteligente para encontrar filas realmente vacías
         """
-        try:
-            logger.info("Iniciando limpieza inteligente de filas vacías...")
-            
-            # Obtener todos los valores
-            all_values = self.worksheet.get_all_values()
-            
-            if not all_values:
-                logger.info("La hoja está vacía, no hay nada que limpiar")
-                return {"success": True, "filas_limpiadas": 0}
-            
-            # Encontrar la última fila con datos REALMENTE significativos
-            ultima_fila_con_datos = 0
-            for i, row in enumerate(all_values):
-                # Verificar si la fila tiene datos significativos
-                tiene_datos_significativos = False
-                for cell in row:
-                    if isinstance(cell, str):
-                        cell_clean = cell.strip()
-                        # Ignorar celdas que solo tienen espacios, guiones, o caracteres especiales
-                        if cell_clean and cell_clean not in ['', '-', 'N/A', 'n/a', 'NULL', 'null', 'None', 'none']:
-                            tiene_datos_significativos = True
-                            break
-                    elif cell is not None and cell != '':
-                        tiene_datos_significativos = True
-                        break
-                
-                if tiene_datos_significativos:
-                    ultima_fila_con_datos = i + 1
-            
-            logger.info(f"Última fila con datos significativos: {ultima_fila_con_datos}")
-            logger.info(f"Total de filas en la hoja: {len(all_values)}")
-            
-            # Si la última fila con datos es menor que el total, limpiar
-            if ultima_fila_con_datos < len(all_values):
-                filas_a_limpiar = len(all_values) - ultima_fila_con_datos
-                logger.info(f"Limpiando {filas_a_limpiar} filas vacías del final")
-                
-                # Limpiar filas vacías del final
-                if filas_a_limpiar > 0:
-                    filas_limpiadas_exitosamente = 0
-                    for i in range(ultima_fila_con_datos + 1, len(all_values) + 1):
-                        try:
-                            # Limpiar la fila sin afectar la columna D: A:C y E:L
-                            self.worksheet.batch_clear([f'A{i}:C{i}', f'E{i}:L{i}'])
-                            filas_limpiadas_exitosamente += 1
-                            logger.debug(f"Fila {i} limpiada exitosamente")
-                        except Exception as e:
-                            logger.warning(f"No se pudo limpiar fila {i}: {e}")
-                            continue
-                    
-                    logger.info(f"✅ Limpieza completada. Filas limpiadas: {filas_limpiadas_exitosamente}")
-                    return {
-                        "success": True, 
-                        "filas_limpiadas": filas_limpiadas_exitosamente,
-                        "nueva_ultima_fila": ultima_fila_con_datos,
-                        "total_filas_antes": len(all_values),
-                        "total_filas_despues": ultima_fila_con_datos
-                    }
-                else:
-                    logger.info("No hay filas para limpiar")
-                    return {"success": True, "filas_limpiadas": 0}
-            else:
-                logger.info("No hay filas vacías para limpiar")
-                return {"success": True, "filas_limpiadas": 0}
-                
-        except Exception as e:
-            logger.error(f"Error limpiando filas vacías: {e}")
-            return {"success": False, "error": str(e)}
+        resultado = self._limpiar(("vacias_final",), "limpieza inteligente de filas vacías", dry_run=dry_run)
+        if resultado.get("success"):
+            resultado["nueva_ultima_fila"] = resultado["ultima_fila_con_datos"]
+            resultado["total_filas_despues"] = resultado["ultima_fila_con_datos"]
+        return resultado
     
-    def limpiar_filas_vacias_agresiva(self):
+    @_operacion_masiva
+    def limpiar_filas_vacias_agresiva(self, dry_run=False):
         """
-        Limpieza más agresiva que busca filas vacías en toda la hoja
+        Limpieza más agresiva que busca filas vacías en toda la hoja (borra A:L completo)
         """
-        try:
-            logger.info("Iniciando limpieza agresiva de filas vacías...")
-            
-            # Obtener todos los valores
-            all_values = self.worksheet.get_all_values()
-            
-            if not all_values:
-                logger.info("La hoja está vacía, no hay nada que limpiar")
-                return {"success": True, "filas_limpiadas": 0}
-            
-            # Buscar filas vacías en toda la hoja (no solo al final)
-            filas_a_limpiar = []
-            filas_con_datos = []
-            
-            for i, row in enumerate(all_values):
-                # Verificar si la fila está realmente vacía
-                fila_vacia = True
-                for cell in row:
-                    if isinstance(cell, str):
-                        cell_clean = cell.strip()
-                        if cell_clean and cell_clean not in ['', '-', 'N/A', 'n/a', 'NULL', 'null', 'None', 'none']:
-                            fila_vacia = False
-                            break
-                    elif cell is not None and cell != '':
-                        fila_vacia = False
-                        break
-                
-                if fila_vacia:
-                    filas_a_limpiar.append(i + 1)  # +1 porque las filas empiezan en 1
-                else:
-                    filas_con_datos.append(i + 1)
-            
-            logger.info(f"Filas con datos: {len(filas_con_datos)}")
-            logger.info(f"Filas vacías encontradas: {len(filas_a_limpiar)}")
-            
-            if filas_a_limpiar:
-                # Limpiar filas vacías
-                filas_limpiadas_exitosamente = 0
-                for fila_num in filas_a_limpiar:
-                    try:
-                        self.worksheet.batch_clear([f'A{fila_num}:L{fila_num}'])
-                        filas_limpiadas_exitosamente += 1
-                    except Exception as e:
-                        logger.warning(f"No se pudo limpiar fila {fila_num}: {e}")
-                        continue
-                
-                logger.info(f"✅ Limpieza agresiva completada. Filas limpiadas: {filas_limpiadas_exitosamente}")
-                return {
-                    "success": True,
-                    "filas_limpiadas": filas_limpiadas_exitosamente,
-                    "filas_vacias_encontradas": len(filas_a_limpiar),
-                    "filas_con_datos": len(filas_con_datos)
-                }
-            else:
-                logger.info("No se encontraron filas vacías para limpiar")
-                return {"success": True, "filas_limpiadas": 0}
-                
-        except Exception as e:
-            logger.error(f"Error en limpieza agresiva: {e}")
-            return {"success": False, "error": str(e)}
+        resultado = self._limpiar(("vacias",), "limpieza agresiva de filas vacías", preservar_columna_d=False, dry_run=dry_run)
+        if resultado.get("success"):
+            resultado["filas_vacias_encontradas"] = resultado["filas_encontradas"]
+        return resultado
     
-    def limpiar_filas_fantasma(self):
+    @_operacion_masiva
+    def limpiar_filas_fantasma(self, dry_run=False):
         """
         Limpieza ULTRA-AGRESIVA que busca filas fantasma con formato/formulas
         """
-        try:
-            logger.info("Iniciando limpieza ULTRA-AGRESIVA de filas fantasma...")
-            
-            # Obtener todos los valores
-            all_values = self.worksheet.get_all_values()
-            
-            if not all_values:
-                logger.info("La hoja está vacía, no hay nada que limpiar")
-                return {"success": True, "filas_limpiadas": 0}
-            
-            # Buscar filas que parecen vacías pero pueden tener formato/formulas
-            filas_a_limpiar = []
-            filas_con_datos_reales = []
-            
-            for i, row in enumerate(all_values):
-                # Verificar si la fila tiene datos REALMENTE significativos
-                tiene_datos_reales = False
-                
-                # Verificar cada celda de la fila
-                for j, cell in enumerate(row):
-                    if isinstance(cell, str):
-                        cell_clean = cell.strip()
-                        # Solo considerar datos reales si tienen contenido significativo
-                        if cell_clean and len(cell_clean) > 0 and cell_clean not in ['', '-', 'N/A', 'n/a', 'NULL', 'null', 'None', 'none', ' ']:
-                            tiene_datos_reales = True
-                            break
-                    elif cell is not None and cell != '' and cell != 0:
-                        tiene_datos_reales = True
-                        break
-                
-                # Si la fila no tiene datos reales, marcarla para limpiar
-                if not tiene_datos_reales:
-                    filas_a_limpiar.append(i + 1)
-                else:
-                    filas_con_datos_reales.append(i + 1)
-            
-            logger.info(f"Filas con datos REALES: {len(filas_con_datos_reales)}")
-            logger.info(f"Filas fantasma encontradas: {len(filas_a_limpiar)}")
-            
-            if filas_a_limpiar:
-                # Limpiar filas fantasma
-                filas_limpiadas_exitosamente = 0
-                for fila_num in filas_a_limpiar:
-                    try:
-                        # Limpiar la fila sin afectar la columna D: A:C y E:L
-                        self.worksheet.batch_clear([f'A{fila_num}:C{fila_num}', f'E{fila_num}:L{fila_num}'])
-                        filas_limpiadas_exitosamente += 1
-                        logger.debug(f"Fila fantasma {fila_num} limpiada")
-                    except Exception as e:
-                        logger.warning(f"No se pudo limpiar fila fantasma {fila_num}: {e}")
-                        continue
-                
-                logger.info(f"✅ Limpieza ULTRA-AGRESIVA completada. Filas limpiadas: {filas_limpiadas_exitosamente}")
-                return {
-                    "success": True,
-                    "filas_limpiadas": filas_limpiadas_exitosamente,
-                    "filas_fantasma_encontradas": len(filas_a_limpiar),
-                    "filas_con_datos_reales": len(filas_con_datos_reales),
-                    "total_filas_antes": len(all_values),
-                    "total_filas_despues": len(filas_con_datos_reales)
-                }
-            else:
-                logger.info("No se encontraron filas fantasma para limpiar")
-                return {"success": True, "filas_limpiadas": 0}
-                
-        except Exception as e:
-            logger.error(f"Error en limpieza ultra-agresiva: {e}")
-            return {"success": False, "error": str(e)}
+        resultado = self._limpiar(("fantasma",), "limpieza ULTRA-AGRESIVA de filas fantasma", dry_run=dry_run)
+        if resultado.get("success"):
+            resultado["filas_fantasma_encontradas"] = resultado["filas_encontradas"]
+            resultado["filas_con_datos_reales"] = resultado["filas_con_datos"]
+            resultado["total_filas_despues"] = resultado["filas_con_datos"]
+        return resultado
     
-    def limpiar_filas_basura(self):
+    @_operacion_masiva
+    def limpiar_filas_basura(self, dry_run=False):
         """
         LIMPIEZA INTELIGENTE que detecta filas con solo datos basura ($0,00, espacios, etc.)
         """
-        try:
-            logger.info("Iniciando limpieza INTELIGENTE de filas con datos basura...")
-            
-            # Obtener todos los valores
-            all_values = self.worksheet.get_all_values()
-            
-            if not all_values:
-                logger.info("La hoja está vacía, no hay nada que limpiar")
-                return {"success": True, "filas_limpiadas": 0}
-            
-            # Buscar filas que solo tienen datos basura
-            filas_a_limpiar = []
-            filas_con_datos_utiles = []
-            
-            for i, row in enumerate(all_values):
-                # Contar celdas con datos útiles vs basura
-                celdas_utiles = 0
-                celdas_basura = 0
-                
-                for j, cell in enumerate(row):
-                    if isinstance(cell, str):
-                        cell_clean = cell.strip()
-                        # Datos basura comunes
-                        if (cell_clean in ['', '-', 'N/A', 'n/a', 'NULL', 'null', 'None', 'none', ' ', '$0,00', '$0.00', '0', '0.00', '0,00'] or
-                            len(cell_clean) == 0):
-                            celdas_basura += 1
-                        else:
-                            celdas_utiles += 1
-                    elif cell is None or cell == '' or cell == 0 or cell == 0.0:
-                        celdas_basura += 1
-                    else:
-                        celdas_utiles += 1
-                
-                # Si la fila tiene menos de 2 celdas útiles, es basura
-                if celdas_utiles < 2:
-                    filas_a_limpiar.append(i + 1)
-                    logger.debug(f"Fila {i+1} marcada como basura: {celdas_utiles} útiles, {celdas_basura} basura")
-                else:
-                    filas_con_datos_utiles.append(i + 1)
-            
-            logger.info(f"Filas con datos ÚTILES: {len(filas_con_datos_utiles)}")
-            logger.info(f"Filas con datos BASURA: {len(filas_a_limpiar)}")
-            
-            if filas_a_limpiar:
-                # Limpiar filas con basura
-                filas_limpiadas_exitosamente = 0
-                for fila_num in filas_a_limpiar:
-                    try:
-                        # Limpiar la fila sin afectar la columna D: A:C y E:L
-                        self.worksheet.batch_clear([f'A{fila_num}:C{fila_num}', f'E{fila_num}:L{fila_num}'])
-                        filas_limpiadas_exitosamente += 1
-                        logger.info(f"Fila basura {fila_num} limpiada")
-                    except Exception as e:
-                        logger.warning(f"No se pudo limpiar fila basura {fila_num}: {e}")
-                        continue
-                
-                logger.info(f"✅ Limpieza INTELIGENTE completada. Filas limpiadas: {filas_limpiadas_exitosamente}")
-                return {
-                    "success": True,
-                    "filas_limpiadas": filas_limpiadas_exitosamente,
-                    "filas_basura_encontradas": len(filas_a_limpiar),
-                    "filas_con_datos_utiles": len(filas_con_datos_utiles),
-                    "total_filas_antes": len(all_values),
-                    "total_filas_despues": len(filas_con_datos_utiles)
-                }
-            else:
-                logger.info("No se encontraron filas con datos basura para limpiar")
-                return {"success": True, "filas_limpiadas": 0}
-                
-        except Exception as e:
-            logger.error(f"Error en limpieza inteligente: {e}")
-            return {"success": False, "error": str(e)}
+        resultado = self._limpiar(("basura",), "limpieza INTELIGENTE de filas con datos basura", dry_run=dry_run)
+        if resultado.get("success"):
+            resultado["filas_basura_encontradas"] = resultado["filas_encontradas"]
+            resultado["filas_con_datos_utiles"] = max(0, resultado["total_filas_antes"] - 1 - resultado["filas_encontradas"])
+            resultado["total_filas_despues"] = resultado["filas_con_datos_utiles"]
+        return resultado
     
     def obtener_estado_detallado(self):
         """
@@ -998,6 +831,7 @@ class GoogleSheetsWriter:
                 rows=1000,  # Empezar con 1000 filas
                 cols=12      # 12 columnas como la original
             )
+            google_client.registrar_worksheet(nueva_hoja, self.sheet_id)
             
             # Copiar headers de la hoja original
             headers = self.worksheet.row_values(1)
@@ -1021,17 +855,17 @@ class GoogleSheetsWriter:
             return {"success": False, "error": str(e)}
     
     def obtener_estado_sheets(self):
-        """Obtiene el estado actual del Google Sheet"""
+        """Obtiene el estado actual del Google Sheet (escaneo completo de A:L, ver services.sheet_status)"""
         try:
-            # Obtener las primeras filas como ejemplo
-            valores = self.worksheet.get_all_values()
+            # Una sola lectura de A:L: ejemplo de datos y última fila confiable
+            valores = self._leer_columnas_ventas()
             
             return {
                 "success": True,
                 "url": f"https://docs.google.com/spreadsheets/d/{self.sheet_id}",
                 "nombre_hoja": self.sheet_name,
                 "total_filas": len(valores),
-                "ultima_fila": self.obtener_ultima_fila_confiable(),
+                "ultima_fila": self.obtener_ultima_fila_confiable(all_values=valores),
                 "dimensiones_hoja": {
                     "filas": self.worksheet.row_count,
                     "columnas": self.worksheet.col_count
@@ -1047,17 +881,22 @@ class GoogleSheetsWriter:
                 "error": str(e)
             }
     
+    def _verificar_escritura_protegida(self):
+        """
+        Antes de escribir: protegida si algún rango protegido toca A:L (ej. la
+        columna D), no solo si la hoja entera lo está
+        """
+        try:
+            return bool(sheet_status.escritura_protegida(self.spreadsheet, self.worksheet.id))
+        except Exception as e:
+            return "protected" in str(e).lower()
+
     def _verificar_si_hoja_protegida(self):
         """
-        Verifica si la hoja está protegida
+        Verifica si la hoja está protegida (desde la metadata cacheada, sin redimensionar la hoja)
         """
         try:
-            # Intentar expandir la hoja para ver si está protegida
-            test_rows = self.worksheet.row_count + 1
-            self.worksheet.resize(rows=test_rows, cols=self.worksheet.col_count)
-            # Si llegamos aquí, no está protegida, revertir el cambio
-            self.worksheet.resize(rows=test_rows-1, cols=self.worksheet.col_count)
-            return False
+            return bool(sheet_status.protegida(self.spreadsheet, self.worksheet.id))
         except Exception as e:
             return "protected" in str(e).lower()
     
@@ -1067,6 +906,8 @@ class GoogleSheetsWriter:
         """
         try:
             logger.info("Intentando quitar protección de la hoja...")
+            # Las filas cambian: el cursor de próxima fila deja de ser confiable
+            row_cursor.invalidar(self.worksheet)
             
             # Intentar quitar protección limpiando celdas protegidas
             try:
@@ -1089,10 +930,226 @@ class GoogleSheetsWriter:
             logger.error(f"Error intentando quitar protección: {e}")
             return {"success": False, "error": str(e)}
     
-    def agregar_multiples_ventas_a_sheets(self, ventas):
+    def _exportar_en_un_lote(self, filas_datos, proxima_fila):
         """
-        Exporta múltiples ventas a Google Sheets de forma ULTRA RÁPIDA usando operaciones en lote
+        Modo "batch": escribe A:C y E:L en UNA llamada values_batch_update y verifica
+        con los updatedRows de la respuesta (sin lectura de verificación). La capacidad
+        se calcula con las dimensiones ya conocidas de la hoja y solo se redimensiona
+        si hace falta. Devuelve el dict de resultado, o None para usar el modo clásico
+        (ej. hoja protegida).
         """
+        n = len(filas_datos)
+        start = max(2, proxima_fila)
+        end = start + n - 1
+        try:
+            # Capacidad: row_count/col_count vienen de la metadata en memoria (sin llamada)
+            filas_requeridas = end + 5
+            columnas_requeridas = len(self.expected_headers)
+            if filas_requeridas > self.worksheet.row_count or columnas_requeridas > self.worksheet.col_count:
+                self.worksheet.resize(
+                    rows=max(self.worksheet.row_count, filas_requeridas + int(filas_requeridas * 0.2)),
+                    cols=max(self.worksheet.col_count, columnas_requeridas + 2),
+                )
+
+            data = self._rangos_venta(filas_datos, start)
+            respuesta = self._escribir_rangos(data)
+            filas_ok = [int(r.get("updatedRows") or 0) for r in (respuesta or {}).get("responses", [])]
+            if len(filas_ok) != 2 or any(f != n for f in filas_ok):
+                # Reescribir los mismos rangos una vez (idempotente: mismas filas)
+                logger.warning(f"updatedRows inesperado {filas_ok} (esperado {n}); reintentando el lote...")
+                respuesta = self._escribir_rangos(data)
+                filas_ok = [int(r.get("updatedRows") or 0) for r in (respuesta or {}).get("responses", [])]
+                if len(filas_ok) != 2 or any(f != n for f in filas_ok):
+                    logger.warning(f"updatedRows inesperado {filas_ok}; se releen las filas {start}-{end}")
+                    escritas = self._filas_escritas(filas_datos, start)
+                    if escritas is None or len(escritas) != n:
+                        return self._resultado_no_verificado(filas_datos, start, escritas, filas_ok)
+        except gspread.exceptions.APIError as e:
+            if "protected" in str(e).lower():
+                logger.info("🔒 Hoja protegida: se usa el modo clásico")
+            else:
+                logger.warning(f"⚠️ Modo batch falló, usando modo clásico: {e}")
+            return None
+
+        row_cursor.avanzar(self.worksheet, end + 1)
+        logger.info(f"✅ {n} ventas exportadas en una sola llamada (filas {start}-{end})")
+
+        # Guardar en CSV local
+        csv_file = self.data_dir / "ventas_para_sheets.csv"
+        with open(csv_file, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            for fila_datos in filas_datos:
+                writer.writerow(fila_datos)
+
+        return {
+            "success": True,
+            "ventas_exportadas": n,
+            "indices_exitosos": list(range(n)),
+            "fila_inicio": start,
+            "modo": "batch",
+            "mensaje": f"✅ {n} ventas exportadas exitosamente a Google Sheets (una sola llamada)"
+        }
+
+    def _filas_escritas(self, filas_datos, start):
+        """
+        Relee A:L de las filas destino y devuelve los índices cuya fila quedó escrita
+        (ID en C y forma de pago en J: una por cada rango del lote), o None si no se
+        pudo leer.
+        """
+        end = start + len(filas_datos) - 1
+        try:
+            valores = leer_rango(self.worksheet, rango_a1(1, 12, start, end), ancho=12)
+        except Exception as e:
+            logger.error(f"No se pudieron releer las filas {start}-{end}: {e}")
+            return None
+
+        def _igual(a, b):
+            return str(a).strip().upper() == str(b).strip().upper()
+
+        escritas = []
+        for i, fila in enumerate(filas_datos):
+            en_hoja = valores[i] if i < len(valores) else [""] * 12
+            if _igual(en_hoja[2], fila[2]) and _igual(en_hoja[9], fila[9]):
+                escritas.append(i)
+        return escritas
+
+    def _resultado_no_verificado(self, filas_datos, start, escritas, filas_ok):
+        """
+        Lote sin confirmar por updatedRows. Con la relectura: las filas que están
+        cuentan como exportadas y el resto como fallidas. Sin relectura, todas quedan
+        en "indices_inciertos": no deben reenviarse sin revisar la hoja (duplicarían filas).
+        """
+        n = len(filas_datos)
+        end = start + n - 1
+        # La próxima fila libre se recalcula: puede haber filas escritas a medias
+        row_cursor.invalidar(self.worksheet)
+        if escritas is None:
+            return {
+                "success": False,
+                "error": "EXPORT_UNVERIFIED",
+                "ventas_exportadas": 0,
+                "indices_exitosos": [],
+                "indices_inciertos": list(range(n)),
+                "filas_inciertas": [start + i for i in range(n)],
+                "mensaje": f"⚠️ No se pudo confirmar la escritura de las filas {start}-{end} (updatedRows={filas_ok}): "
+                           f"revisar la hoja antes de reintentar",
+            }
+        return {
+            "success": False,
+            "error": "EXPORT_PARTIAL",
+            "ventas_exportadas": len(escritas),
+            "indices_exitosos": escritas,
+            "fila_inicio": start,
+            "filas_sheet": [start + i for i in escritas],
+            "mensaje": f"⚠️ {len(escritas)}/{n} ventas confirmadas en las filas {start}-{end} (updatedRows={filas_ok})",
+        }
+
+    def _rollover(self):
+        """Con pestañas por mes, la hoja de trabajo pasa a la del mes en curso (se crea si no existe)."""
+        if self.particiones is None:
+            return
+        try:
+            hoja = self.particiones.hoja_del_mes(sheet_partitions.mes_actual())
+            self.worksheet, self.sheet_name = hoja, hoja.title
+        except Exception as e:
+            logger.warning(f"No se pudo pasar a la pestaña del mes en curso: {e}")
+
+    def agrupar_por_hoja(self, ventas):
+        """Índices de 'ventas' agrupados por pestaña de destino (un solo grupo sin particiones)."""
+        if not ventas:
+            return []
+        if self.particiones is None:
+            return [list(range(len(ventas)))]
+        return list(sheet_partitions.agrupar_por_mes(ventas).values())
+
+    def para_ventas(self, ventas):
+        """
+        Writer de la pestaña del mes de ventas[0] (todas deben ser del mismo mes,
+        ver agrupar_por_hoja). Es una copia con su propio worksheet: el writer
+        compartido no se modifica, así otras requests no ven la pestaña cambiada.
+        Sin particiones devuelve el mismo writer.
+        """
+        if self.particiones is None:
+            return self
+        self._rollover()
+        mes = sheet_partitions.mes_de(ventas[0]) if ventas else sheet_partitions.mes_actual()
+        hoja = self.particiones.hoja_del_mes(mes)
+        vista = copy.copy(self)
+        vista.worksheet, vista.sheet_name = hoja, hoja.title
+        vista.particiones = None  # la copia escribe en una sola pestaña
+        return vista
+
+    @_operacion_masiva
+    def agregar_multiples_ventas_a_sheets(self, ventas, fila_inicio=None):
+        """
+        Exporta múltiples ventas a Google Sheets de forma ULTRA RÁPIDA usando operaciones en lote.
+        El resultado incluye "llamadas_api": requests a la API de Sheets usadas por la exportación,
+        y "filas_sheet": fila de la hoja de cada venta de "indices_exitosos" (mismo orden).
+        fila_inicio: fila donde empezar (si el llamador ya la reservó); por defecto la primera libre.
+        Con pestañas por mes, cada venta va a la de su mes ("hojas_sheet" indica cuál) y
+        fila_inicio solo se respeta si todas las ventas son del mismo mes.
+        """
+        with google_client.contar_llamadas() as contador:
+            grupos = self.agrupar_por_hoja(ventas)
+            if len(grupos) <= 1:
+                resultado = self._exportar_grupo(ventas, fila_inicio)
+            else:
+                resultado = self._exportar_por_hoja(ventas, grupos)
+        resultado["llamadas_api"] = contador.total
+        logger.info(f"Exportación: {contador.total} llamadas a la API de Sheets")
+        return resultado
+
+    def _exportar_grupo(self, ventas, fila_inicio=None):
+        """Exporta ventas de una misma pestaña y agrega filas_sheet (y hojas_sheet con particiones)."""
+        vista = self.para_ventas(ventas)
+        resultado = vista._agregar_multiples_ventas(ventas, fila_inicio)
+        exitosos = resultado.get("indices_exitosos") or []
+        if "filas_sheet" not in resultado and resultado.get("fila_inicio"):
+            resultado["filas_sheet"] = [resultado["fila_inicio"] + i for i in exitosos]
+        if self.particiones is not None:
+            resultado["hoja"] = vista.sheet_name
+            resultado["hojas_sheet"] = [vista.sheet_name] * len(exitosos)
+        return resultado
+
+    def _exportar_por_hoja(self, ventas, grupos):
+        """Ventas de varios meses: una exportación por pestaña, resultados combinados."""
+        combinado = {
+            "success": False,
+            "ventas_exportadas": 0,
+            "indices_exitosos": [],
+            "filas_sheet": [],
+            "hojas_sheet": [],
+            "indices_inciertos": [],
+            "filas_inciertas": [],
+            "errores": [],
+            "por_hoja": {},
+        }
+        for indices in grupos:
+            parcial = self._exportar_grupo([ventas[i] for i in indices])
+            # Las tres listas salen de indices_exitosos (también en una exportación parcial)
+            # para que sigan alineadas posición a posición
+            exitosos = parcial.get("indices_exitosos") or []
+            filas = list(parcial.get("filas_sheet") or [])
+            filas = (filas + [None] * len(exitosos))[:len(exitosos)]
+            combinado["ventas_exportadas"] += len(exitosos)
+            combinado["indices_exitosos"].extend(indices[i] for i in exitosos)
+            combinado["filas_sheet"].extend(filas)
+            combinado["hojas_sheet"].extend([parcial.get("hoja")] * len(exitosos))
+            combinado["indices_inciertos"].extend(indices[i] for i in parcial.get("indices_inciertos") or [])
+            combinado["filas_inciertas"].extend(parcial.get("filas_inciertas") or [])
+            combinado["errores"].extend(parcial.get("errores") or ([] if parcial.get("success") else [parcial.get("mensaje")]))
+            combinado["por_hoja"][parcial.get("hoja")] = parcial.get("mensaje")
+        n = combinado["ventas_exportadas"]
+        combinado["success"] = n == len(ventas)
+        if not combinado["success"]:
+            combinado["error"] = "EXPORT_PARTIAL"
+        combinado["mensaje"] = (
+            f"✅ {n} ventas exportadas en {len(grupos)} pestañas" if n == len(ventas)
+            else f"⚠️ {n}/{len(ventas)} ventas exportadas en {len(grupos)} pestañas"
+        )
+        return combinado
+
+    def _agregar_multiples_ventas(self, ventas, fila_inicio=None):
         if not ventas:
             return {
                 "success": False,
@@ -1104,41 +1161,39 @@ class GoogleSheetsWriter:
             logger.info(f"🚀 EXPORTACIÓN RÁPIDA: {len(ventas)} ventas a Google Sheets...")
             
             # Obtener la próxima fila vacía de forma robusta (considera huecos y deja fila 1 para headers)
-            proxima_fila = self.obtener_primer_fila_vacia_util()
+            proxima_fila = fila_inicio or self.obtener_primer_fila_vacia_util()
+            
+            # Resolver todos los 'Tipo' de una vez (una sola consulta al índice compartido)
+            tipos = self.tipo_service.obtener_tipos(v.get("id") for v in ventas) if self.tipo_service else {}
             
             # Preparar todas las filas de datos en una sola operación
             filas_datos = []
             for venta in ventas:
-                fila_datos = self.preparar_fila_venta(venta)
+                fila_datos = self.preparar_fila_venta(venta, tipos)
                 filas_datos.append(fila_datos)
             
+            # Modo batch: capacidad + A:C + E:L + verificación en una sola request
+            if GOOGLE_SHEETS_CONFIG.get("EXPORT_MODE", "batch") == "batch":
+                resultado = self._exportar_en_un_lote(filas_datos, proxima_fila)
+                if resultado is not None:
+                    return resultado
+            
             # Asegurar capacidad de la hoja
             filas_necesarias = max(proxima_fila + len(ventas), proxima_fila + 1)
             if not self.asegurar_capacidad_hoja(filas_necesarias + 5):
                 logger.warning("No se pudo asegurar capacidad de la hoja, continuando...")
             
             # Verificar si la hoja está protegida
-            hoja_protegida = self._verificar_si_hoja_protegida()
+            hoja_protegida = self._verificar_escritura_protegida()
             logger.info(f"Hoja protegida: {hoja_protegida}")
             
             # EXPORTACIÓN RÁPIDA: Intentar escribir todas las filas de una vez
             try:
                 if hoja_protegida:
                     # Hoja protegida: escribir fila por fila en columnas permitidas
-                    logger.info("🔒 Hoja protegida detectada: escribiendo fila por fila en columnas permitidas...")
-                    ventas_exitosas = 0
-                    errores = []
-                    indices_exitosos = []
-                    for i, fila_datos in enumerate(filas_datos):
-                        fila_actual = proxima_fila + i
-                        try:
-                            if self.escribir_fila_sin_expandir(fila_datos, fila_actual):
-                                ventas_exitosas += 1
-                                indices_exitosos.append(i)
-                            else:
-                                errores.append(f"Fila {fila_actual}: no se pudo escribir")
-                        except Exception as e2:
-                            errores.append(f"Fila {fila_actual}: {str(e2)}")
+                    logger.info("🔒 Hoja protegida detectada: escribiendo columnas permitidas en bloque...")
+                    indices_exitosos, errores = self.escribir_filas_protegidas(filas_datos, proxima_fila)
+                    ventas_exitosas = len(indices_exitosos)
                     
                     # Guardar en CSV local
                     csv_file = self.data_dir / "ventas_para_sheets.csv"
@@ -1148,11 +1203,13 @@ class GoogleSheetsWriter:
                             writer.writerow(fila_datos)
                     
                     if ventas_exitosas == len(ventas):
+                        row_cursor.avanzar(self.worksheet, proxima_fila + len(filas_datos))
                         logger.info(f"✅ {ventas_exitosas} ventas exportadas (hoja protegida)")
                         return {
                             "success": True,
                             "ventas_exportadas": ventas_exitosas,
                             "indices_exitosos": indices_exitosos,
+                            "fila_inicio": proxima_fila,
                             "mensaje": f"✅ {ventas_exitosas} ventas exportadas exitosamente a Google Sheets (hoja protegida)"
                         }
                     else:
@@ -1162,6 +1219,7 @@ class GoogleSheetsWriter:
                             "error": "EXPORT_PARTIAL",
                             "ventas_exportadas": ventas_exitosas,
                             "indices_exitosos": indices_exitosos,
+                            "fila_inicio": proxima_fila,
                             "errores": errores,
                             "mensaje": f"⚠️ {ventas_exitosas}/{len(ventas)} ventas exportadas. Algunas filas no se pudieron escribir por protección."
                         }
@@ -1202,6 +1260,7 @@ class GoogleSheetsWriter:
                     except Exception as e_check:
                         logger.warning(f"No se pudo verificar última fila: {e_check}")
                     
+                    row_cursor.avanzar(self.worksheet, end + 1)
                     logger.info(f"✅ {len(ventas)} ventas exportadas en lote (hoja sin protección)")
                     
                     # Guardar en CSV local
@@ -1215,6 +1274,7 @@ class GoogleSheetsWriter:
                         "success": True,
                         "ventas_exportadas": len(ventas),
                         "indices_exitosos": list(range(len(ventas))),
+                        "fila_inicio": start,
                         "mensaje": f"✅ {len(ventas)} ventas exportadas exitosamente a Google Sheets (MODO ULTRA RÁPIDO)"
                     }
                     
@@ -1225,6 +1285,7 @@ class GoogleSheetsWriter:
                 ventas_exitosas = 0
                 errores = []
                 indices_exitosos = []
+                filas_sheet = []
                 
                 for i, venta in enumerate(ventas):
                     try:
@@ -1232,6 +1293,7 @@ class GoogleSheetsWriter:
                         if resultado["success"]:
                             ventas_exitosas += 1
                             indices_exitosos.append(i)
+                            filas_sheet.append(resultado.get("fila"))
                         else:
                             errores.append(f"Venta {i+1}: {resultado.get('error', 'Error desconocido')}")
                     except Exception as e2:
@@ -1242,6 +1304,7 @@ class GoogleSheetsWriter:
                         "success": True,
                         "ventas_exportadas": ventas_exitosas,
                         "indices_exitosos": indices_exitosos,
+                        "filas_sheet": filas_sheet,
                         "mensaje": f"✅ {ventas_exitosas} ventas exportadas exitosamente a Google Sheets (método tradicional)"
                     }
                 else:
@@ -1250,6 +1313,7 @@ class GoogleSheetsWriter:
                         "error": "EXPORT_FAILED",
                         "ventas_exportadas": ventas_exitosas,
                         "indices_exitosos": indices_exitosos,
+                        "filas_sheet": filas_sheet,
                         "errores": errores,
                         "mensaje": f"⚠️ {ventas_exitosas}/{len(ventas)} ventas exportadas. {len(errores)} errores."
                     }
@@ -93,6 +93,40 @@ def guardar_historial(data: Dict[str, List[dict]]) -> None:
     HIST_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
 
 
+def venta_desde_dict(v: dict) -> 'Venta':
+    """Construye la fila Venta para una venta exportada; None si no tiene fecha."""
+    f = (v.get('fecha') or '').strip()[:10]
+    if not f:
+        return None
+
+    producto_id = str(v.get('id') or '').upper()
+    nombre = str(v.get('nombre') or '')
+    precio = float(v.get('precio') or 0)
+    unidades = int(v.get('unidades') or 0)
+    total = float(v.get('total') or (precio * unidades))
+    pago = str(v.get('pago') or '')
+    notas = str(v.get('notas') or '')
+
+    # Tomar costo_unitario del payload si viene (calculado por FIFO en sales_service),
+    # si no, dejar 0.0 como valor por defecto.
+    try:
+        costo_unitario_val = float(v.get('costo_unitario')) if 'costo_unitario' in v and v.get('costo_unitario') is not None else 0.0
+    except Exception:
+        costo_unitario_val = 0.0
+
+    return Venta(
+        fecha=datetime.fromisoformat(f).date(),
+        producto_id=producto_id,
+        nombre=nombre,
+        precio=precio,
+        costo_unitario=costo_unitario_val,
+        unidades=unidades,
+        total=total,
+        pago=pago,
+        notas=notas,
+    )
+
+
 def agregar_ventas_a_historial(ventas: List[dict]) -> int:
     if not ventas:
         return 0
@@ -103,36 +137,9 @@ def agregar_ventas_a_historial(ventas: List[dict]) -> int:
             try:
                 added = 0
                 for v in ventas:
-                    f = (v.get('fecha') or '').strip()[:10]
-                    if not f:
+                    venta = venta_desde_dict(v)
+                    if venta is None:
                         continue
-
-                    producto_id = str(v.get('id') or '').upper()
-                    nombre = str(v.get('nombre') or '')
-                    precio = float(v.get('precio') or 0)
-                    unidades = int(v.get('unidades') or 0)
-                    total = float(v.get('total') or (precio * unidades))
-                    pago = str(v.get('pago') or '')
-                    notas = str(v.get('notas') or '')
-
-                    # Tomar costo_unitario del payload si viene (calculado por FIFO en sales_service),
-                    # si no, dejar 0.0 como valor por defecto.
-                    try:
-                        costo_unitario_val = float(v.get('costo_unitario')) if 'costo_unitario' in v and v.get('costo_unitario') is not None else 0.0
-                    except Exception:
-                        costo_unitario_val = 0.0
-
-                    venta = Venta(
-                        fecha=datetime.fromisoformat(f).date(),
-                        producto_id=producto_id,
-                        nombre=nombre,
-                        precio=precio,
-                        costo_unitario=costo_unitario_val,
-                        unidades=unidades,
-                        total=total,
-                        pago=pago,
-                        notas=notas,
-                    )
                     session.add(venta)
                     added += 1
                 session.commit()
@@ -0,0 +1,131 @@
+"""
+Transporte HTTP compartido para las llamadas a Apps Script (script.google.com)
+
+Una sola requests.Session por proceso con pool de conexiones keep-alive: las
+llamadas de egresos, del AppsScriptWriter y de GASClient reutilizan la conexión
+TLS abierta en lugar de hacer un handshake nuevo cada vez. Cada llamada tiene un
+deadline total (conexión + respuesta completa), no solo un timeout por lectura.
+
+Config (GOOGLE_APPS_SCRIPT en config.py):
+  - POOL_SIZE: conexiones keep-alive por host
+  - CONNECT_TIMEOUT: segundos máximos para abrir la conexión
+  - GZIP_MIN_BYTES: cuerpos de al menos este tamaño se envían con gzip (0 = nunca)
+"""
+import os
+import gzip
+import json
+import time
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import GOOGLE_APPS_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_sesion = None
+_sesion_pid = None
+_stats = {"requests": 0, "errores": 0, "bytes_enviados": 0, "bytes_sin_comprimir": 0, "comprimidas": 0}
+
+
+class RespuestaHTTP:
+    def __init__(self, status, body, headers):
+        self.status = status
+        self.body = body
+        self.headers = headers
+
+    @property
+    def ok(self):
+        return self.status < 400
+
+    def texto(self):
+        return self.body.decode("utf-8", errors="ignore")
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8"))
+
+
+def _crear_sesion():
+    tamaño = max(1, int(GOOGLE_APPS_SCRIPT.get("POOL_SIZE", 10)))
+    # Sin reintentos automáticos: un POST a Apps Script no es idempotente
+    adaptador = HTTPAdapter(pool_connections=tamaño, pool_maxsize=tamaño, max_retries=0)
+    sesion = requests.Session()
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    return sesion
+
+
+def obtener_sesion():
+    """Session del proceso (una nueva tras un fork: los sockets no se comparten entre workers)."""
+    global _sesion, _sesion_pid
+    with _lock:
+        if _sesion is None or _sesion_pid != os.getpid():
+            _sesion = _crear_sesion()
+            _sesion_pid = os.getpid()
+        return _sesion
+
+
+def post_json(url, payload, headers=None, timeout=15):
+    """
+    POST de 'payload' como JSON. timeout es el deadline total de la llamada en
+    segundos. Devuelve RespuestaHTTP (también para 4xx/5xx); los errores de
+    conexión o deadline vencido se lanzan como RuntimeError.
+    """
+    body = json.dumps(payload).encode("utf-8")
+    encabezados = {"Content-Type": "application/json"}
+    encabezados.update(headers or {})
+
+    minimo_gzip = int(GOOGLE_APPS_SCRIPT.get("GZIP_MIN_BYTES", 0))
+    sin_comprimir = len(body)
+    if minimo_gzip and sin_comprimir >= minimo_gzip:
+        body = gzip.compress(body)
+        encabezados["Content-Encoding"] = "gzip"
+
+    deadline = time.monotonic() + float(timeout)
+    conexion = min(float(GOOGLE_APPS_SCRIPT.get("CONNECT_TIMEOUT", 5)), float(timeout))
+    with _lock:
+        _stats["requests"] += 1
+        _stats["bytes_enviados"] += len(body)
+        _stats["bytes_sin_comprimir"] += sin_comprimir
+        _stats["comprimidas"] += 1 if "Content-Encoding" in encabezados else 0
+
+    try:
+        resp = obtener_sesion().post(
+            url, data=body, headers=encabezados, timeout=(conexion, float(timeout)), stream=True
+        )
+        with resp:
+            partes = []
+            for parte in resp.iter_content(chunk_size=16384):
+                partes.append(parte)
+                if time.monotonic() > deadline:
+                    raise requests.Timeout(f"deadline de {timeout}s vencido leyendo la respuesta")
+            return RespuestaHTTP(resp.status_code, b"".join(partes), resp.headers)
+    except requests.RequestException as e:
+        with _lock:
+            _stats["errores"] += 1
+        raise RuntimeError(f"Conexión fallida: {e}")
+
+
+def conexiones_abiertas():
+    """Conexiones TCP creadas por el pool en este proceso (las reutilizadas no suman)."""
+    sesion = _sesion
+    if sesion is None or _sesion_pid != os.getpid():
+        return 0
+    total = 0
+    for adaptador in set(sesion.adapters.values()):
+        pools = adaptador.poolmanager.pools
+        for clave in list(pools.keys()):
+            pool = pools.get(clave)
+            total += getattr(pool, "num_connections", 0) if pool is not None else 0
+    return total
+
+
+def estadisticas():
+    with _lock:
+        resultado = dict(_stats)
+    resultado["conexiones_creadas"] = conexiones_abiertas()
+    resultado["pool_size"] = int(GOOGLE_APPS_SCRIPT.get("POOL_SIZE", 10))
+    return resultado
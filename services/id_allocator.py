@@ -0,0 +1,229 @@
+"""
+Asignación de IDs de artículo en el servidor
+
+Índice ordenado por prefijo (A, AN, C, P, G, N, R, V) construido a partir del
+snapshot del catálogo y de StockIngreso.id_articulo:
+  - siguiente ID libre de un prefijo en O(1) (el último de la lista ordenada) y
+    búsqueda de un ID con bisect; cada alta es un list.insert, O(n) por prefijo
+  - reserva de lotes de IDs, seguro entre pestañas y workers (archivo con lock)
+  - ID según rango de precio del grupo (lo que hacía asignarIDAUTOMATICO en el navegador)
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+from bisect import bisect_right
+from pathlib import Path
+
+from services.file_lock import escribir_atomico, lock_archivo
+
+logger = logging.getLogger(__name__)
+
+PREFIJOS = ("A", "AN", "C", "P", "G", "N", "R", "V")
+RESERVAS_PATH = Path(__file__).resolve().parent.parent / "data" / "id_reservas.json"
+RESERVA_TTL_SEGUNDOS = int(os.getenv("ID_RESERVA_TTL", "600"))
+MAX_RESERVA_LOTE = 100
+# Los IDs de StockIngreso se releen de la base como máximo cada este intervalo
+STOCK_IDS_TTL_SEGUNDOS = 60
+
+_RE_ID = re.compile(r'^([A-Z]+)(\d+)$')
+_RE_RANGO_PRECIO = re.compile(r'rango\s*de\s*precio\s*\d+', re.IGNORECASE)
+_RE_DIGITOS_FINALES = re.compile(r'\d+$')
+
+
+def parsear_id(id_articulo):
+    """'AN12' -> ('AN', 12); None si no tiene forma letras+número."""
+    m = _RE_ID.match(str(id_articulo or "").strip().upper())
+    if not m:
+        return None
+    return m.group(1), int(m.group(2))
+
+
+def normalizar_tipo(nombre):
+    """Tipo base del nombre ('Aritos Rango de precio 2' -> 'Aritos'), como construirMapeosTipoYGrupos en app.js."""
+    n = str(nombre or "").strip()
+    n = _RE_RANGO_PRECIO.sub("", n).strip()
+    return _RE_DIGITOS_FINALES.sub("", n).strip()
+
+
+def _formatear_id(prefijo, numero):
+    return f"{prefijo}{numero}"
+
+
+class IndicePrefijos:
+    """Números usados por prefijo, en listas ordenadas (alta O(n) por list.insert, consulta O(log n))."""
+
+    def __init__(self, ids=()):
+        self._numeros = {}
+        for id_articulo in ids:
+            self.agregar(id_articulo)
+
+    def agregar(self, id_articulo):
+        parsed = parsear_id(id_articulo)
+        if not parsed:
+            return
+        prefijo, numero = parsed
+        numeros = self._numeros.setdefault(prefijo, [])
+        i = bisect_right(numeros, numero)
+        if i == 0 or numeros[i - 1] != numero:
+            numeros.insert(i, numero)
+
+    def maximo(self, prefijo):
+        numeros = self._numeros.get(prefijo)
+        return numeros[-1] if numeros else 0
+
+    def contiene(self, prefijo, numero):
+        numeros = self._numeros.get(prefijo) or []
+        i = bisect_right(numeros, numero)
+        return i > 0 and numeros[i - 1] == numero
+
+    def prefijos(self):
+        return sorted(self._numeros)
+
+
+def _leer_reservas():
+    try:
+        data = json.loads(RESERVAS_PATH.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Reservas de IDs ilegibles ({RESERVAS_PATH.name}), se ignoran: {e}")
+        return {}
+
+
+def _purgar_vencidas(reservas, ahora):
+    """Quita reservas vencidas. Formato: {prefijo: {numero: vence_ts}}."""
+    limpias = {}
+    for prefijo, numeros in reservas.items():
+        vigentes = {n: ts for n, ts in (numeros or {}).items() if float(ts) > ahora}
+        if vigentes:
+            limpias[prefijo] = vigentes
+    return limpias
+
+
+def _ids_stock_ingreso():
+    """IDs cargados en StockIngreso (vacío si no hay base configurada)."""
+    try:
+        from services.db import DATABASE_URL, get_session
+        from services.models import StockIngreso
+    except (ImportError, ModuleNotFoundError):
+        return []
+    if not DATABASE_URL:
+        return []
+    session = get_session()
+    try:
+        return [row[0] for row in session.query(StockIngreso.id_articulo).distinct()]
+    except Exception as e:
+        logger.warning(f"No se pudieron leer IDs de StockIngreso: {e}")
+        return []
+    finally:
+        session.close()
+
+
+class IdAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indice = None
+        self._catalogo_indexado = None
+        self._stock_ids_ts = 0.0
+        # Por grupo: IDs del catálogo ordenados por número (para asignar por precio)
+        self._ids_por_grupo = {}
+
+    def _asegurar_indice(self, catalogo):
+        ahora = time.time()
+        if (
+            self._indice is not None
+            and self._catalogo_indexado is catalogo
+            and ahora - self._stock_ids_ts < STOCK_IDS_TTL_SEGUNDOS
+        ):
+            return self._indice
+        ids_catalogo = list((catalogo or {}).keys())
+        self._indice = IndicePrefijos(ids_catalogo + _ids_stock_ingreso())
+        self._catalogo_indexado = catalogo
+        self._stock_ids_ts = ahora
+
+        por_grupo = {}
+        for id_articulo, info in (catalogo or {}).items():
+            parsed = parsear_id(id_articulo)
+            # Mismos IDs que mapaGrupoAIds en el navegador: sin tipo base no cuentan
+            if not parsed or not normalizar_tipo((info or {}).get("nombre")):
+                continue
+            por_grupo.setdefault(parsed[0], []).append((parsed[1], id_articulo))
+        self._ids_por_grupo = {g: [i for _, i in sorted(v)] for g, v in por_grupo.items()}
+        return self._indice
+
+    def siguiente_id(self, catalogo, prefijo):
+        """Próximo ID libre (mayor usado o reservado + 1), sin reservarlo."""
+        prefijo = str(prefijo or "").strip().upper()
+        with self._lock:
+            indice = self._asegurar_indice(catalogo)
+            reservas = _purgar_vencidas(_leer_reservas(), time.time()).get(prefijo, {})
+            maximo = max([indice.maximo(prefijo)] + [int(n) for n in reservas])
+            return _formatear_id(prefijo, maximo + 1)
+
+    def reservar(self, catalogo, prefijo, cantidad=1):
+        """
+        Reserva 'cantidad' IDs consecutivos para el prefijo. La reserva vive en
+        data/id_reservas.json bajo lock de archivo, así dos pestañas o dos workers
+        nunca reciben el mismo ID. Vence a los RESERVA_TTL_SEGUNDOS.
+        """
+        prefijo = str(prefijo or "").strip().upper()
+        cantidad = max(1, min(int(cantidad or 1), MAX_RESERVA_LOTE))
+        with self._lock:
+            indice = self._asegurar_indice(catalogo)
+            with lock_archivo(RESERVAS_PATH):
+                ahora = time.time()
+                reservas = _purgar_vencidas(_leer_reservas(), ahora)
+                del_prefijo = reservas.setdefault(prefijo, {})
+                base = max([indice.maximo(prefijo)] + [int(n) for n in del_prefijo])
+                numeros = list(range(base + 1, base + 1 + cantidad))
+                vence = ahora + RESERVA_TTL_SEGUNDOS
+                for n in numeros:
+                    del_prefijo[str(n)] = vence
+                escribir_atomico(RESERVAS_PATH, json.dumps(reservas))
+            ids = [_formatear_id(prefijo, n) for n in numeros]
+            for id_articulo in ids:
+                indice.agregar(id_articulo)
+        return {"ids": ids, "vence_ts": vence}
+
+    def id_por_precio(self, catalogo, rangos, grupo, precio):
+        """
+        ID del grupo cuyo rango de precio corresponde a 'precio': los umbrales son
+        mínimos inclusivos, y el índice se busca con bisect en lugar de recorrerlos.
+        Los umbrales vienen en el orden de "Rango de precio N" de la hoja: si no están
+        ordenados se recorren como en app.js (hasta el primero mayor que el precio),
+        porque ordenarlos cambiaría qué ID corresponde a cada rango.
+        """
+        grupo = str(grupo or "").strip().upper()
+        with self._lock:
+            self._asegurar_indice(catalogo)
+            ids_grupo = self._ids_por_grupo.get(grupo) or []
+        umbrales = (rangos or {}).get(grupo) or []
+        try:
+            precio = float(precio)
+        except (TypeError, ValueError):
+            return None
+        if precio <= 0 or not umbrales or not ids_grupo:
+            return None
+        if all(a <= b for a, b in zip(umbrales, umbrales[1:])):
+            idx = max(0, bisect_right(umbrales, precio) - 1)
+        else:
+            logger.debug(f"Umbrales de precio del grupo {grupo} desordenados ({umbrales}); se recorren en orden")
+            idx = 0
+            for i, umbral in enumerate(umbrales):
+                if precio < umbral:
+                    break
+                idx = i
+        return ids_grupo[min(idx, len(ids_grupo) - 1)]
+
+    def estadisticas(self, catalogo):
+        with self._lock:
+            indice = self._asegurar_indice(catalogo)
+            return {p: indice.maximo(p) for p in indice.prefijos()}
+
+
+# Instancia compartida por el proceso
+allocator = IdAllocator()
@@ -28,7 +28,15 @@ class Egreso(Base):
     tipo = Column(String(50), nullable=False)  # Costo Fijo / Costo Variable
     pago = Column(String(50), nullable=False)  # Efectivo / Transferencia
     observaciones = Column(Text, nullable=True)
+    responsable = Column(String(100), nullable=True)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
+    # Envío a la hoja "Egresos diarios" (services.egresos_sync). NULL = egreso anterior al envío diferido
+    estado_sheet = Column(String(20), nullable=True, index=True)  # pendiente / enviando / enviado / error
+    intentos_sheet = Column(Integer, nullable=False, default=0)
+    error_sheet = Column(Text, nullable=True)
+    # 'pendiente': no reintentar antes de este momento (backoff); 'enviando': vence el lease
+    sheet_no_antes_de = Column(DateTime, nullable=True)
+    enviado_sheet_at = Column(DateTime, nullable=True)
 
 
 class StockIngreso(Base):
@@ -50,3 +58,26 @@ class StockIngreso(Base):
     costo_total = Column(Numeric(14, 2), nullable=False)       # costo_individual * cantidad
     notas = Column(Text, nullable=True)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class SheetsOutbox(Base):
+    """Ventas exportadas pendientes de escribir en Google Sheets.
+
+    La exportación inserta la venta en 'ventas' y su fila de outbox en la misma
+    transacción; el worker de services.sheets_outbox las envía a la hoja en
+    lotes y guarda la fila de la hoja donde quedó cada una.
+    """
+
+    __tablename__ = 'sheets_outbox'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    idempotency_key = Column(String(64), nullable=False, unique=True)
+    venta_id = Column(Integer, nullable=True, index=True)      # ventas.id (None si la venta no tenía fecha)
+    payload = Column(Text, nullable=False)                     # venta en JSON, tal como se escribe en la hoja
+    estado = Column(String(20), nullable=False, index=True)    # pendiente / enviando / enviado / error
+    intentos = Column(Integer, nullable=False, default=0)
+    ultimo_error = Column(Text, nullable=True)
+    fila_sheet = Column(Integer, nullable=True)                # fila de la hoja (planificada mientras está 'enviando')
+    lease_hasta = Column(DateTime, nullable=True)              # el envío en curso se considera caído pasado este momento
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    enviado_at = Column(DateTime, nullable=True)
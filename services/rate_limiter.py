@@ -0,0 +1,193 @@
+"""
+Limitador de cuota y reintentos para todas las llamadas a la API de Google Sheets
+
+- Token bucket por tipo de operación (lecturas / escrituras), dimensionado a
+  la cuota por minuto de Sheets (60 req/min por usuario por defecto).
+- Cola con prioridad: las lecturas interactivas (catálogo) pasan antes que
+  las operaciones masivas (exportaciones, limpiezas) que esperan en el mismo bucket.
+- Reintentos ante 429/409/5xx respetando Retry-After, con backoff exponencial
+  con jitter.
+Todas las esperas, rechazos y reintentos quedan en estadisticas().
+"""
+import time
+import heapq
+import random
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+
+from gspread.exceptions import APIError
+
+from config import GOOGLE_SHEETS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+PRIORIDAD_INTERACTIVA = 0
+PRIORIDAD_MASIVA = 10
+
+CODIGOS_REINTENTABLES = {409, 429, 500, 502, 503, 504}
+BACKOFF_BASE_SEGUNDOS = 1.0
+BACKOFF_MAX_SEGUNDOS = 32.0
+
+_contexto = threading.local()
+
+
+class LimiteDeCuotaExcedido(RuntimeError):
+    """La request esperó más de lo permitido por un turno en el limitador."""
+
+
+class TokenBucket:
+    """
+    Bucket con cola de prioridad. Con 'rafaga' tokens iniciales y reposición de
+    (por_minuto - rafaga) por minuto, ninguna ventana de 60s supera 'por_minuto'.
+    """
+
+    def __init__(self, nombre, por_minuto, rafaga=10, max_espera_segundos=120.0):
+        self.nombre = nombre
+        self.capacidad = float(max(1, min(rafaga, por_minuto)))
+        self.por_segundo = max(1.0, por_minuto - self.capacidad) / 60.0
+        self.max_espera = float(max_espera_segundos)
+        self._tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self._cond = threading.Condition()
+        self._cola = []
+        self._secuencia = itertools.count()
+        self._stats = {"adquiridos": 0, "esperas": 0, "espera_total_s": 0.0, "rechazos": 0}
+
+    def _reponer(self):
+        ahora = time.monotonic()
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.por_segundo)
+        self._ultimo = ahora
+
+    def adquirir(self, prioridad=PRIORIDAD_INTERACTIVA):
+        """Bloquea hasta obtener un token respetando la prioridad; devuelve los segundos esperados."""
+        ticket = (prioridad, next(self._secuencia))
+        inicio = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._cola, ticket)
+            try:
+                while True:
+                    self._reponer()
+                    es_turno = self._cola[0] == ticket
+                    if es_turno and self._tokens >= 1:
+                        self._tokens -= 1
+                        heapq.heappop(self._cola)
+                        break
+                    restante = self.max_espera - (time.monotonic() - inicio)
+                    if restante <= 0:
+                        self._stats["rechazos"] += 1
+                        raise LimiteDeCuotaExcedido(
+                            f"Cuota de {self.nombre} agotada: se esperó {self.max_espera:.0f}s sin turno"
+                        )
+                    espera = (1 - self._tokens) / self.por_segundo if es_turno else restante
+                    self._cond.wait(min(max(espera, 0.01), restante))
+            except BaseException:
+                if ticket in self._cola:
+                    self._cola.remove(ticket)
+                    heapq.heapify(self._cola)
+                raise
+            finally:
+                self._cond.notify_all()
+
+            esperado = time.monotonic() - inicio
+            self._stats["adquiridos"] += 1
+            if esperado > 0.005:
+                self._stats["esperas"] += 1
+                self._stats["espera_total_s"] += esperado
+            return esperado
+
+    def estadisticas(self):
+        with self._cond:
+            self._reponer()
+            return dict(
+                self._stats,
+                espera_total_s=round(self._stats["espera_total_s"], 3),
+                tokens=round(self._tokens, 2),
+                en_cola=len(self._cola),
+            )
+
+
+_buckets = {
+    "lecturas": TokenBucket(
+        "lecturas",
+        GOOGLE_SHEETS_CONFIG.get("QUOTA_READS_PER_MIN", 60),
+        max_espera_segundos=GOOGLE_SHEETS_CONFIG.get("RATE_LIMIT_MAX_WAIT", 120),
+    ),
+    "escrituras": TokenBucket(
+        "escrituras",
+        GOOGLE_SHEETS_CONFIG.get("QUOTA_WRITES_PER_MIN", 60),
+        max_espera_segundos=GOOGLE_SHEETS_CONFIG.get("RATE_LIMIT_MAX_WAIT", 120),
+    ),
+}
+_stats_reintentos = {"reintentos": 0, "agotados": 0, "por_codigo": {}}
+_stats_lock = threading.Lock()
+
+
+@contextmanager
+def con_prioridad(prioridad):
+    """Las llamadas a la API hechas por este hilo dentro del bloque usan 'prioridad'."""
+    anterior = getattr(_contexto, "prioridad", PRIORIDAD_INTERACTIVA)
+    _contexto.prioridad = prioridad
+    try:
+        yield
+    finally:
+        _contexto.prioridad = anterior
+
+
+def _retry_after(error):
+    try:
+        valor = error.response.headers.get("Retry-After")
+        return max(0.0, float(valor)) if valor is not None else None
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _backoff(intento):
+    """Backoff exponencial con 'full jitter'."""
+    return random.uniform(0, min(BACKOFF_MAX_SEGUNDOS, BACKOFF_BASE_SEGUNDOS * (2 ** intento)))
+
+
+def ejecutar(metodo, llamada, max_reintentos=None):
+    """
+    Ejecuta 'llamada' (una request HTTP a Sheets) pasando por el bucket que
+    corresponde al método y reintentando los códigos transitorios.
+    """
+    if max_reintentos is None:
+        max_reintentos = GOOGLE_SHEETS_CONFIG.get("RETRY_ATTEMPTS", 3)
+    bucket = _buckets["lecturas" if str(metodo).upper() == "GET" else "escrituras"]
+    prioridad = getattr(_contexto, "prioridad", PRIORIDAD_INTERACTIVA)
+
+    intento = 0
+    while True:
+        bucket.adquirir(prioridad)
+        try:
+            return llamada()
+        except APIError as e:
+            codigo = getattr(e, "code", None)
+            if codigo not in CODIGOS_REINTENTABLES:
+                raise
+            with _stats_lock:
+                por_codigo = _stats_reintentos["por_codigo"]
+                por_codigo[str(codigo)] = por_codigo.get(str(codigo), 0) + 1
+                if intento >= max_reintentos:
+                    _stats_reintentos["agotados"] += 1
+                else:
+                    _stats_reintentos["reintentos"] += 1
+            if intento >= max_reintentos:
+                raise
+            espera = _retry_after(e)
+            if espera is None:
+                espera = _backoff(intento)
+            logger.warning(f"Sheets respondió {codigo}; reintento {intento + 1}/{max_reintentos} en {espera:.1f}s")
+            time.sleep(espera)
+            intento += 1
+
+
+def estadisticas():
+    with _stats_lock:
+        reintentos = dict(_stats_reintentos, por_codigo=dict(_stats_reintentos["por_codigo"]))
+    return {
+        "buckets": {nombre: b.estadisticas() for nombre, b in _buckets.items()},
+        "reintentos": reintentos,
+    }
@@ -0,0 +1,99 @@
+"""
+Cursor de "próxima fila libre" para las exportaciones a Google Sheets
+
+Después de cada exportación exitosa se recuerda la fila siguiente a la última
+escrita. En la próxima exportación se valida con una lectura acotada de pocas
+filas alrededor del cursor (A{n-1}:L{n+VENTANA}) en lugar de descargar la hoja
+completa; solo si la validación falla se vuelve al escaneo completo.
+"""
+import logging
+import threading
+
+from services.sheet_ranges import leer_rango, rango_a1
+
+logger = logging.getLogger(__name__)
+
+# Filas vacías que deben seguir al cursor para considerarlo válido
+VENTANA_FILAS = 5
+# Columnas A..L de una venta
+ANCHO_FILA = 12
+
+
+def _fila_vacia(row):
+    return not any(str(cell).strip() for cell in row if cell is not None)
+
+
+class RowCursor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cursores = {}  # (spreadsheet_id, worksheet_id) -> próxima fila libre
+        self._stats = {"hits": 0, "misses": 0, "invalidaciones": 0}
+
+    @staticmethod
+    def _clave(worksheet):
+        return (getattr(worksheet, "spreadsheet_id", None), worksheet.id)
+
+    def obtener(self, worksheet):
+        """
+        Próxima fila libre validada contra la hoja, o None si no hay cursor o
+        la validación falla (el llamador debe hacer el escaneo completo).
+        """
+        clave = self._clave(worksheet)
+        with self._lock:
+            fila = self._cursores.get(clave)
+        if not fila:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        try:
+            desde = max(1, fila - 1)
+            values = leer_rango(worksheet, rango_a1(1, ANCHO_FILA, desde, fila + VENTANA_FILAS), ANCHO_FILA)
+        except Exception as e:
+            logger.warning(f"No se pudo validar el cursor de fila {fila}: {e}")
+            values = None
+
+        valido = values is not None
+        if valido:
+            # La API omite filas vacías al final: completar la ventana
+            esperadas = fila + VENTANA_FILAS - desde + 1
+            values = values + [[""] * ANCHO_FILA] * (esperadas - len(values))
+            anterior_ocupada = fila - 1 <= 1 or not _fila_vacia(values[0])
+            siguientes_vacias = all(_fila_vacia(row) for row in values[fila - desde:])
+            valido = anterior_ocupada and siguientes_vacias
+
+        with self._lock:
+            if valido:
+                self._stats["hits"] += 1
+                return fila
+            self._stats["misses"] += 1
+            self._cursores.pop(clave, None)
+        logger.info(f"Cursor de fila {fila} ya no es válido, se hará escaneo completo")
+        return None
+
+    def consultar(self, worksheet):
+        """Próxima fila libre recordada, sin validarla contra la hoja (para reportes de estado)."""
+        with self._lock:
+            return self._cursores.get(self._clave(worksheet))
+
+    def avanzar(self, worksheet, proxima_fila):
+        """Registra la fila libre que sigue a una escritura exitosa."""
+        with self._lock:
+            self._cursores[self._clave(worksheet)] = int(proxima_fila)
+
+    def invalidar(self, worksheet=None):
+        """Olvida el cursor de una hoja (o de todas), ej. tras limpiar filas."""
+        with self._lock:
+            self._stats["invalidaciones"] += 1
+            if worksheet is None:
+                self._cursores.clear()
+            else:
+                self._cursores.pop(self._clave(worksheet), None)
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self._stats, cursores=len(self._cursores))
+
+
+# Cursor compartido por el proceso
+row_cursor = RowCursor()
@@ -2,6 +2,7 @@ from datetime import datetime
 from threading import RLock
 from .google_sheets_writer import GoogleSheetsWriter
 from .apps_script_writer import AppsScriptWriter
+from . import sheet_status
 from config import GOOGLE_APPS_SCRIPT
 
 try:
@@ -117,6 +118,20 @@ def limpiar_ventas():
     with _ventas_lock:
         _ventas.clear()
 
+def tomar_ventas():
+    """Saca atómicamente las ventas en memoria para exportarlas; las que lleguen después quedan."""
+    with _ventas_lock:
+        ventas = list(_ventas)
+        _ventas.clear()
+    return ventas
+
+def devolver_ventas(ventas: list[dict]):
+    """Vuelve a poner en memoria ventas tomadas que no se exportaron (delante de las nuevas)."""
+    if not ventas:
+        return
+    with _ventas_lock:
+        _ventas[:0] = ventas
+
 def cargar_ventas_desde_historial():
     """Carga todas las ventas del historial persistente a la memoria al iniciar el servidor"""
     from .history_service import leer_historial
@@ -134,8 +149,8 @@ def cargar_ventas_desde_historial():
         print(f"⚠️ Error cargando ventas desde historial: {e}")
         return 0
 
-def obtener_estado_sheets():
-    """Obtiene el estado del Google Sheet"""
+def obtener_estado_sheets(deep=False):
+    """Obtiene el estado del Google Sheet (metadata cacheada; deep=True escanea la hoja completa)"""
     writer = _get_sheets_writer()
     if writer is None:
         return {
@@ -143,7 +158,7 @@ def obtener_estado_sheets():
             "error": "GOOGLE_SHEETS_NOT_AVAILABLE",
             "mensaje": "Credenciales de Google Sheets no disponibles"
         }
-    return writer.obtener_estado_sheets()
+    return sheet_status.estado_sheets(writer, deep=deep)
 
 def exportar_todas_las_ventas_a_sheets():
     """Exporta TODAS las ventas acumuladas en memoria a Google Sheets en UNA sola actualización."""
@@ -154,104 +169,131 @@ def exportar_todas_las_ventas_a_sheets():
             "mensaje": "No hay ventas para exportar. Agrega algunas ventas primero."
         }
 
-    try:
-        writer = _get_sheets_writer()
-        # Tomar snapshot inmutable para evitar desfasajes si se agregan ventas durante la exportación
+    # Tomar snapshot inmutable para evitar desfasajes si se agregan ventas durante la exportación
+    with _ventas_lock:
         ventas_snapshot = list(_ventas)
-        print(f"🚀 Exportando {len(ventas_snapshot)} ventas...")
+    return exportar_ventas_a_sheets(ventas_snapshot)
 
-        # Si hay DB disponible, calcular costo_unitario por FIFO/PEPS para cada venta del snapshot
-        if get_session is not None and StockIngreso is not None and Venta is not None:
-            session = get_session()
-            try:
-                # Pre-cargar ventas ya persistidas para simular consumo FIFO correcto.
-                # Solo consideramos las ventas que ya tienen costo_unitario definido,
-                # para mantener el mismo criterio que usa el endpoint de stock_actual.
-                ventas_existentes = session.execute(
-                    select(Venta)
-                    .where(Venta.costo_unitario.isnot(None))
-                    .order_by(asc(Venta.fecha), asc(Venta.created_at), asc(Venta.id))
-                ).scalars().all()
-
-                # Construir un mapa producto_id -> lista de partidas de stock (orden FIFO)
-                partidas_por_id = {}
-                filas_stock = session.execute(
-                    select(StockIngreso)
-                    .order_by(asc(StockIngreso.fecha), asc(StockIngreso.id))
-                ).scalars().all()
-                for ing in filas_stock:
-                    pid = (ing.id_articulo or "").upper()
-                    if not pid:
-                        continue
-                    partidas_por_id.setdefault(pid, []).append({
-                        "restante": int(ing.cantidad or 0),
-                        "costo_u": float(ing.costo_individual or 0),
-                    })
-
-                # Función interna para consumir unidades FIFO de un ID dado
-                def _consumir_fifo(pid: str, unidades: int) -> float:
-                    if unidades <= 0:
-                        return 0.0
-                    pid = (pid or "").upper()
-                    if not pid:
-                        return 0.0
-                    partidas = partidas_por_id.get(pid) or []
-                    if not partidas:
-                        return 0.0
-
-                    unidades_pendientes = unidades
-                    costo_acumulado = 0.0
-                    unidades_tomadas = 0
-
-                    for p in partidas:
-                        disp = int(p.get("restante", 0) or 0)
-                        if disp <= 0:
-                            continue
-                        tomar = min(disp, unidades_pendientes)
-                        if tomar <= 0:
-                            continue
-                        costo_u = float(p.get("costo_u", 0) or 0)
-                        costo_acumulado += costo_u * tomar
-                        unidades_tomadas += tomar
-                        p["restante"] = disp - tomar
-                        unidades_pendientes -= tomar
-                        if unidades_pendientes <= 0:
-                            break
-
-                    if unidades_tomadas <= 0:
-                        return 0.0
-                    return float(costo_acumulado / unidades_tomadas)
-
-                # Primero, simular las ventas YA persistidas para consumir stock antiguo
-                for v in ventas_existentes:
-                    pid = (v.producto_id or "").upper()
-                    unidades = int(v.unidades or 0)
-                    if unidades <= 0:
+
+def calcular_costos_fifo(ventas_snapshot: list[dict]):
+    """
+    Completa venta["costo_unitario"] por FIFO/PEPS (si hay DB disponible),
+    simulando primero el consumo de las ventas ya persistidas.
+    """
+    # Si hay DB disponible, calcular costo_unitario por FIFO/PEPS para cada venta del snapshot
+    if get_session is not None and StockIngreso is not None and Venta is not None:
+        session = get_session()
+        try:
+            # Pre-cargar ventas ya persistidas para simular consumo FIFO correcto.
+            # Solo consideramos las ventas que ya tienen costo_unitario definido,
+            # para mantener el mismo criterio que usa el endpoint de stock_actual.
+            ventas_existentes = session.execute(
+                select(Venta)
+                .where(Venta.costo_unitario.isnot(None))
+                .order_by(asc(Venta.fecha), asc(Venta.created_at), asc(Venta.id))
+            ).scalars().all()
+
+            # Construir un mapa producto_id -> lista de partidas de stock (orden FIFO)
+            partidas_por_id = {}
+            filas_stock = session.execute(
+                select(StockIngreso)
+                .order_by(asc(StockIngreso.fecha), asc(StockIngreso.id))
+            ).scalars().all()
+            for ing in filas_stock:
+                pid = (ing.id_articulo or "").upper()
+                if not pid:
+                    continue
+                partidas_por_id.setdefault(pid, []).append({
+                    "restante": int(ing.cantidad or 0),
+                    "costo_u": float(ing.costo_individual or 0),
+                })
+
+            # Función interna para consumir unidades FIFO de un ID dado
+            def _consumir_fifo(pid: str, unidades: int) -> float:
+                if unidades <= 0:
+                    return 0.0
+                pid = (pid or "").upper()
+                if not pid:
+                    return 0.0
+                partidas = partidas_por_id.get(pid) or []
+                if not partidas:
+                    return 0.0
+
+                unidades_pendientes = unidades
+                costo_acumulado = 0.0
+                unidades_tomadas = 0
+
+                for p in partidas:
+                    disp = int(p.get("restante", 0) or 0)
+                    if disp <= 0:
                         continue
-                    # Si ya tiene costo_unitario definido, consumimos el stock usando ese costo, pero
-                    # no recalculamos; solo avanzamos el puntero FIFO
-                    _ = _consumir_fifo(pid, unidades)
-
-                # Luego, calcular costo_unitario para cada venta nueva en memoria, en orden
-                for venta in ventas_snapshot:
-                    pid = str(venta.get("id") or "").upper()
-                    unidades = int(venta.get("unidades") or 0)
-                    if unidades <= 0:
-                        venta["costo_unitario"] = 0.0
+                    tomar = min(disp, unidades_pendientes)
+                    if tomar <= 0:
                         continue
-                    costo_u = _consumir_fifo(pid, unidades)
-                    # Regla de negocio: si no hay stock disponible, costo_unitario = 0
-                    venta["costo_unitario"] = float(costo_u or 0.0)
-            finally:
-                try:
-                    session.close()
-                except Exception:
-                    pass
+                    costo_u = float(p.get("costo_u", 0) or 0)
+                    costo_acumulado += costo_u * tomar
+                    unidades_tomadas += tomar
+                    p["restante"] = disp - tomar
+                    unidades_pendientes -= tomar
+                    if unidades_pendientes <= 0:
+                        break
+
+                if unidades_tomadas <= 0:
+                    return 0.0
+                return float(costo_acumulado / unidades_tomadas)
+
+            # Primero, simular las ventas YA persistidas para consumir stock antiguo
+            for v in ventas_existentes:
+                pid = (v.producto_id or "").upper()
+                unidades = int(v.unidades or 0)
+                if unidades <= 0:
+                    continue
+                # Si ya tiene costo_unitario definido, consumimos el stock usando ese costo, pero
+                # no recalculamos; solo avanzamos el puntero FIFO
+                _ = _consumir_fifo(pid, unidades)
+
+            # Luego, calcular costo_unitario para cada venta nueva en memoria, en orden
+            for venta in ventas_snapshot:
+                pid = str(venta.get("id") or "").upper()
+                unidades = int(venta.get("unidades") or 0)
+                if unidades <= 0:
+                    venta["costo_unitario"] = 0.0
+                    continue
+                costo_u = _consumir_fifo(pid, unidades)
+                # Regla de negocio: si no hay stock disponible, costo_unitario = 0
+                venta["costo_unitario"] = float(costo_u or 0.0)
+        finally:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+
+def exportar_ventas_a_sheets(ventas_snapshot: list[dict]):
+    """
+    Exporta la lista de ventas dada (FIFO de costos + escritura en Sheets).
+    La usan la exportación directa y los jobs en segundo plano (services.export_jobs).
+    """
+    if not ventas_snapshot:
+        return {
+            "success": False,
+            "error": "NO_HAY_VENTAS",
+            "mensaje": "No hay ventas para exportar. Agrega algunas ventas primero."
+        }
+
+    try:
+        writer = _get_sheets_writer()
+        print(f"🚀 Exportando {len(ventas_snapshot)} ventas...")
+
+        calcular_costos_fifo(ventas_snapshot)
 
         resultado = writer.agregar_multiples_ventas_a_sheets(ventas_snapshot)
         # Enriquecer respuesta con las ventas efectivamente exportadas
         try:
-            indices = resultado.get("indices_exitosos") or list(range(len(ventas_snapshot)))
+            indices = resultado.get("indices_exitosos")
+            if indices is None:
+                # Sin índices: todas si salió bien, ninguna si falló
+                indices = range(len(ventas_snapshot)) if resultado.get("success") else []
             ventas_ok = [ventas_snapshot[i] for i in indices if 0 <= i < len(ventas_snapshot)]
             resultado["ventas_exportadas_items"] = ventas_ok
         except Exception:
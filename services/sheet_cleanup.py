@@ -0,0 +1,134 @@
+"""
+Limpieza de la hoja de ventas en una pasada
+
+Lee A:L UNA vez, clasifica cada fila con todas las reglas a la vez, une las
+filas sucias consecutivas en tramos y los borra con UN solo batch_clear.
+Con dry_run=True solo informa qué se borraría.
+
+Reglas (las mismas que usaban los limpiar_* de GoogleSheetsWriter):
+  - vacias_final: filas sin datos significativos después de la última con datos
+  - vacias:       filas sin datos significativos en cualquier parte de la hoja
+  - fantasma:     igual que 'vacias' (la API devuelve solo texto: formato y
+                  fórmulas sin valor llegan como "")
+  - basura:       filas con menos de 2 celdas útiles ($0,00, "-", "N/A", etc. no cuentan)
+"""
+import logging
+
+from services.sheet_ranges import leer_rango, rango_a1
+
+logger = logging.getLogger(__name__)
+
+ANCHO_FILA = 12  # A..L
+# La fila 1 tiene los headers y nunca se limpia
+PRIMERA_FILA_DATOS = 2
+
+VALORES_NULOS = frozenset(['', '-', 'N/A', 'n/a', 'NULL', 'null', 'None', 'none'])
+VALORES_BASURA = VALORES_NULOS | frozenset(['$0,00', '$0.00', '0', '0.00', '0,00'])
+
+REGLAS = ("vacias_final", "vacias", "fantasma", "basura")
+
+
+def _contar(row):
+    """(celdas significativas, celdas útiles) de una fila."""
+    significativas = utiles = 0
+    for cell in row:
+        valor = str(cell).strip() if cell is not None else ""
+        if valor not in VALORES_NULOS:
+            significativas += 1
+        if valor not in VALORES_BASURA:
+            utiles += 1
+    return significativas, utiles
+
+
+def clasificar(values, primera_fila=PRIMERA_FILA_DATOS):
+    """
+    Una pasada sobre las filas (1-based desde la fila 1). Devuelve
+    {regla: [números de fila]} para todas las reglas, la última fila con datos
+    y cuántas filas (sin contar headers) tienen datos.
+    """
+    por_regla = {regla: [] for regla in REGLAS}
+    vacias = []
+    ultima_con_datos = con_datos = 0
+    for numero, row in enumerate(values, start=1):
+        significativas, utiles = _contar(row)
+        if significativas:
+            ultima_con_datos = numero
+        if numero < primera_fila:
+            continue
+        if significativas:
+            con_datos += 1
+        else:
+            vacias.append(numero)
+        if utiles < 2:
+            por_regla["basura"].append(numero)
+    por_regla["vacias"] = vacias
+    por_regla["fantasma"] = list(vacias)
+    por_regla["vacias_final"] = [n for n in vacias if n > ultima_con_datos]
+    return por_regla, ultima_con_datos, con_datos
+
+
+def unir_tramos(filas):
+    """[3, 4, 5, 9, 10] -> [(3, 5), (9, 10)]"""
+    tramos = []
+    for fila in sorted(set(filas)):
+        if tramos and fila == tramos[-1][1] + 1:
+            tramos[-1] = (tramos[-1][0], fila)
+        else:
+            tramos.append((fila, fila))
+    return tramos
+
+
+def rangos_de_tramos(tramos, preservar_columna_d=True):
+    """Rangos A1 a borrar. Con preservar_columna_d se borra A:C y E:L (D no se toca)."""
+    rangos = []
+    for desde, hasta in tramos:
+        if preservar_columna_d:
+            rangos.extend([f"A{desde}:C{hasta}", f"E{desde}:L{hasta}"])
+        else:
+            rangos.append(f"A{desde}:L{hasta}")
+    return rangos
+
+
+def limpiar(worksheet, reglas, preservar_columna_d=True, dry_run=False, values=None):
+    """
+    Limpia las filas que cumplen CUALQUIERA de 'reglas'. Una lectura (A:L) y un
+    batch_clear. values: A:L ya leído por el llamador (evita la lectura).
+    """
+    reglas = tuple(reglas)
+    desconocidas = [r for r in reglas if r not in REGLAS]
+    if desconocidas:
+        raise ValueError(f"Reglas de limpieza desconocidas: {desconocidas}")
+
+    if values is None:
+        values = leer_rango(worksheet, rango_a1(1, ANCHO_FILA), ancho=ANCHO_FILA)
+    por_regla, ultima_con_datos, con_datos = clasificar(values)
+
+    filas = sorted(set().union(*(por_regla[r] for r in reglas))) if reglas else []
+    tramos = unir_tramos(filas)
+    rangos = rangos_de_tramos(tramos, preservar_columna_d)
+    total_filas = len(values)
+    reporte = {
+        "success": True,
+        "dry_run": bool(dry_run),
+        "reglas": list(reglas),
+        "filas_encontradas": len(filas),
+        "filas_limpiadas": 0,
+        "filas_con_datos": con_datos,
+        "por_regla": {regla: len(por_regla[regla]) for regla in REGLAS},
+        "tramos": [f"{desde}-{hasta}" if desde != hasta else str(desde) for desde, hasta in tramos],
+        "rangos": len(rangos),
+        "ultima_fila_con_datos": ultima_con_datos,
+        "total_filas_antes": total_filas,
+    }
+
+    if not rangos:
+        logger.info("Limpieza: no hay filas para limpiar")
+        return reporte
+    if dry_run:
+        logger.info(f"Limpieza (simulada): {len(filas)} filas en {len(tramos)} tramos")
+        return reporte
+
+    worksheet.batch_clear(rangos)
+    reporte["filas_limpiadas"] = len(filas)
+    logger.info(f"✅ Limpieza: {len(filas)} filas en {len(tramos)} tramos ({len(rangos)} rangos, 1 request)")
+    return reporte
@@ -0,0 +1,150 @@
+"""
+Pestañas de ventas particionadas por mes ("Ingreso 2026-10")
+
+Con GOOGLE_SHEETS_PARTITION=mensual cada venta se escribe en la pestaña de su
+mes, creada a demanda con headers y una grilla ya dimensionada
+(PARTITION_ROWS filas), en lugar de la única "Ingreso Diario" que se llenaba.
+Una pestaña índice ("Índice Ingresos": Mes | Hoja | GID | Creada) mapea meses
+a pestañas; se lee una vez por proceso y se le agrega una fila por pestaña
+nueva. Las lecturas, redimensiones y limpiezas tocan solo la pestaña del mes
+en curso; los meses anteriores quedan congelados.
+"""
+import re
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import gspread
+
+from config import GOOGLE_SHEETS_CONFIG
+from services import google_client
+from services.sheet_ranges import leer_rango, rango_a1
+
+logger = logging.getLogger(__name__)
+
+HEADERS_INDICE = ["Mes", "Hoja", "GID", "Creada"]
+_RE_MES = re.compile(r"^(\d{4})-(\d{2})")
+_RE_MES_TITULO = re.compile(r"(\d{4}-\d{2})$")
+
+
+def habilitado():
+    return str(GOOGLE_SHEETS_CONFIG.get("PARTITION", "")).strip().lower() in ("mensual", "monthly")
+
+
+def mes_actual():
+    return datetime.now().strftime("%Y-%m")
+
+
+def mes_de(venta):
+    """'2026-10-17' -> '2026-10'; ventas sin fecha válida van al mes en curso."""
+    m = _RE_MES.match(str((venta or {}).get("fecha") or "").strip())
+    if not m or not 1 <= int(m.group(2)) <= 12:
+        return mes_actual()
+    return f"{m.group(1)}-{m.group(2)}"
+
+
+def agrupar_por_mes(ventas):
+    """{mes: [índices]} en el orden en que aparece cada mes."""
+    grupos = OrderedDict()
+    for i, venta in enumerate(ventas):
+        grupos.setdefault(mes_de(venta), []).append(i)
+    return grupos
+
+
+class ParticionesMensuales:
+    """Resuelve (y crea si hace falta) la pestaña de cada mes de un spreadsheet."""
+
+    def __init__(self, spreadsheet, sheet_id, headers):
+        self.spreadsheet = spreadsheet
+        self.sheet_id = sheet_id
+        self.headers = list(headers)
+        self.prefijo = GOOGLE_SHEETS_CONFIG.get("PARTITION_PREFIX", "Ingreso")
+        self.filas = int(GOOGLE_SHEETS_CONFIG.get("PARTITION_ROWS", 2000))
+        self.titulo_indice = GOOGLE_SHEETS_CONFIG.get("PARTITION_INDEX", "Índice Ingresos")
+        self._lock = threading.RLock()
+        self._indice = None       # mes -> gid
+        self._hoja_indice = None
+        self._hojas = {}          # mes -> Worksheet
+
+    def titulo(self, mes):
+        return f"{self.prefijo} {mes}"
+
+    def _obtener_indice(self):
+        if self._indice is not None:
+            return self._indice
+        try:
+            self._hoja_indice = google_client.get_worksheet(self.sheet_id, titulo=self.titulo_indice)
+            filas = leer_rango(self._hoja_indice, rango_a1(1, 3, fila_inicio=2), ancho=3)
+            self._indice = {}
+            for mes, titulo, gid in filas:
+                mes = str(mes).strip()
+                if not _RE_MES.match(mes):
+                    # Filas viejas escritas con USER_ENTERED: Sheets convirtió el mes en fecha;
+                    # el título de la pestaña conserva el mes como texto
+                    m = _RE_MES_TITULO.search(str(titulo).strip())
+                    mes = m.group(1) if m else ""
+                # El GID como número puede venir formateado ("1.664.309.383")
+                gid = re.sub(r"[.,\s]", "", str(gid))
+                if mes and gid.isdigit():
+                    self._indice[mes] = int(gid)
+        except gspread.WorksheetNotFound:
+            self._hoja_indice = self.spreadsheet.add_worksheet(
+                title=self.titulo_indice, rows=200, cols=len(HEADERS_INDICE)
+            )
+            google_client.registrar_worksheet(self._hoja_indice, self.sheet_id)
+            self._hoja_indice.update("A1:D1", [HEADERS_INDICE])
+            self._indice = {}
+            logger.info(f"Pestaña índice '{self.titulo_indice}' creada")
+        return self._indice
+
+    def _crear(self, mes):
+        titulo = self.titulo(mes)
+        try:
+            hoja = self.spreadsheet.add_worksheet(title=titulo, rows=self.filas, cols=len(self.headers))
+        except gspread.exceptions.APIError as e:
+            if "already exists" not in str(e).lower():
+                raise
+            # Otro worker la creó primero
+            return google_client.get_worksheet(self.sheet_id, titulo=titulo), False
+        google_client.registrar_worksheet(hoja, self.sheet_id)
+        hoja.update(rango_a1(1, len(self.headers), 1, 1), [self.headers], value_input_option="USER_ENTERED")
+        logger.info(f"✅ Pestaña '{titulo}' creada ({self.filas} filas)")
+        return hoja, True
+
+    def hoja_del_mes(self, mes):
+        """Worksheet de 'mes' (YYYY-MM): del caché, del índice, por título o creada."""
+        with self._lock:
+            hoja = self._hojas.get(mes)
+            if hoja is not None:
+                return hoja
+            indice = self._obtener_indice()
+            hoja = None
+            if mes in indice:
+                try:
+                    hoja = google_client.get_worksheet(self.sheet_id, gid=indice[mes])
+                except gspread.WorksheetNotFound:
+                    logger.warning(f"La pestaña del índice para {mes} (GID {indice[mes]}) ya no existe")
+            if hoja is None:
+                try:
+                    hoja = google_client.get_worksheet(self.sheet_id, titulo=self.titulo(mes))
+                except gspread.WorksheetNotFound:
+                    hoja, _ = self._crear(mes)
+            if indice.get(mes) != hoja.id:
+                # RAW: con USER_ENTERED Sheets convierte "2026-10" en fecha y el GID en número,
+                # y _obtener_indice no los reconoce al releerlos
+                self._hoja_indice.append_row(
+                    [mes, hoja.title, str(hoja.id), datetime.now().isoformat(timespec="seconds")],
+                    value_input_option="RAW",
+                )
+                indice[mes] = hoja.id
+            self._hojas[mes] = hoja
+            return hoja
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "indice": self.titulo_indice,
+                "meses": dict(sorted((self._indice or {}).items())),
+                "pestañas_abiertas": sorted(self._hojas),
+            }
@@ -0,0 +1,61 @@
+"""
+Lectura por rangos A1 acotados en lugar de get_all_values()
+
+Cada consumidor pide solo las columnas/filas que usa (ej. I4:J, A1:L) y
+recibe matrices rectangulares (rellenadas con "") listas para parsear.
+"""
+import logging
+
+from gspread.utils import absolute_range_name, fill_gaps, rowcol_to_a1
+
+logger = logging.getLogger(__name__)
+
+
+def letra_columna(col: int) -> str:
+    """1 -> A, 12 -> L, 27 -> AA"""
+    return rowcol_to_a1(1, col)[:-1]
+
+
+def rango_a1(col_inicio: int, col_fin: int, fila_inicio: int = 1, fila_fin: int = None, hoja: str = None) -> str:
+    """
+    Construye un rango A1 por columnas (1-based). Sin fila_fin el rango queda
+    abierto hacia abajo ("I4:J"), y la API devuelve solo hasta la última fila con datos.
+    """
+    rango = f"{letra_columna(col_inicio)}{fila_inicio}:{letra_columna(col_fin)}{fila_fin if fila_fin else ''}"
+    return absolute_range_name(hoja, rango) if hoja else rango
+
+
+def _rellenar(values, ancho):
+    if not values:
+        return []
+    return fill_gaps(values, cols=ancho) if ancho else fill_gaps(values)
+
+
+def leer_rango(worksheet, rango: str, ancho: int = None):
+    """Lee un único rango de la hoja y devuelve filas rellenadas a 'ancho' columnas."""
+    values = worksheet.get_values(rango)
+    return _rellenar(values, ancho)
+
+
+def leer_rangos(spreadsheet, rangos, anchos=None):
+    """
+    Lee varios rangos absolutos ("'Hoja'!A1:B") en UNA llamada values_batch_get.
+    Devuelve una lista de matrices en el mismo orden que 'rangos'.
+    """
+    rangos = list(rangos)
+    if not rangos:
+        return []
+    respuesta = spreadsheet.values_batch_get(rangos)
+    value_ranges = respuesta.get("valueRanges", []) if isinstance(respuesta, dict) else []
+    resultado = []
+    for i in range(len(rangos)):
+        values = value_ranges[i].get("values", []) if i < len(value_ranges) else []
+        ancho = anchos[i] if anchos and i < len(anchos) else None
+        resultado.append(_rellenar(values, ancho))
+    logger.debug(f"Lectura por rangos: {len(rangos)} rangos en 1 llamada")
+    return resultado
+
+
+def columna(values, idx: int = 0):
+    """Extrae una columna (lista de strings) de una matriz ya rellenada."""
+    return [(row[idx] if idx < len(row) else "") for row in values]
@@ -0,0 +1,162 @@
+"""
+Estado de la hoja de ventas sin descargar celdas
+
+Responde /api/sheets/status y /test_sheets con la metadata del spreadsheet
+(hojas, row_count/col_count, rangos protegidos) pedida en UNA request con
+'fields' acotado, más la próxima fila libre que recuerda el cursor de
+exportación. La metadata se cachea STATUS_CACHE_TTL segundos (config.py), así
+monitores y páginas de salud no consumen cuota de lectura. El escaneo completo
+(writer.obtener_estado_sheets) solo corre con deep=True.
+"""
+import time
+import logging
+import threading
+
+from config import GOOGLE_SHEETS_CONFIG
+from services.row_cursor import row_cursor
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_METADATA = (
+    "properties.title,"
+    "sheets(properties(sheetId,title,index,gridProperties(rowCount,columnCount)),"
+    "protectedRanges(protectedRangeId,range,warningOnly))"
+)
+
+_lock = threading.Lock()
+_cache = {}  # sheet_id -> (ts, metadata)
+_stats = {"hits": 0, "misses": 0, "escaneos_completos": 0}
+
+
+def _ttl():
+    return float(GOOGLE_SHEETS_CONFIG.get("STATUS_CACHE_TTL", 30))
+
+
+def obtener_metadata(spreadsheet, forzar=False):
+    """Metadata del spreadsheet (1 request), cacheada por STATUS_CACHE_TTL. Devuelve (metadata, edad_s)."""
+    ahora = time.time()
+    with _lock:
+        cacheado = _cache.get(spreadsheet.id)
+        if cacheado and not forzar and ahora - cacheado[0] < _ttl():
+            _stats["hits"] += 1
+            return cacheado[1], ahora - cacheado[0]
+        _stats["misses"] += 1
+    metadata = spreadsheet.fetch_sheet_metadata(params={"fields": CAMPOS_METADATA})
+    with _lock:
+        _cache[spreadsheet.id] = (time.time(), metadata)
+    return metadata, 0.0
+
+
+def invalidar(sheet_id=None):
+    with _lock:
+        if sheet_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(sheet_id, None)
+
+
+def _hoja_protegida(sheet, rangos):
+    """Protegida si algún rango sin warningOnly cubre la hoja completa (sin límites de filas/columnas)."""
+    for rango in rangos:
+        if rango.get("warningOnly"):
+            continue
+        r = rango.get("range") or {}
+        if not any(k in r for k in ("startRowIndex", "endRowIndex", "startColumnIndex", "endColumnIndex")):
+            return True
+    return False
+
+
+def _rango_bloquea_columnas(rango, columnas):
+    """True si el rango (sin warningOnly) toca alguna de las primeras 'columnas' columnas."""
+    if rango.get("warningOnly"):
+        return False
+    r = rango.get("range") or {}
+    desde = r.get("startColumnIndex", 0)
+    hasta = r.get("endColumnIndex")
+    return desde < columnas and (hasta is None or hasta > 0)
+
+
+def escritura_protegida(spreadsheet, worksheet_id, columnas=12):
+    """
+    Para el camino de escritura: True si algún rango protegido toca las columnas
+    de ventas (A:L por defecto), aunque no cubra la hoja entera (ej. D:D).
+    """
+    for forzar in (False, True):
+        # Una hoja recién creada (ej. pestaña mensual) puede no estar en la metadata cacheada
+        metadata, _ = obtener_metadata(spreadsheet, forzar=forzar)
+        for sheet in metadata.get("sheets", []):
+            if sheet["properties"]["sheetId"] == worksheet_id:
+                return any(_rango_bloquea_columnas(r, columnas) for r in sheet.get("protectedRanges", []))
+    return None
+
+
+def protegida(spreadsheet, worksheet_id):
+    """True si la hoja está protegida completa; None si no está en la metadata."""
+    metadata, _ = obtener_metadata(spreadsheet)
+    for sheet in metadata.get("sheets", []):
+        if sheet["properties"]["sheetId"] == worksheet_id:
+            return _hoja_protegida(sheet, sheet.get("protectedRanges", []))
+    return None
+
+
+def listar_hojas(spreadsheet):
+    """Títulos de las hojas desde la metadata cacheada."""
+    metadata, _ = obtener_metadata(spreadsheet)
+    return [s["properties"]["title"] for s in metadata.get("sheets", [])]
+
+
+def estado_sheets(writer, deep=False):
+    """
+    Estado de la hoja de ventas del writer. Sin deep: metadata cacheada + cursor
+    (0 o 1 request). Con deep: escaneo completo de la hoja (writer.obtener_estado_sheets).
+    """
+    if deep or not hasattr(writer, "spreadsheet"):
+        # Apps Script no tiene metadata de gspread: su estado viene del Web App
+        if deep:
+            with _lock:
+                _stats["escaneos_completos"] += 1
+        resultado = writer.obtener_estado_sheets()
+        if isinstance(resultado, dict) and hasattr(writer, "spreadsheet"):
+            resultado["modo"] = "completo"
+        return resultado
+
+    try:
+        metadata, edad = obtener_metadata(writer.spreadsheet)
+        worksheet = writer.worksheet
+        sheet = next(
+            (s for s in metadata.get("sheets", []) if s["properties"]["sheetId"] == worksheet.id),
+            None,
+        )
+        if sheet is None:
+            return {"success": False, "error": f"La hoja '{writer.sheet_name}' ya no existe en el spreadsheet"}
+
+        grid = sheet["properties"].get("gridProperties", {})
+        rangos = sheet.get("protectedRanges", [])
+        proxima_fila = row_cursor.consultar(worksheet)
+        return {
+            "success": True,
+            "modo": "metadata",
+            "url": f"https://docs.google.com/spreadsheets/d/{writer.sheet_id}",
+            "nombre_hoja": writer.sheet_name,
+            "ultima_fila": proxima_fila - 1 if proxima_fila else None,
+            "proxima_fila": proxima_fila,
+            "dimensiones_hoja": {
+                "filas": grid.get("rowCount"),
+                "columnas": grid.get("columnCount"),
+            },
+            "hoja_protegida": _hoja_protegida(sheet, rangos),
+            "rangos_protegidos": len(rangos),
+            "hojas": [s["properties"]["title"] for s in metadata.get("sheets", [])],
+            "cache_edad_s": round(edad, 1),
+            "nota": "Sin escaneo de celdas; usar ?deep=1 para el estado completo" + (
+                "" if proxima_fila else " (la última fila se conoce después de la primera exportación)"
+            ),
+        }
+    except Exception as e:
+        logger.error(f"Error obteniendo estado de Google Sheets: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def estadisticas():
+    with _lock:
+        return dict(_stats, spreadsheets_cacheados=len(_cache), ttl_s=_ttl())
@@ -0,0 +1,524 @@
+"""
+Emulador local de Google Sheets (en memoria, sin credenciales)
+
+Implementa la parte de la API de gspread que usa la app (Spreadsheet y
+Worksheet: get_all_values, get_values, row_values, col_values, acell, update,
+update_cell, append_row, batch_clear, resize, worksheet, worksheets,
+get_worksheet_by_id, add_worksheet, fetch_sheet_metadata, values_batch_get, values_batch_update,
+row_count/col_count) para medir cantidad de requests y latencia de
+GoogleSheetsWriter, CatalogService, TipoService y export_service sin Google.
+
+Se activa con GOOGLE_SHEETS_BACKEND=emulador (ver config.py); google_client
+entrega entonces este cliente en lugar del de gspread. Cada request emulada:
+  - pasa por el limitador de cuota y el contador de google_client (igual que
+    una request real, así contar_llamadas() y los reintentos funcionan)
+  - duerme la latencia configurada (GOOGLE_SHEETS_EMULATOR_LATENCY_MS)
+  - responde 429 si supera la cuota por minuto del emulador
+  - responde 400 si escribe sobre un rango protegido o fuera de la grilla
+y queda contada en estadisticas().
+"""
+import re
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque
+
+from gspread.cell import Cell
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol, fill_gaps, rowcol_to_a1
+
+from config import GOOGLE_SHEETS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+FILAS_POR_DEFECTO = 1000
+COLUMNAS_POR_DEFECTO = 26
+_RE_A1 = re.compile(r"^([A-Za-z]+\d+|[A-Za-z]+\d*:[A-Za-z]+\d*|\d+:\d+)$")
+HEADERS_VENTAS = [
+    "Fecha", "Notas", "ID", "Nombre del Elemento", "Precio",
+    "Unidades", "Precio Unitario", "Costo U", "Tipo",
+    "Forma de Pago", "Costo Total", "Margen",
+]
+
+
+class _RespuestaEmulada:
+    """Lo mínimo de requests.Response que usa gspread.exceptions.APIError."""
+
+    def __init__(self, codigo, mensaje, estado, headers=None):
+        self.status_code = codigo
+        self.headers = headers or {}
+        self._error = {"code": codigo, "message": mensaje, "status": estado}
+        self.text = json.dumps({"error": self._error})
+
+    def json(self):
+        return {"error": self._error}
+
+
+def _api_error(codigo, mensaje, estado, headers=None):
+    return APIError(_RespuestaEmulada(codigo, mensaje, estado, headers))
+
+
+def _separar_hoja(rango):
+    """"'Hoja 1'!A1:C" -> ("Hoja 1", "A1:C"); "A1:C" -> (None, "A1:C"); "'Hoja 1'" -> ("Hoja 1", None)."""
+    if "!" in rango:
+        hoja, celdas = rango.rsplit("!", 1)
+    elif _RE_A1.match(rango):
+        return None, rango
+    else:
+        hoja, celdas = rango, None  # solo el nombre de la hoja: la hoja completa
+    if len(hoja) >= 2 and hoja[0] == hoja[-1] == "'":
+        hoja = hoja[1:-1].replace("''", "'")
+    return hoja, celdas
+
+
+def _grilla(celdas):
+    """Rango A1 -> (fila_ini, fila_fin, col_ini, col_fin) 0-based, fin exclusivo (None = abierto)."""
+    if not celdas:
+        return 0, None, 0, None
+    if ":" not in celdas:
+        fila, col = a1_to_rowcol(celdas)
+        return fila - 1, fila, col - 1, col
+    g = a1_range_to_grid_range(celdas)
+    return g.get("startRowIndex", 0), g.get("endRowIndex"), g.get("startColumnIndex", 0), g.get("endColumnIndex")
+
+
+def _recortar(values):
+    """Como la API: sin celdas vacías al final de cada fila ni filas vacías al final."""
+    filas = []
+    for row in values:
+        fin = len(row)
+        while fin and row[fin - 1] == "":
+            fin -= 1
+        filas.append(row[:fin])
+    while filas and not filas[-1]:
+        filas.pop()
+    return filas
+
+
+class EmuladorSheets:
+    """Estado del "servidor": spreadsheets, cuota, latencia, rangos protegidos y contadores."""
+
+    def __init__(self, latencia_ms=0.0, jitter_ms=0.0, cuota_lecturas_min=0, cuota_escrituras_min=0,
+                 rangos_protegidos=(), semilla=None):
+        self.latencia_ms = float(latencia_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.cuota = {"lecturas": int(cuota_lecturas_min), "escrituras": int(cuota_escrituras_min)}
+        self.rangos_protegidos = [_separar_hoja(r) for r in rangos_protegidos]
+        self.semilla = semilla
+        self._lock = threading.RLock()
+        self._spreadsheets = {}
+        self._ventanas = {"lecturas": deque(), "escrituras": deque()}
+        self._stats = {}
+        self.reiniciar_estadisticas()
+
+    # --- contabilidad -------------------------------------------------------
+    def reiniciar_estadisticas(self):
+        with self._lock:
+            self._stats = {
+                "requests": 0, "lecturas": 0, "escrituras": 0, "por_metodo": {},
+                "rechazos_cuota": 0, "rechazos_proteccion": 0, "fuera_de_grilla": 0,
+                "latencia_total_s": 0.0,
+            }
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self._stats, por_metodo=dict(self._stats["por_metodo"]),
+                        latencia_total_s=round(self._stats["latencia_total_s"], 3))
+
+    def _request(self, metodo, nombre, operacion):
+        """Una request HTTP emulada, enviada por el mismo camino que las reales (cuota + contador)."""
+        from services import google_client
+
+        tipo = "lecturas" if metodo == "GET" else "escrituras"
+
+        def enviar():
+            inicio = time.monotonic()
+            with self._lock:
+                self._stats["requests"] += 1
+                self._stats[tipo] += 1
+                self._stats["por_metodo"][nombre] = self._stats["por_metodo"].get(nombre, 0) + 1
+                self._verificar_cuota(tipo)
+            espera = self.latencia_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+            if espera > 0:
+                time.sleep(espera / 1000.0)
+            try:
+                with self._lock:
+                    return operacion()
+            finally:
+                with self._lock:
+                    self._stats["latencia_total_s"] += time.monotonic() - inicio
+
+        return google_client.ejecutar_request(metodo, enviar)
+
+    def _verificar_cuota(self, tipo):
+        limite = self.cuota[tipo]
+        if not limite:
+            return
+        ahora = time.monotonic()
+        ventana = self._ventanas[tipo]
+        while ventana and ahora - ventana[0] >= 60:
+            ventana.popleft()
+        if len(ventana) >= limite:
+            self._stats["rechazos_cuota"] += 1
+            retry_after = max(1, int(60 - (ahora - ventana[0])) + 1)
+            raise _api_error(
+                429, f"Quota exceeded for quota metric '{tipo}' (emulador: {limite}/min)",
+                "RESOURCE_EXHAUSTED", {"Retry-After": str(retry_after)},
+            )
+        ventana.append(ahora)
+
+    def _verificar_escritura(self, hoja, fila_ini, fila_fin, col_ini, col_fin):
+        if fila_fin > hoja.row_count or col_fin > hoja.col_count:
+            self._stats["fuera_de_grilla"] += 1
+            raise _api_error(
+                400,
+                f"Range ('{hoja.title}'!{rowcol_to_a1(fila_ini + 1, col_ini + 1)}:{rowcol_to_a1(fila_fin, col_fin)}) "
+                f"exceeds grid limits. Max rows: {hoja.row_count}, max columns: {hoja.col_count}",
+                "INVALID_ARGUMENT",
+            )
+        for titulo, celdas in self.rangos_protegidos:
+            if titulo not in (None, hoja.title):
+                continue
+            p_fila_ini, p_fila_fin, p_col_ini, p_col_fin = _grilla(celdas)
+            p_fila_fin = hoja.row_count if p_fila_fin is None else p_fila_fin
+            p_col_fin = hoja.col_count if p_col_fin is None else p_col_fin
+            if fila_ini < p_fila_fin and p_fila_ini < fila_fin and col_ini < p_col_fin and p_col_ini < col_fin:
+                self._stats["rechazos_proteccion"] += 1
+                raise _api_error(
+                    400, "You are trying to edit a protected cell or object. Please contact the spreadsheet owner "
+                         "to remove protection if you need to edit.", "FAILED_PRECONDITION",
+                )
+
+    # --- spreadsheets -------------------------------------------------------
+    def abrir(self, sheet_id):
+        with self._lock:
+            spreadsheet = self._spreadsheets.get(sheet_id)
+            if spreadsheet is None:
+                spreadsheet = SpreadsheetEmulado(self, sheet_id)
+                spreadsheet._sembrar(self.semilla)
+                self._spreadsheets[sheet_id] = spreadsheet
+            return spreadsheet
+
+
+class ClienteEmulado:
+    """Reemplazo de gspread.Client."""
+
+    def __init__(self, emulador):
+        self.emulador = emulador
+
+    def open_by_key(self, key):
+        spreadsheet = self.emulador.abrir(key)
+        self.emulador._request("GET", "open_by_key", lambda: None)
+        return spreadsheet
+
+
+class SpreadsheetEmulado:
+    def __init__(self, emulador, sheet_id):
+        self._emulador = emulador
+        self.id = sheet_id
+        self.title = "Emulador Milo Store"
+        self._hojas = []
+
+    def _sembrar(self, semilla):
+        """semilla: dict {"titulo", "hojas": [{"titulo", "gid", "filas", "columnas", "valores"}]}."""
+        if not semilla:
+            semilla = {"hojas": [
+                {"titulo": GOOGLE_SHEETS_CONFIG.get("SHEET_NAME", "Ingreso Diario"), "gid": 0,
+                 "valores": [HEADERS_VENTAS]},
+                {"titulo": "Códigos Stock", "gid": int(GOOGLE_SHEETS_CONFIG.get("CATALOG_GID") or 1),
+                 "valores": [["ID", "Nombre", "Precio"]]},
+            ]}
+        self.title = semilla.get("titulo", self.title)
+        for hoja in semilla.get("hojas", []):
+            self._agregar(hoja["titulo"], hoja.get("filas", FILAS_POR_DEFECTO), hoja.get("columnas", COLUMNAS_POR_DEFECTO),
+                          gid=hoja.get("gid"), valores=hoja.get("valores"))
+
+    def _agregar(self, titulo, filas, columnas, gid=None, valores=None):
+        if gid is None:
+            gid = max([h.id for h in self._hojas] + [0]) + 1
+        hoja = WorksheetEmulada(self, int(gid), titulo, int(filas), int(columnas))
+        for fila, row in enumerate(valores or [], start=1):
+            hoja.row_count = max(hoja.row_count, fila)
+            hoja.col_count = max(hoja.col_count, len(row))
+            hoja._escribir(fila - 1, 0, [row])
+        self._hojas.append(hoja)
+        return hoja
+
+    def _hoja_por_titulo(self, titulo):
+        for hoja in self._hojas:
+            if hoja.title == titulo:
+                return hoja
+        raise WorksheetNotFound(titulo)
+
+    def _request(self, metodo, nombre, operacion):
+        return self._emulador._request(metodo, nombre, operacion)
+
+    def worksheets(self, exclude_hidden=False):
+        return self._request("GET", "worksheets", lambda: list(self._hojas))
+
+    def worksheet(self, title):
+        return self._request("GET", "worksheet", lambda: self._hoja_por_titulo(title))
+
+    def get_worksheet_by_id(self, id):
+        def buscar():
+            for hoja in self._hojas:
+                if hoja.id == int(id):
+                    return hoja
+            raise WorksheetNotFound(f"id {id} not found")
+        return self._request("GET", "get_worksheet_by_id", buscar)
+
+    def add_worksheet(self, title, rows, cols, index=None):
+        def agregar():
+            if any(h.title == title for h in self._hojas):
+                raise _api_error(400, f'A sheet with the name "{title}" already exists.', "INVALID_ARGUMENT")
+            return self._agregar(title, rows, cols)
+        return self._request("POST", "add_worksheet", agregar)
+
+    def fetch_sheet_metadata(self, params=None):
+        def leer():
+            hojas = []
+            for indice, hoja in enumerate(self._hojas):
+                protegidos = []
+                for i, (titulo, celdas) in enumerate(self._emulador.rangos_protegidos):
+                    if titulo in (None, hoja.title):
+                        rango = {"sheetId": hoja.id}
+                        if celdas:
+                            fila_ini, fila_fin, col_ini, col_fin = _grilla(celdas)
+                            rango.update(startRowIndex=fila_ini, startColumnIndex=col_ini)
+                            if fila_fin is not None:
+                                rango["endRowIndex"] = fila_fin
+                            if col_fin is not None:
+                                rango["endColumnIndex"] = col_fin
+                        protegidos.append({"protectedRangeId": i + 1, "range": rango})
+                hojas.append({
+                    "properties": {
+                        "sheetId": hoja.id, "title": hoja.title, "index": indice,
+                        "gridProperties": {"rowCount": hoja.row_count, "columnCount": hoja.col_count},
+                    },
+                    "protectedRanges": protegidos,
+                })
+            return {"spreadsheetId": self.id, "properties": {"title": self.title}, "sheets": hojas}
+        return self._request("GET", "fetch_sheet_metadata", leer)
+
+    def values_batch_get(self, ranges, params=None):
+        def leer():
+            value_ranges = []
+            for rango in ranges:
+                titulo, celdas = _separar_hoja(rango)
+                hoja = self._hoja_por_titulo(titulo) if titulo else self._hojas[0]
+                value_ranges.append({"range": rango, "values": hoja._leer(celdas)})
+            return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+        return self._request("GET", "values_batch_get", leer)
+
+    def values_batch_update(self, body=None):
+        def escribir():
+            data = (body or {}).get("data", [])
+            planes = []
+            for item in data:
+                titulo, celdas = _separar_hoja(item["range"])
+                hoja = self._hoja_por_titulo(titulo) if titulo else self._hojas[0]
+                planes.append((hoja, celdas, item.get("values") or []))
+            # Todo o nada, como la API: se valida antes de escribir
+            for hoja, celdas, values in planes:
+                hoja._validar_escritura(celdas, values)
+            respuestas = [hoja._escribir_rango(celdas, values) for hoja, celdas, values in planes]
+            return {
+                "spreadsheetId": self.id,
+                "totalUpdatedRows": sum(r["updatedRows"] for r in respuestas),
+                "totalUpdatedCells": sum(r["updatedCells"] for r in respuestas),
+                "responses": respuestas,
+            }
+        return self._request("POST", "values_batch_update", escribir)
+
+
+class WorksheetEmulada:
+    def __init__(self, spreadsheet, gid, titulo, filas, columnas):
+        self.spreadsheet = spreadsheet
+        self.spreadsheet_id = spreadsheet.id
+        self.id = gid
+        self.title = titulo
+        self.row_count = filas
+        self.col_count = columnas
+        self._celdas = []  # filas de strings, solo hasta la última con datos
+
+    # --- acceso interno (sin request) ---------------------------------------
+    def _matriz(self, fila_ini, fila_fin, col_ini, col_fin):
+        fila_fin = min(len(self._celdas), self.row_count if fila_fin is None else fila_fin)
+        col_fin = self.col_count if col_fin is None else col_fin
+        return [
+            [(row[c] if c < len(row) else "") for c in range(col_ini, col_fin)]
+            for row in self._celdas[fila_ini:fila_fin]
+        ]
+
+    def _leer(self, celdas=None):
+        if not celdas:
+            return _recortar(self._matriz(0, None, 0, None))
+        return _recortar(self._matriz(*_grilla(celdas)))
+
+    def _escribir(self, fila_ini, col_ini, values):
+        for i, row in enumerate(values):
+            fila = fila_ini + i
+            while len(self._celdas) <= fila:
+                self._celdas.append([])
+            destino = self._celdas[fila]
+            for j, valor in enumerate(row):
+                col = col_ini + j
+                if len(destino) <= col:
+                    destino.extend([""] * (col + 1 - len(destino)))
+                destino[col] = "" if valor is None else str(valor)
+
+    def _normalizar_valores(self, values):
+        if not isinstance(values, (list, tuple)):
+            return [[values]]
+        if values and not isinstance(values[0], (list, tuple)):
+            return [list(values)]
+        return [list(row) for row in values]
+
+    def _validar_escritura(self, celdas, values):
+        fila_ini, _, col_ini, _ = _grilla(celdas)
+        alto = max(1, len(values))
+        ancho = max([len(row) for row in values] + [1])
+        self.spreadsheet._emulador._verificar_escritura(self, fila_ini, fila_ini + alto, col_ini, col_ini + ancho)
+
+    def _escribir_rango(self, celdas, values):
+        fila_ini, _, col_ini, _ = _grilla(celdas)
+        self._escribir(fila_ini, col_ini, values)
+        return {
+            "spreadsheetId": self.spreadsheet_id,
+            "updatedRange": f"'{self.title}'!{celdas}",
+            "updatedRows": len(values),
+            "updatedColumns": max([len(row) for row in values] + [0]),
+            "updatedCells": sum(len(row) for row in values),
+        }
+
+    def _request(self, metodo, nombre, operacion):
+        return self.spreadsheet._request(metodo, nombre, operacion)
+
+    # --- superficie gspread -------------------------------------------------
+    def get_values(self, range_name=None, **kwargs):
+        def leer():
+            values = self._leer(range_name)
+            return fill_gaps(values) if values else []
+        return self._request("GET", "get_values", leer)
+
+    def get_all_values(self, **kwargs):
+        return self.get_values(**kwargs)
+
+    def row_values(self, row, **kwargs):
+        return self._request("GET", "row_values", lambda: (self._leer(f"A{row}:{rowcol_to_a1(row, self.col_count)}") or [[]])[0])
+
+    def col_values(self, col, **kwargs):
+        def leer():
+            letra = rowcol_to_a1(1, col)[:-1]
+            return [row[0] if row else "" for row in self._leer(f"{letra}1:{letra}")]
+        return self._request("GET", "col_values", leer)
+
+    def acell(self, label, **kwargs):
+        def leer():
+            fila, col = a1_to_rowcol(label)
+            valores = self._matriz(fila - 1, fila, col - 1, col)
+            return Cell(fila, col, valores[0][0] if valores else "")
+        return self._request("GET", "acell", leer)
+
+    def update(self, values=None, range_name=None, **kwargs):
+        # Compatibilidad con el orden viejo update(rango, valores) que usa la app
+        def es_rango(valor):
+            return isinstance(valor, str) and bool(valor) and ("!" in valor or bool(_RE_A1.match(valor)))
+        if es_rango(values) and not es_rango(range_name):
+            values, range_name = range_name, values
+        celdas = _separar_hoja(range_name or "A1")[1]
+        values = self._normalizar_valores(values)
+
+        def escribir():
+            self._validar_escritura(celdas, values)
+            return self._escribir_rango(celdas, values)
+        return self._request("PUT", "update", escribir)
+
+    def update_cell(self, row, col, value):
+        return self.update(rowcol_to_a1(row, col), [[value]])
+
+    def append_row(self, values, **kwargs):
+        def agregar():
+            fila = len(_recortar(self._celdas)) + 1
+            if fila > self.row_count:
+                self.row_count = fila  # values.append expande la grilla
+            self._validar_escritura(rowcol_to_a1(fila, 1), [values])
+            return self._escribir_rango(rowcol_to_a1(fila, 1), [list(values)])
+        return self._request("POST", "append_row", agregar)
+
+    def batch_clear(self, ranges):
+        def limpiar():
+            for rango in ranges:
+                fila_ini, fila_fin, col_ini, col_fin = _grilla(_separar_hoja(rango)[1])
+                fila_fin = self.row_count if fila_fin is None else fila_fin
+                col_fin = self.col_count if col_fin is None else col_fin
+                self.spreadsheet._emulador._verificar_escritura(self, fila_ini, fila_fin, col_ini, col_fin)
+            for rango in ranges:
+                fila_ini, fila_fin, col_ini, col_fin = _grilla(_separar_hoja(rango)[1])
+                col_fin = self.col_count if col_fin is None else col_fin
+                for row in self._celdas[fila_ini:fila_fin]:
+                    for c in range(col_ini, min(col_fin, len(row))):
+                        row[c] = ""
+            return {"spreadsheetId": self.spreadsheet_id, "clearedRanges": list(ranges)}
+        return self._request("POST", "batch_clear", limpiar)
+
+    def resize(self, rows=None, cols=None):
+        def redimensionar():
+            if rows is not None:
+                self.row_count = int(rows)
+                del self._celdas[self.row_count:]
+            if cols is not None:
+                self.col_count = int(cols)
+                for row in self._celdas:
+                    del row[self.col_count:]
+            return {"spreadsheetId": self.spreadsheet_id}
+        return self._request("POST", "resize", redimensionar)
+
+
+_emulador = None
+_emulador_lock = threading.Lock()
+
+
+def _cargar_semilla(valor):
+    """EMULATOR_SEED: JSON en línea ('{...}') o ruta a un archivo JSON."""
+    if not valor:
+        return None
+    if str(valor).lstrip().startswith("{"):
+        return json.loads(valor)
+    with open(valor, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def habilitado():
+    return str(GOOGLE_SHEETS_CONFIG.get("BACKEND", "google")).strip().lower() in ("emulador", "emulator")
+
+
+def obtener_emulador():
+    """Emulador compartido por el proceso, configurado desde GOOGLE_SHEETS_CONFIG."""
+    global _emulador
+    with _emulador_lock:
+        if _emulador is None:
+            protegidos = [r.strip() for r in str(GOOGLE_SHEETS_CONFIG.get("EMULATOR_PROTECTED_RANGES") or "").split(";") if r.strip()]
+            _emulador = EmuladorSheets(
+                latencia_ms=GOOGLE_SHEETS_CONFIG.get("EMULATOR_LATENCY_MS", 0),
+                jitter_ms=GOOGLE_SHEETS_CONFIG.get("EMULATOR_JITTER_MS", 0),
+                cuota_lecturas_min=GOOGLE_SHEETS_CONFIG.get("EMULATOR_QUOTA_READS_PER_MIN", 0),
+                cuota_escrituras_min=GOOGLE_SHEETS_CONFIG.get("EMULATOR_QUOTA_WRITES_PER_MIN", 0),
+                rangos_protegidos=protegidos,
+                semilla=_cargar_semilla(GOOGLE_SHEETS_CONFIG.get("EMULATOR_SEED")),
+            )
+            logger.info(
+                f"Emulador de Google Sheets activo (latencia {_emulador.latencia_ms:.0f}ms, "
+                f"{len(protegidos)} rangos protegidos)"
+            )
+        return _emulador
+
+
+def cliente():
+    return ClienteEmulado(obtener_emulador())
+
+
+def estadisticas():
+    return obtener_emulador().estadisticas() if habilitado() else None
@@ -0,0 +1,326 @@
+"""
+Outbox de exportaciones a Google Sheets (tabla sheets_outbox, ver services.models)
+
+La exportación ya no espera a Google: en UNA transacción guarda cada venta en
+'ventas' y una fila de outbox con su clave de idempotencia. Un hilo worker por
+proceso envía las pendientes a la hoja en lotes:
+  - reclama un lote (SELECT ... FOR UPDATE SKIP LOCKED) y le pone un lease
+  - guarda la fila de la hoja planificada ANTES de escribir
+  - escribe con writer.agregar_multiples_ventas_a_sheets y registra la fila real
+    de cada venta, o el error y el intento (con backoff) si falló
+Si un proceso muere a mitad de un envío, al vencer el lease se lee la fila
+planificada: si ya tiene la venta se marca enviada, si no se reenvía. Así una
+caída nunca duplica ni pierde filas en la hoja.
+
+Requiere DATABASE_URL; sin base la exportación sigue por el camino directo.
+"""
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from services.file_lock import lock_archivo
+from services.sheet_ranges import leer_rango, rango_a1
+
+logger = logging.getLogger(__name__)
+
+PENDIENTE = "pendiente"
+ENVIANDO = "enviando"
+ENVIADO = "enviado"
+ERROR = "error"
+
+LOTE_MAXIMO = 200
+LEASE_SEGUNDOS = 300
+# Tras este número de intentos fallidos la venta queda en 'error' para revisión manual
+MAX_INTENTOS = 8
+INTERVALO_SEGUNDOS = 60
+BACKOFF_BASE_SEGUNDOS = 5.0
+BACKOFF_MAX_SEGUNDOS = 300.0
+# Serializa la escritura entre workers: dos lotes no pueden planificar la misma fila
+LOCK_PATH = Path(__file__).resolve().parent.parent / "data" / "sheets_outbox"
+# Columna C de la hoja de ventas: ID del artículo (para verificar filas planificadas)
+COLUMNA_ID = 3
+
+_lock = threading.Lock()
+_evento = threading.Event()
+_worker = None
+_stats = {"lotes": 0, "enviadas": 0, "fallidas": 0, "verificadas": 0, "ultimo_error": None, "ultimo_envio": None}
+
+
+def habilitado():
+    from services.db import DATABASE_URL
+    return bool(DATABASE_URL)
+
+
+def _clave_idempotencia(clave_lote, indice, venta):
+    contenido = json.dumps(venta, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(f"{clave_lote}:{indice}:{contenido}".encode("utf-8")).hexdigest()
+
+
+def registrar_exportacion(ventas, clave_lote):
+    """
+    Guarda las ventas en el historial (tabla ventas) y en el outbox en una sola
+    transacción. clave_lote identifica la exportación (ej. el job_id): repetir
+    la misma exportación no duplica filas. Devuelve cuántas se registraron.
+    """
+    from services.db import get_session
+    from services.models import SheetsOutbox
+    from services.history_service import venta_desde_dict
+
+    claves = [_clave_idempotencia(clave_lote, i, v) for i, v in enumerate(ventas)]
+    session = get_session()
+    try:
+        existentes = {
+            row[0] for row in
+            session.query(SheetsOutbox.idempotency_key).filter(SheetsOutbox.idempotency_key.in_(claves))
+        }
+        registradas = 0
+        for clave, venta in zip(claves, ventas):
+            if clave in existentes:
+                continue
+            fila_venta = venta_desde_dict(venta)
+            if fila_venta is not None:
+                session.add(fila_venta)
+                session.flush()  # asigna ventas.id
+            session.add(SheetsOutbox(
+                idempotency_key=clave,
+                venta_id=fila_venta.id if fila_venta is not None else None,
+                payload=json.dumps(venta, ensure_ascii=False, default=str),
+                estado=PENDIENTE,
+                intentos=0,
+            ))
+            registradas += 1
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    if registradas:
+        iniciar_worker()
+        despertar()
+    logger.info(f"Outbox: {registradas} ventas registradas ({len(ventas) - registradas} ya estaban)")
+    return {"registradas": registradas, "duplicadas": len(ventas) - registradas}
+
+
+def _reclamar_lote():
+    """Toma pendientes (y envíos con lease vencido) y les pone un lease nuevo."""
+    from sqlalchemy import and_, or_
+    from services.db import get_session
+    from services.models import SheetsOutbox
+
+    session = get_session()
+    try:
+        ahora = datetime.now()
+        filas = (
+            session.query(SheetsOutbox)
+            .filter(or_(
+                SheetsOutbox.estado == PENDIENTE,
+                and_(SheetsOutbox.estado == ENVIANDO, SheetsOutbox.lease_hasta < ahora),
+            ))
+            .order_by(SheetsOutbox.id)
+            .limit(LOTE_MAXIMO)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        lote = []
+        for fila in filas:
+            lote.append({
+                "id": fila.id,
+                "venta": json.loads(fila.payload),
+                "fila_sheet": fila.fila_sheet if fila.estado == ENVIANDO else None,
+                "intentos": fila.intentos or 0,
+            })
+            fila.estado = ENVIANDO
+            fila.lease_hasta = ahora + timedelta(seconds=LEASE_SEGUNDOS)
+        session.commit()
+        return lote
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _actualizar(cambios):
+    """cambios: {outbox_id: {columna: valor}} en una transacción."""
+    if not cambios:
+        return
+    from services.db import get_session
+    from services.models import SheetsOutbox
+
+    session = get_session()
+    try:
+        for fila in session.query(SheetsOutbox).filter(SheetsOutbox.id.in_(list(cambios))):
+            for columna, valor in cambios[fila.id].items():
+                setattr(fila, columna, valor)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _verificar_en_hoja(worksheet, items):
+    """
+    Envíos interrumpidos: compara el ID de la fila planificada con el de la venta.
+    Devuelve (confirmados, a_reenviar).
+    """
+    filas = [item["fila_sheet"] for item in items]
+    desde, hasta = min(filas), max(filas)
+    values = leer_rango(worksheet, rango_a1(COLUMNA_ID, COLUMNA_ID, desde, hasta), ancho=1)
+    confirmados, reenviar = [], []
+    for item in items:
+        i = item["fila_sheet"] - desde
+        en_hoja = str(values[i][0]).strip().upper() if i < len(values) else ""
+        esperado = str(item["venta"].get("id") or "").strip().upper()
+        (confirmados if en_hoja and en_hoja == esperado else reenviar).append(item)
+    return confirmados, reenviar
+
+
+def _fallo(item, mensaje):
+    intentos = item["intentos"] + 1
+    return {
+        "estado": ERROR if intentos >= MAX_INTENTOS else PENDIENTE,
+        "intentos": intentos,
+        "ultimo_error": str(mensaje)[:2000],
+        "fila_sheet": None,
+        "lease_hasta": None,
+    }
+
+
+def _por_hoja(writer, items):
+    """Items del lote agrupados por pestaña de destino de su venta."""
+    grupos = writer.agrupar_por_hoja([item["venta"] for item in items])
+    return [[items[i] for i in indices] for indices in grupos]
+
+
+def sincronizar_lote():
+    """Envía un lote de pendientes a la hoja. Devuelve (enviadas, fallidas)."""
+    from services.sales_service import _get_sheets_writer
+
+    with lock_archivo(LOCK_PATH):
+        lote = _reclamar_lote()
+        if not lote:
+            return 0, 0
+        writer = _get_sheets_writer()
+        ahora = datetime.now()
+        cambios = {}
+
+        interrumpidos = [item for item in lote if item["fila_sheet"]]
+        nuevos = [item for item in lote if not item["fila_sheet"]]
+        # Con pestañas por mes (services.sheet_partitions) cada grupo va a su pestaña
+        for grupo in _por_hoja(writer, interrumpidos):
+            vista = writer.para_ventas([item["venta"] for item in grupo])
+            confirmados, reenviar = _verificar_en_hoja(vista.worksheet, grupo)
+            for item in confirmados:
+                cambios[item["id"]] = {"estado": ENVIADO, "enviado_at": ahora, "lease_hasta": None}
+            nuevos.extend(reenviar)
+            _stats["verificadas"] += len(grupo)
+            logger.info(f"Outbox: {len(confirmados)} envíos interrumpidos ya estaban en la hoja, {len(reenviar)} se reenvían")
+
+        fallidas = inciertas = 0
+        for grupo in _por_hoja(writer, nuevos):
+            ventas = [item["venta"] for item in grupo]
+            # Writer de la pestaña del grupo (ver GoogleSheetsWriter.para_ventas)
+            vista = writer.para_ventas(ventas)
+            fila_inicio = vista.obtener_primer_fila_vacia_util()
+            # La fila planificada queda guardada antes de escribir (ver _verificar_en_hoja)
+            _actualizar({item["id"]: {"fila_sheet": fila_inicio + i} for i, item in enumerate(grupo)})
+            try:
+                resultado = vista.agregar_multiples_ventas_a_sheets(ventas, fila_inicio=fila_inicio)
+            except Exception as e:
+                resultado = {"success": False, "mensaje": str(e)}
+
+            # También con success=False (EXPORT_PARTIAL / EXPORT_FAILED): las filas de
+            # indices_exitosos ya están en la hoja y no deben reenviarse
+            indices = resultado.get("indices_exitosos") or []
+            filas_sheet = resultado.get("filas_sheet") or []
+            mensaje = "; ".join(str(err) for err in resultado.get("errores") or []) or resultado.get("mensaje") or "sin detalle"
+            for pos, i in enumerate(indices):
+                fila = filas_sheet[pos] if pos < len(filas_sheet) else None
+                cambios[grupo[i]["id"]] = {"estado": ENVIADO, "fila_sheet": fila, "enviado_at": ahora, "lease_hasta": None}
+            # Escritura sin confirmar (EXPORT_UNVERIFIED): siguen 'enviando' con su fila planificada;
+            # al vencer el lease _verificar_en_hoja decide si ya están o se reenvían
+            filas_inciertas = resultado.get("filas_inciertas") or []
+            for pos, i in enumerate(resultado.get("indices_inciertos") or []):
+                if grupo[i]["id"] not in cambios and pos < len(filas_inciertas):
+                    cambios[grupo[i]["id"]] = {"fila_sheet": filas_inciertas[pos]}
+                    inciertas += 1
+            for item in grupo:
+                if item["id"] not in cambios:
+                    cambios[item["id"]] = _fallo(item, mensaje)
+                    fallidas += 1
+            if fallidas:
+                _stats["ultimo_error"] = mensaje
+
+        _actualizar(cambios)
+
+    enviadas = len(lote) - fallidas - inciertas
+    _stats["lotes"] += 1
+    _stats["enviadas"] += enviadas
+    _stats["fallidas"] += fallidas
+    _stats["ultimo_envio"] = ahora.isoformat(timespec="seconds")
+    logger.info(f"Outbox: lote de {len(lote)} ventas, {enviadas} enviadas, {fallidas} fallidas")
+    return enviadas, fallidas
+
+
+def _loop():
+    fallos_seguidos = 0
+    while True:
+        try:
+            enviadas, fallidas = sincronizar_lote()
+        except Exception as e:
+            logger.error(f"Outbox: error sincronizando con Google Sheets: {e}", exc_info=True)
+            _stats["ultimo_error"] = str(e)
+            enviadas, fallidas = 0, 1
+        if fallidas:
+            fallos_seguidos += 1
+            time.sleep(min(BACKOFF_MAX_SEGUNDOS, BACKOFF_BASE_SEGUNDOS * (2 ** (fallos_seguidos - 1))))
+            continue
+        fallos_seguidos = 0
+        if enviadas:
+            continue  # puede haber más pendientes
+        _evento.wait(timeout=INTERVALO_SEGUNDOS)
+        _evento.clear()
+
+
+def iniciar_worker():
+    """Arranca el hilo que sincroniza el outbox (no hace nada sin DATABASE_URL)."""
+    global _worker
+    if not habilitado():
+        return False
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_loop, name="sheets-outbox", daemon=True)
+            _worker.start()
+    return True
+
+
+def despertar():
+    _evento.set()
+
+
+def estadisticas():
+    resultado = dict(_stats, habilitado=habilitado(), worker_activo=bool(_worker and _worker.is_alive()))
+    if not resultado["habilitado"]:
+        return resultado
+    try:
+        from sqlalchemy import func
+        from services.db import get_session
+        from services.models import SheetsOutbox
+
+        session = get_session()
+        try:
+            filas = session.query(SheetsOutbox.estado, func.count(SheetsOutbox.id)).group_by(SheetsOutbox.estado).all()
+        finally:
+            session.close()
+        resultado["ventas"] = {estado: n for estado, n in filas}
+    except Exception as e:
+        resultado["ventas"] = {"error": str(e)}
+    return resultado
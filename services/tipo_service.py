@@ -1,129 +1,94 @@
-import os
-import json
 import logging
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from typing import Dict
+import threading
+from typing import Dict, Iterable
+
+from services.catalog_service import obtener_snapshot
 
 logger = logging.getLogger(__name__)
 
-TIPO_SHEET_ID = "1QG8a6yHmad5sFpVcKhC3l0oEAcjJftmHV2KAF56bkkM"
-TIPO_GID = 1664309383
 
-class TipoService:
+class TipoIndex:
+    """
+    Índice ID -> Tipo compartido por todo el proceso.
+    Sale del snapshot unificado de "Códigos Stock" (ver services.catalog_snapshot),
+    que se refresca por TTL: cuando el snapshot cambia, el índice se reemplaza y
+    sube de versión, así los artículos nuevos obtienen su Tipo sin reiniciar.
+    """
+
     def __init__(self):
-        try:
-            scope = [
-                "https://spreadsheets.google.com/feeds",
-                "https://www.googleapis.com/auth/drive",
-            ]
-            raw_env = (
-                os.getenv("GOOGLE_CREDENTIALS")
-                or os.getenv("GOOGLE_CREDENTIALS_JSON")
-                or os.getenv("GOOGLE_SHEETS_CREDENTIALS")
-            )
-            credentials = None
-            if raw_env:
-                try:
-                    credentials = json.loads(raw_env)
-                    logger.info("Credenciales cargadas desde variable de entorno")
-                except Exception as e:
-                    raise ValueError(f"GOOGLE_*_CREDENTIALS no es JSON válido: {e}")
+        self._lock = threading.Lock()
+        self._mapa: Dict[str, str] = {}
+        self._snapshot = None
+        self.version = 0
+        self.generado_en = None
+        self._hits = 0
+        self._misses = 0
+
+    def _asegurar(self) -> Dict[str, str]:
+        snapshot = obtener_snapshot()
+        with self._lock:
+            if snapshot is not self._snapshot:
+                self._mapa = dict(snapshot.get("tipos") or {})
+                self._snapshot = snapshot
+                self.version += 1
+                self.generado_en = snapshot.get("generado_en")
+                logger.info(f"Índice de tipos v{self.version}: {len(self._mapa)} IDs (snapshot {self.generado_en})")
+            return self._mapa
+
+    def resolve_many(self, ids: Iterable[str]) -> Dict[str, str]:
+        """Resuelve varios IDs con una sola consulta al snapshot. Devuelve {id_original: tipo}."""
+        mapa = self._asegurar()
+        resultado = {}
+        hits = misses = 0
+        for id_val in ids:
+            if not id_val or id_val in resultado:
+                continue
+            tipo = mapa.get(str(id_val).strip().upper(), "")
+            if tipo:
+                hits += 1
             else:
-                # Fallback a archivo local si existe
-                if os.path.exists("google_credentials.json"):
-                    with open("google_credentials.json", "r", encoding="utf-8") as f:
-                        credentials = json.load(f)
-                        logger.info("Credenciales cargadas desde archivo local")
-            if not isinstance(credentials, dict) or not credentials:
-                raise ValueError("No se encontraron credenciales válidas para TipoService")
-            if isinstance(credentials.get("private_key"), str):
-                credentials["private_key"] = credentials["private_key"].replace("\\n", "\n")
+                misses += 1
+            resultado[id_val] = tipo
+        with self._lock:
+            self._hits += hits
+            self._misses += misses
+        return resultado
 
-            self.client = gspread.service_account_from_dict(credentials)
-            self.spreadsheet = self.client.open_by_key(TIPO_SHEET_ID)
-            self.worksheet = self.spreadsheet.get_worksheet_by_id(TIPO_GID)
-            if not self.worksheet:
-                raise RuntimeError(f"No se encontró la hoja con GID {TIPO_GID}")
-            self._cache: Dict[str, str] = {}
-        except Exception as e:
-            logger.error(f"Error inicializando TipoService: {e}")
-            raise
+    def resolve(self, id_val: str) -> str:
+        if not id_val:
+            return ""
+        return self.resolve_many([id_val]).get(id_val, "")
 
-    def _find_col(self, headers, candidates):
-        lower = [ (h or '').strip().lower() for h in headers ]
-        for cand in candidates:
-            c = cand.strip().lower()
-            # exacto
-            for i, h in enumerate(lower):
-                if h == c:
-                    return i
-            # parcial
-            for i, h in enumerate(lower):
-                if c in h or h in c:
-                    return i
-        return None
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "generado_en": self.generado_en,
+                "ids": len(self._mapa),
+                "hits": self._hits,
+                "misses": self._misses,
+            }
 
-    def _ensure_cache(self):
-        if self._cache:
-            return
-        values = self.worksheet.get_all_values()
-        if not values:
-            return
-        # 1) Modo estricto según estructura pedida: ID en columna I (idx 8), Tipo en columna E (idx 4), desde fila 4
-        try:
-            col_id = 8  # I
-            col_tipo = 4  # E
-            added = 0
-            for idx, row in enumerate(values, start=1):
-                if idx < 4:
-                    continue
-                if len(row) <= max(col_id, col_tipo):
-                    continue
-                id_raw = (row[col_id] or '').strip()
-                tipo_val = (row[col_tipo] or '').strip()
-                if not id_raw or not tipo_val:
-                    continue
-                key = id_raw.upper()
-                self._cache[key] = tipo_val
-                added += 1
-            if added > 0:
-                return
-        except Exception:
-            pass
 
-        # 2) Fallback: detección por headers flexibles
-        headers = values[0]
-        idx_id = self._find_col(headers, ["id", "codigo", "código", "sku", "producto_id"])  # ID columna
-        idx_tipo = self._find_col(headers, ["tipo", "category", "categoria", "categoría"])   # Tipo columna
-        if idx_tipo is None:
-            logger.warning("No se encontró columna 'Tipo' en la hoja de tipos (fallback)")
-            return
-        idx_concepto = self._find_col(headers, ["concepto"]) if idx_id is None else None
+# Índice compartido por el proceso
+tipo_index = TipoIndex()
 
-        for row in values[1:]:
-            try:
-                if len(row) <= idx_tipo:
-                    continue
-                tipo_val = (row[idx_tipo] or '').strip()
-                if not tipo_val:
-                    continue
-                key = None
-                if idx_id is not None and len(row) > idx_id:
-                    key = (row[idx_id] or '').strip().upper()
-                elif idx_concepto is not None and len(row) > idx_concepto:
-                    key = (row[idx_concepto] or '').strip().upper()
-                if key:
-                    self._cache[key] = tipo_val
-            except Exception:
-                continue
+
+class TipoService:
+    """
+    Resuelve el 'Tipo' de un artículo por su ID usando el índice compartido.
+    """
 
     def obtener_tipo_por_id(self, id_val: str) -> str:
         try:
-            if not id_val:
-                return ""
-            self._ensure_cache()
-            return self._cache.get(str(id_val).strip().upper(), "")
+            return tipo_index.resolve(id_val)
         except Exception as e:
             logger.warning(f"No se pudo obtener tipo para ID {id_val}: {e}")
             return ""
+
+    def obtener_tipos(self, ids: Iterable[str]) -> Dict[str, str]:
+        try:
+            return tipo_index.resolve_many(ids)
+        except Exception as e:
+            logger.warning(f"No se pudieron obtener tipos en lote: {e}")
+            return {}
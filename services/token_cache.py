@@ -0,0 +1,94 @@
+"""
+Caché de access token OAuth compartido entre procesos
+
+Cada worker de gunicorn (y cada reinicio) intercambiaba su propio token de la
+cuenta de servicio. Aquí el token emitido y su vencimiento quedan en
+data/google_token.json, protegido con un lock de archivo: los workers hermanos
+lo reutilizan hasta poco antes de que venza y solo uno emite el siguiente.
+"""
+import os
+import json
+import time
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+from google.oauth2 import service_account
+
+from services.file_lock import escribir_atomico, lock_archivo
+
+logger = logging.getLogger(__name__)
+
+TOKEN_CACHE_PATH = Path(
+    os.getenv("GOOGLE_TOKEN_CACHE_PATH")
+    or Path(__file__).resolve().parent.parent / "data" / "google_token.json"
+)
+# Margen mayor al umbral de refresco de google-auth (3m45s): un token reutilizado
+# debe seguir siendo "válido" para google-auth o se pediría otro en cada request.
+MARGEN_VENCIMIENTO_SEGUNDOS = 300
+
+_stats = {"reutilizados": 0, "emitidos": 0, "errores_cache": 0}
+
+
+def _clave(credentials):
+    return f"{credentials.service_account_email}|{' '.join(sorted(credentials.scopes or []))}"
+
+
+def _leer(path):
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        _stats["errores_cache"] += 1
+        logger.warning(f"Caché de token ilegible ({path.name}), se ignora: {e}")
+        return {}
+
+
+def _escribir(path, data):
+    """Escritura atómica con permisos 0600 (el archivo contiene un token vigente)."""
+    escribir_atomico(path, json.dumps(data), modo=0o600)
+
+
+class CredencialesConCache(service_account.Credentials):
+    """
+    Credentials de cuenta de servicio cuyo refresh() consulta primero el caché
+    en disco. google-auth llama a refresh() antes de cada request con el token
+    vencido, así que el resto (gspread, AuthorizedSession) no cambia.
+    """
+
+    def refresh(self, request):
+        path = TOKEN_CACHE_PATH
+        clave = _clave(self)
+        try:
+            with lock_archivo(path):
+                data = _leer(path)
+                entrada = data.get(clave) or {}
+                vence_ts = float(entrada.get("expiry_ts") or 0)
+                if entrada.get("token") and vence_ts - time.time() > MARGEN_VENCIMIENTO_SEGUNDOS:
+                    self.token = entrada["token"]
+                    # google-auth compara expiry como datetime UTC naive
+                    self.expiry = datetime.fromtimestamp(vence_ts, tz=timezone.utc).replace(tzinfo=None)
+                    _stats["reutilizados"] += 1
+                    return
+
+                super().refresh(request)
+                _stats["emitidos"] += 1
+                if self.expiry is not None:
+                    data[clave] = {
+                        "token": self.token,
+                        "expiry_ts": self.expiry.replace(tzinfo=timezone.utc).timestamp(),
+                    }
+                    _escribir(path, data)
+        except OSError as e:
+            # Disco no disponible: seguir sin caché compartido
+            _stats["errores_cache"] += 1
+            logger.warning(f"Caché de token no disponible ({e}), se emite token directo")
+            if not self.valid:
+                super().refresh(request)
+                _stats["emitidos"] += 1
+
+
+def estadisticas():
+    return dict(_stats)
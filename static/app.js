@@ -1305,8 +1305,44 @@ document.addEventListener('DOMContentLoaded', () => {
         idAsignadoInfo.textContent = txt;
     }
 
-    function asignarIDAUTOMATICO(){
+    // ID del rango de precio del grupo: lo calcula el servidor (/api/ids/siguiente?precio=),
+    // con el mismo criterio que este cálculo local, que queda como respaldo sin conexión
+    function idPorPrecioLocal(grupo, precioNum){
+        const idsGrupo = mapaGrupoAIds[grupo] || [];
+        const umbralesGrupo = rangosPrecios[grupo];
+        if (!Array.isArray(umbralesGrupo) || !umbralesGrupo.length || !idsGrupo.length) return null;
+        // Umbrales como mínimos inclusivos (>=)
+        let idx = 0;
+        for (let i = 0; i < umbralesGrupo.length; i++){
+            if (precioNum >= umbralesGrupo[i]){
+                idx = i;
+            } else {
+                break;
+            }
+        }
+        if (idx >= idsGrupo.length) idx = idsGrupo.length - 1;
+        return idsGrupo[idx] || null;
+    }
+
+    async function idPorPrecio(grupo, precioNum){
+        try {
+            const res = await fetch(`/api/ids/siguiente?prefijo=${encodeURIComponent(grupo)}&precio=${encodeURIComponent(precioNum)}`);
+            if (res.status >= 500) throw new Error(`HTTP ${res.status}`);
+            const data = await res.json();
+            return data && data.success ? data.id : null;
+        } catch (e) {
+            console.warn('No se pudo pedir el ID al servidor, se calcula localmente:', e);
+            return idPorPrecioLocal(grupo, precioNum);
+        }
+    }
+
+    // Descarta respuestas viejas si el usuario sigue tipeando
+    let secuenciaIdVenta = 0;
+    let secuenciaIdStock = 0;
+
+    async function asignarIDAUTOMATICO(){
         if (!selectTipoProducto || !inputPrecio) return;
+        const secuencia = ++secuenciaIdVenta;
         const tipoSel = selectTipoProducto.value || '';
         const grupo = mapaTipoAGrupo[tipoSel];
         if (!grupo){
@@ -1316,10 +1352,8 @@ document.addEventListener('DOMContentLoaded', () => {
             actualizarDisplayID('');
             return;
         }
-        const idsGrupo = mapaGrupoAIds[grupo] || [];
-        const umbralesGrupo = rangosPrecios[grupo];
         const precioNum = parseMoneyEs(inputPrecio.value || '');
-        if (!isFinite(precioNum) || precioNum <= 0 || !Array.isArray(umbralesGrupo) || !umbralesGrupo.length || !idsGrupo.length){
+        if (!isFinite(precioNum) || precioNum <= 0){
             inputID.value = '';
             // Mensaje informativo (no de error): mostrar en verde
             setHelper('Ingresá un precio válido para asignar el ID automáticamente.', true);
@@ -1327,17 +1361,8 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
-        // Elegir índice de rango considerando umbrales como mínimos inclusivos (>=)
-        let idx = 0;
-        for (let i = 0; i < umbralesGrupo.length; i++){
-            if (precioNum >= umbralesGrupo[i]){
-                idx = i;
-            } else {
-                break;
-            }
-        }
-        if (idx >= idsGrupo.length) idx = idsGrupo.length - 1;
-        const idAsignado = idsGrupo[idx];
+        const idAsignado = await idPorPrecio(grupo, precioNum);
+        if (secuencia !== secuenciaIdVenta) return;
 
         inputID.value = idAsignado || '';
         // Guardar como nombre básico el tipo general seleccionado, para que quede algo en la DB
@@ -1445,8 +1470,9 @@ document.addEventListener('DOMContentLoaded', () => {
         return;
     }
 
-    function asignarIDStockIngresoAutomatico() {
+    async function asignarIDStockIngresoAutomatico() {
         if (!stIdSelect || !stTipo || !stPrecioIndividual) return;
+        const secuencia = ++secuenciaIdStock;
         const tipoSelRaw = (stTipo.value || '').trim();
         if (!tipoSelRaw) {
             stIdSelect.value = '';
@@ -1460,25 +1486,14 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
-        const idsGrupo = mapaGrupoAIds[grupo] || [];
-        const umbralesGrupo = rangosPrecios[grupo];
         const precioNum = parseMoneyEs(stPrecioIndividual.value || '');
-        if (!isFinite(precioNum) || precioNum <= 0 || !Array.isArray(umbralesGrupo) || !umbralesGrupo.length || !idsGrupo.length) {
+        if (!isFinite(precioNum) || precioNum <= 0) {
             stIdSelect.value = '';
             return;
         }
 
-        // Elegir índice de rango considerando umbrales como mínimos inclusivos (>=)
-        let idx = 0;
-        for (let i = 0; i < umbralesGrupo.length; i++){
-            if (precioNum >= umbralesGrupo[i]){
-                idx = i;
-            } else {
-                break;
-            }
-        }
-        if (idx >= idsGrupo.length) idx = idsGrupo.length - 1;
-        const idAsignado = idsGrupo[idx];
+        const idAsignado = await idPorPrecio(grupo, precioNum);
+        if (secuencia !== secuenciaIdStock) return;
         stIdSelect.value = idAsignado || '';
     }
 
@@ -1501,6 +1516,26 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     let isExporting = false;
+    async function esperarJobExportacion(jobId) {
+        // Consulta /api/exportar/<job_id> hasta que el job termine; devuelve su resultado
+        while (true) {
+            await new Promise(r => setTimeout(r, 1000));
+            let job;
+            try {
+                const res = await fetch(`/api/exportar/${encodeURIComponent(jobId)}`);
+                job = await res.json();
+                if (res.status === 404) return { success: false, error: 'JOB_NOT_FOUND' };
+            } catch (_) {
+                continue; // error de red puntual: seguir consultando
+            }
+            if (job.estado === 'completado' || job.estado === 'error') {
+                return Object.assign({ errores: job.errores }, job.resultado || {}, { success: job.estado === 'completado' });
+            }
+            const etapa = job.etapa ? ` (${job.etapa})` : '';
+            exportBtn.innerHTML = `<i class="fas fa-spinner fa-spin mr-2"></i> Exportando${etapa}...`;
+        }
+    }
+
     async function exportarExcel() {
         try {
             if (isExporting) return; // evitar doble exportación
@@ -1513,7 +1548,11 @@ document.addEventListener('DOMContentLoaded', () => {
                 headers: { 'Content-Type': 'application/json' }
             });
             try {
-                const data = await res.json();
+                let data = await res.json();
+                // La exportación corre en segundo plano: esperar a que el job termine
+                if (res.ok && data && data.job_id) {
+                    data = await esperarJobExportacion(data.job_id);
+                }
                 if (res.ok && data && data.success !== false) {
                     if (typeof mostrarNotificacion === 'function') {
                         mostrarNotificacion('✅ Exportación completada. Historial actualizado.', 'success');